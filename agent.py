@@ -1,12 +1,23 @@
 from langgraph.graph import StateGraph, END, START
-from langchain_core.rate_limiters import InMemoryRateLimiter
-from langgraph.prebuilt import ToolNode
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from tools import get_rendered_html, download_file, post_request, get_request, run_code, add_dependencies, transcribe_audio, analyze_with_gemini
+from langchain_core.runnables import RunnableLambda
+from tools import get_rendered_html, fetch_url, download_file, post_request, get_request, run_code, add_dependencies, transcribe_audio, analyze_with_gemini, read_artifact
+from tools.tool_executor import build_tool_node, start_tool_limiter
+from tools.rate_limits import aipipe_limiter, gemini_limiter
+from hedging import LLM_HEDGE, Hedger
+from llm_router import LLM_ROUTER_MAX_WAIT, Candidate, CircuitBreaker, aroute_call, route_call
 from tools.aipipe_client import get_api_key, get_base_url
-from typing import TypedDict, Annotated, List, Any
+from tools.budget import QUIZ_TIME_LIMIT, budget_timeout, current_budget, start_quiz_budget
+from tools.workspace import create_workspace, current_workspace
+from tools.tracing import span, start_trace, traced
+from tools.metrics import ACTIVE_RUNS, AGENT_STEP_SECONDS, LLM_TOKENS, QUIZZES_PER_CHAIN, RUNS
+from typing import TypedDict, Annotated, List, Any, Callable, Dict, NotRequired, Optional
 from langchain_openai import ChatOpenAI
-from langgraph.graph.message import add_messages
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, ToolMessage
+import uuid
+from langgraph.graph.message import add_messages, REMOVE_ALL_MESSAGES
+import asyncio
+import json
 import os
 from dotenv import load_dotenv
 load_dotenv()
@@ -21,24 +32,31 @@ RECURSION_LIMIT = 5000
 # -------------------------------------------------
 class AgentState(TypedDict):
     messages: Annotated[List, add_messages]
+    # Per-quiz clock (wall-clock epoch seconds), synced with the server's delay
+    quiz_url: NotRequired[str]
+    quiz_started_at: NotRequired[float]
+    # Last answer submission on this quiz, reused to move on automatically when time runs out
+    submit_url: NotRequired[Optional[str]]
+    submit_payload: NotRequired[Optional[Dict[str, Any]]]
+    # Quiz URL the deadline handler already acted on, and its automatic submissions so far
+    auto_advanced: NotRequired[Optional[str]]
+    auto_advance_attempts: NotRequired[int]
 
 
-TOOLS = [run_code, get_rendered_html, download_file, post_request, get_request, add_dependencies, transcribe_audio, analyze_with_gemini]
+TOOLS = [run_code, fetch_url, get_rendered_html, download_file, post_request, get_request, add_dependencies, transcribe_audio, analyze_with_gemini, read_artifact]
 
 
 # -------------------------------------------------
 # AIPIPE/OPENROUTER LLM (Primary - for reasoning and code generation)
 # -------------------------------------------------
-rate_limiter = InMemoryRateLimiter(
-    requests_per_second=9/60,  
-    check_every_n_seconds=1,  
-    max_bucket_size=9  
-)
+# Host-wide bucket (AIPIPE_RPM, default 9 requests per minute) shared by all workers
 llm_aipipe = ChatOpenAI(
     model="openai/gpt-5-nano",  # Much cheaper than Claude (~60x cheaper!)
     openai_api_key=AIPIPE_API_KEY,
     openai_api_base=AIPIPE_BASE_URL,
-    rate_limiter=rate_limiter
+    rate_limiter=aipipe_limiter,
+    include_response_headers=True,  # x-ratelimit-* headers feed the shared limiter
+    max_retries=1  # On 429 the router fails over to Gemini instead of retrying here
 ).bind_tools(TOOLS)
 
 # -------------------------------------------------
@@ -49,20 +67,24 @@ import time
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if GOOGLE_API_KEY:
-    # Use rate limiter for Gemini too (15 RPM free tier = 1 request per 4 seconds)
-    gemini_rate_limiter = InMemoryRateLimiter(
-        requests_per_second=1/5,  # 1 request every 5 seconds (safer than 4)
-        check_every_n_seconds=1,
-        max_bucket_size=3
-    )
+    # Shared "gemini" bucket (GEMINI_RPM, default 1 request per 5 seconds; free tier is 15 RPM),
+    # also used by the multimodal tools' raw Gemini calls
     llm_gemini = ChatGoogleGenerativeAI(
         model="gemini-2.0-flash",
         google_api_key=GOOGLE_API_KEY,
-        rate_limiter=gemini_rate_limiter,
-        max_retries=5  # Retry up to 5 times on rate limit errors
+        rate_limiter=gemini_limiter,
+        max_retries=1  # Rate limits open the circuit breaker instead of retrying here
+    ).bind_tools(TOOLS)
+    # Hedge requests take their token from gemini_limiter up front (without
+    # waiting) and must not retry: a late hedge is worthless
+    llm_gemini_hedge = ChatGoogleGenerativeAI(
+        model="gemini-2.0-flash",
+        google_api_key=GOOGLE_API_KEY,
+        max_retries=0
     ).bind_tools(TOOLS)
 else:
     llm_gemini = None
+    llm_gemini_hedge = None
 
 # Primary LLM (will fallback to Gemini on errors)
 llm = llm_aipipe   
@@ -80,7 +102,7 @@ YOUR ARCHITECTURE:
 - GEMINI TOOLS (via tools): Handle multimodal tasks (audio, images, videos, PDFs)
 
 Your job is to:
-1. Load the quiz page from the given URL.
+1. Load the quiz page from the given URL (use 'fetch_url').
 2. Extract ALL instructions, required parameters, submission rules, and the submit endpoint.
 3. Solve the task exactly as required (choose the right tool/capability automatically).
 4. Submit the answer ONLY to the endpoint specified to post or submit on the current page (never make up URLs ) 
@@ -125,10 +147,13 @@ WHEN TO USE PYTHON EXECUTION TOOLS (for computational tasks):
 - Network analysis: 'add_dependencies' (networkx), then 'run_code'
 
 OTHER TOOLS:
-- Web scraping (JavaScript sites): 'get_rendered_html'
+- Loading quiz pages and data URLs: 'fetch_url' (plain HTTP first, browser only if the page needs JavaScript; pass a list to fetch several URLs at once)
+- Web scraping when you need to wait for a specific element: 'get_rendered_html'
 - API calls with headers: 'get_request' (GET) or 'post_request' (POST)
 - Download files: 'download_file'
 - Install packages: 'add_dependencies'
+- Independent tool calls in ONE message run in parallel (e.g. download several files or analyze several images at once); run_code, add_dependencies and post_request calls still run in the order you list them
+- Large tool outputs are replaced by an artifact handle and preview: read slices or search them with 'read_artifact' (or open artifacts/<id>.txt from run_code)
 
 KEY INSIGHT: You have unlimited capabilities through tools!
 - Can't see/hear? → Use Gemini tools
@@ -140,7 +165,8 @@ TIME LIMIT RULES:
 - Each quiz has a hard 3-minute limit.
 - The server response includes a "delay" field indicating elapsed time.
 - If your answer is wrong, retry again (if time permits).
-- If time exceeds 3 minutes, try new quiz URL if provided otherwise stop.
+- The runtime tracks each quiz's clock: tool timeouts shrink as time runs out, and once the
+  limit has passed it submits for you to obtain the next quiz URL. Continue with that URL.
 
 STOPPING CONDITION:
 - Only return "END" when a server response explicitly contains NO new URL.
@@ -175,64 +201,362 @@ prompt = ChatPromptTemplate.from_messages([
 ])
 
 llm_with_prompt = prompt | llm
+# Built once; the router switches between the two chains per step
+llm_gemini_with_prompt = prompt | llm_gemini if llm_gemini is not None else None
+# A tripped breaker also pauses the provider's shared bucket, for every process
+aipipe_breaker = CircuitBreaker("Aipipe", limiter=aipipe_limiter)
+gemini_breaker = CircuitBreaker("Gemini", limiter=gemini_limiter)
 
 
 # -------------------------------------------------
-# AGENT NODE (with automatic fallback)
+# QUIZ DEADLINE
 # -------------------------------------------------
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+# Seconds past the limit before the runtime submits on the agent's behalf,
+# so the server (whose clock started first) agrees the time is up
+QUIZ_ADVANCE_GRACE = float(os.getenv("QUIZ_ADVANCE_GRACE_SECONDS", "2"))
+# The automatic submission plus one retry if it gets no reply
+QUIZ_ADVANCE_ATTEMPTS = 2
+# Shortest timeout an LLM call gets near the deadline
+LLM_MIN_TIMEOUT = 1.0
+
+
+def quiz_remaining(state: AgentState) -> Optional[float]:
+    """Seconds left on the current quiz according to graph state (None if untracked)."""
+    started = state.get("quiz_started_at")
+    if started is None:
+        return None
+    return QUIZ_TIME_LIMIT - (time.time() - started)
+
+
+def _sync_budget(state: AgentState):
+    """Point the tools' budget at the graph's quiz clock, the only source of truth."""
+    budget = current_budget()
+    started = state.get("quiz_started_at")
+    if budget is not None and started is not None:
+        budget.reset(state.get("quiz_url"), started)
+
+
+def _failed_auto_submission(state: AgentState) -> bool:
+    """True if the last step was a deadline submission that got no server reply."""
+    messages = state["messages"]
+    last = messages[-1] if messages else None
+    return (
+        isinstance(last, ToolMessage)
+        and str(last.tool_call_id).startswith("deadline_")
+        and _submission_reply(last) is None
+    )
+
+
+def _llm_timeout(state: AgentState) -> float:
+    remaining = quiz_remaining(state)
+    # Once the deadline handler has acted, let the model finish its turn
+    if remaining is None or state.get("auto_advanced") == state.get("quiz_url"):
+        return LLM_TIMEOUT
+    return budget_timeout(max(LLM_MIN_TIMEOUT, min(LLM_TIMEOUT, remaining)))
+
+
+def _with_timeout(chain, timeout: float):
+    """``prompt | model`` chain with a per-request timeout bound on the model."""
+    return chain.first | chain.last.bind(timeout=timeout)
+
+
+def _deadline_action(state: AgentState, force: bool = False) -> Optional[Dict[str, Any]]:
+    """State update that moves past an expired quiz, or None while time remains.
+
+    With a known submit endpoint the runtime emits the post_request call
+    itself (the server answers late submissions with the next URL); the
+    tools node runs it and compaction starts the next quiz. If that
+    submission gets no reply it is sent once more. Without a submit
+    endpoint, the model is told to submit immediately. ``force`` acts
+    without waiting out QUIZ_ADVANCE_GRACE.
+    """
+    remaining = quiz_remaining(state)
+    quiz_url = state.get("quiz_url")
+    if remaining is None or (not force and remaining > -QUIZ_ADVANCE_GRACE):
+        return None
+    attempts = 1
+    if state.get("auto_advanced") == quiz_url:
+        # Already acted; submit once more only if the quiz server never answered
+        attempts = state.get("auto_advance_attempts", 1) + 1
+        if attempts > QUIZ_ADVANCE_ATTEMPTS or not _failed_auto_submission(state):
+            return None
+
+    submit_url = state.get("submit_url")
+    if not submit_url:
+        print(f"⏱️  Quiz {quiz_url} is out of time - telling the agent to submit now")
+        return {
+            "messages": [HumanMessage(content=(
+                f"Time is up for {quiz_url}. Submit your best answer NOW with post_request "
+                "(the server will reply with the next quiz URL). Do not run any other tool first."
+            ))],
+            "auto_advanced": quiz_url,
+        }
+
+    payload = dict(state.get("submit_payload") or {})
+    payload.setdefault("email", EMAIL)
+    payload.setdefault("secret", SECRET)
+    payload["url"] = quiz_url
+    payload.setdefault("answer", "skip")
+    retry = " (retry)" if attempts > 1 else ""
+    print(f"⏱️  Quiz {quiz_url} is out of time - submitting automatically to move on{retry}")
+    return {
+        "messages": [AIMessage(content="", tool_calls=[{
+            "name": "post_request",
+            "args": {"url": submit_url, "payload": payload},
+            "id": f"deadline_{uuid.uuid4().hex[:8]}",
+        }])],
+        "auto_advanced": quiz_url,
+        "auto_advance_attempts": attempts,
+    }
+
+
+def _llm_failure_action(state: AgentState, error: Exception) -> Dict[str, Any]:
+    """State update for a failed LLM call; the node never raises, so the chain goes on.
+
+    With no time left for another call, the runtime moves on to the next
+    quiz right away. Otherwise the step is retried with a note to the model.
+    """
+    remaining = quiz_remaining(state)
+    if remaining is not None and remaining <= LLM_MIN_TIMEOUT:
+        action = _deadline_action(state, force=True)
+        if action is not None:
+            return action
+    print(f"❌ LLM call failed: {error} - retrying the step")
+    return {"messages": [HumanMessage(content=(
+        f"(The previous model call failed: {type(error).__name__}. Continue with the current task.)"
+    ))]}
+
+
+def _rate_limit_headers(result) -> Optional[Dict[str, Any]]:
+    """Aipipe's response headers, removed from the reply (Gemini replies carry none)."""
+    metadata = getattr(result, "response_metadata", None)
+    if isinstance(metadata, dict):
+        # Not worth keeping in the message history
+        return metadata.pop("headers", None)
+    return None
+
+
+def _note_rate_limits(result):
+    """Feed Aipipe's x-ratelimit-* headers to the shared limiter."""
+    aipipe_limiter.update_from_headers(_rate_limit_headers(result))
+
+
+async def _anote_rate_limits(result):
+    await aipipe_limiter.aupdate_from_headers(_rate_limit_headers(result))
+
+
+def _record_usage(result):
+    usage = getattr(result, "usage_metadata", None) or {}
+    metadata = getattr(result, "response_metadata", None) or {}
+    model = metadata.get("model_name") or metadata.get("model") or "unknown"
+    for key, kind in (("input_tokens", "prompt"), ("output_tokens", "completion")):
+        if usage.get(key):
+            LLM_TOKENS.inc(usage[key], model=model, kind=kind)
+
+
+def _with_submission(result) -> Dict[str, Any]:
+    """State update for an LLM reply, remembering any answer submission it makes."""
+    update: Dict[str, Any] = {"messages": [result]}
+    for call in getattr(result, "tool_calls", None) or []:
+        if call["name"] == "post_request" and isinstance(call["args"].get("payload"), dict):
+            update["submit_url"] = call["args"].get("url")
+            update["submit_payload"] = call["args"]["payload"]
+    return update
+
+
+# -------------------------------------------------
+# AGENT NODE (provider routing + fallback)
+# -------------------------------------------------
+def _run_expired() -> bool:
+    workspace = current_workspace()
+    if workspace is not None and workspace.expired():
+        print(f"⏱️  Run exceeded its wall-clock limit ({workspace.elapsed():.0f}s) - stopping")
+        return True
+    return False
+
+
+# Races slow Aipipe calls against Gemini (LLM_HEDGE=1)
+hedger = (
+    Hedger(hedge_limiter=gemini_limiter, hedge_breaker=gemini_breaker)
+    if LLM_HEDGE and llm_gemini_hedge is not None else None
+)
+
+
+def _llm_candidates(timeout: float) -> List[Candidate]:
+    """Providers in order of preference, each with its prebuilt chain and breaker."""
+    aipipe = _with_timeout(llm_with_prompt, timeout)
+    candidates: List[Candidate] = [(aipipe_breaker, aipipe.invoke, aipipe.ainvoke)]
+    if llm_gemini is None:
+        return candidates
+    if hedger is not None:
+        hedge = _with_timeout(llm_with_prompt.first | llm_gemini_hedge, timeout)
+        candidates[0] = (
+            aipipe_breaker,
+            lambda input: hedger.invoke(aipipe, hedge, input),
+            lambda input: hedger.ainvoke(aipipe, hedge, input),
+        )
+    gemini = _with_timeout(llm_gemini_with_prompt, timeout)
+    candidates.append((gemini_breaker, gemini.invoke, gemini.ainvoke))
+    return candidates
+
+
+@traced("agent")
 def agent_node(state: AgentState):
-    """Agent node with automatic Aipipe → Gemini fallback on errors."""
+    """Agent node: sends the LLM call to the first provider whose circuit is closed.
+
+    Returns only the new message; the add_messages reducer appends it, so a
+    step never rebuilds or re-merges the whole history.
+    """
+    if _run_expired():
+        return {"messages": [AIMessage(content="END")]}
+    _sync_budget(state)
+    action = _deadline_action(state)
+    if action is not None:
+        return action
+
+    timeout = _llm_timeout(state)
+    try:
+        with AGENT_STEP_SECONDS.time(mode="sync"):
+            result = route_call(_llm_candidates(timeout), {"messages": state["messages"]},
+                                max_wait=min(LLM_ROUTER_MAX_WAIT, timeout))
+        _note_rate_limits(result)
+        _record_usage(result)
+        return _with_submission(result)
+    except Exception as e:
+        return _llm_failure_action(state, e)
+
+
+@traced("agent")
+async def aagent_node(state: AgentState):
+    """Async counterpart of ``agent_node``: same routing, awaiting the LLMs."""
+    if _run_expired():
+        return {"messages": [AIMessage(content="END")]}
+    _sync_budget(state)
+    action = _deadline_action(state)
+    if action is not None:
+        return action
+
+    timeout = _llm_timeout(state)
     try:
-        # Try Aipipe first
-        result = llm_with_prompt.invoke({"messages": state["messages"]})
-        return {"messages": state["messages"] + [result]}
+        with AGENT_STEP_SECONDS.time(mode="async"):
+            result = await aroute_call(_llm_candidates(timeout), {"messages": state["messages"]},
+                                       max_wait=min(LLM_ROUTER_MAX_WAIT, timeout))
+        await _anote_rate_limits(result)
+        _record_usage(result)
+        return _with_submission(result)
     except Exception as e:
-        error_msg = str(e).lower()
-        
-        # Check if it's a rate limit or token limit error
-        is_rate_limit = any(x in error_msg for x in [
-            'rate limit', 'rate_limit', 'ratelimit',
-            'too many requests', '429',
-            'quota', 'limit exceeded', 'token limit'
-        ])
-        
-        # If rate limited and Gemini is available, fallback to Gemini
-        if is_rate_limit and llm_gemini is not None:
-            print("\n⚠️  Aipipe rate limit - switching to Gemini (no wait, time is critical)...")
-            
-            try:
-                # Create Gemini version of the prompt
-                gemini_prompt = ChatPromptTemplate.from_messages([
-                    ("system", llm_with_prompt.first.messages[0].prompt.template),
-                    MessagesPlaceholder(variable_name="messages")
-                ])
-                llm_gemini_with_prompt = gemini_prompt | llm_gemini
-                
-                result = llm_gemini_with_prompt.invoke({"messages": state["messages"]})
-                print("✅ Gemini succeeded")
-                return {"messages": state["messages"] + [result]}
-            except Exception as gemini_error:
-                gemini_error_msg = str(gemini_error).lower()
-                
-                # If Gemini also rate limited, wait minimal time and retry once
-                if '429' in gemini_error_msg or 'resource exhausted' in gemini_error_msg:
-                    print(f"⚠️  Gemini also rate limited - waiting 2s for quick retry...")
-                    time.sleep(2)  # Minimal wait to respect rate limit
-                    
-                    try:
-                        result = llm_gemini_with_prompt.invoke({"messages": state["messages"]})
-                        print("✅ Gemini retry successful")
-                        return {"messages": state["messages"] + [result]}
-                    except Exception as retry_error:
-                        print(f"❌ Both APIs exhausted - cannot proceed")
-                        raise
-                else:
-                    print(f"❌ Gemini fallback failed: {gemini_error}")
-                    raise
-        else:
-            # Re-raise if not rate limit or Gemini not available
-            print(f"❌ Aipipe error (no fallback): {e}")
-            raise
+        return _llm_failure_action(state, e)
+
+
+# -------------------------------------------------
+# CONTEXT COMPACTION (between tools and agent)
+# -------------------------------------------------
+# Rough prompt budget for message history; ~4 characters per token
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "16000"))
+# The most recent tool outputs are always kept in full
+CONTEXT_KEEP_RECENT_TOOL_OUTPUTS = int(os.getenv("CONTEXT_KEEP_RECENT_TOOL_OUTPUTS", "3"))
+TRUNCATED_PREVIEW_CHARS = 400
+
+
+def _estimate_tokens(message) -> int:
+    content = message.content
+    if not isinstance(content, str):
+        content = json.dumps(content, default=str)
+    size = len(content)
+    # Runs over the whole history every step, so keep it to cheap len() calls
+    if isinstance(message, AIMessage) and message.tool_calls:
+        size += sum(len(str(call["args"])) for call in message.tool_calls)
+    return size // 4
+
+
+def _submission_reply(message) -> Optional[dict]:
+    """Return the server's JSON reply if ``message`` is a post_request result."""
+    if not isinstance(message, ToolMessage) or message.name != "post_request":
+        return None
+    try:
+        data = json.loads(message.content)
+    except (TypeError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _truncate_old_tool_outputs(messages: List) -> List:
+    """Shorten the oldest tool outputs until the history fits CONTEXT_TOKEN_BUDGET.
+
+    Truncated messages keep their id and tool_call_id, so add_messages
+    replaces them in place and the tool-call pairing stays valid.
+    """
+    total = sum(_estimate_tokens(m) for m in messages)
+    if total <= CONTEXT_TOKEN_BUDGET:
+        return []
+    tool_messages = [m for m in messages if isinstance(m, ToolMessage)]
+    candidates = tool_messages[:-CONTEXT_KEEP_RECENT_TOOL_OUTPUTS] if CONTEXT_KEEP_RECENT_TOOL_OUTPUTS else tool_messages
+    updates = []
+    for message in candidates:
+        if total <= CONTEXT_TOKEN_BUDGET:
+            break
+        content = message.content if isinstance(message.content, str) else json.dumps(message.content, default=str)
+        if message.additional_kwargs.get("compacted") or len(content) <= TRUNCATED_PREVIEW_CHARS:
+            continue
+        before = _estimate_tokens(message)
+        short = message.model_copy(update={
+            "content": f"{content[:TRUNCATED_PREVIEW_CHARS]}\n...[truncated {len(content) - TRUNCATED_PREVIEW_CHARS} chars of old output]",
+            "additional_kwargs": {**message.additional_kwargs, "compacted": True},
+        })
+        total -= before - _estimate_tokens(short)
+        updates.append(short)
+    return updates
+
+
+@traced("compact")
+def compact_node(state: AgentState):
+    """Keep the prompt bounded across long quiz chains.
+
+    When post_request moves on to a new quiz, the history of the finished
+    quiz is dropped and replaced by a fresh user message carrying the new
+    URL and the server's reply, and the quiz clock and last submission are
+    reset. Otherwise old tool outputs are truncated once the history exceeds
+    CONTEXT_TOKEN_BUDGET (and a wrong-answer reply re-syncs the clock with
+    the server's delay).
+    """
+    messages = state["messages"]
+    # Only the tool results of the last step can carry a new quiz URL
+    recent = []
+    for message in reversed(messages):
+        if not isinstance(message, ToolMessage):
+            break
+        recent.append(message)
+    clock = {}
+    for message in recent:
+        reply = _submission_reply(message)
+        if reply is None:
+            continue
+        url = reply.get("url")
+        if isinstance(url, str) and url:
+            print(f"🧹 New quiz {url} - dropping {len(messages)} messages of the previous quiz")
+            return {
+                "messages": [
+                    RemoveMessage(id=REMOVE_ALL_MESSAGES),
+                    HumanMessage(content=f"{url}\n\n(Previous quiz answered. Server response: {message.content})"),
+                ],
+                "quiz_url": url,
+                "quiz_started_at": time.time(),
+                # The previous quiz's answer must not be resubmitted for this one
+                "submit_url": None,
+                "submit_payload": None,
+                "auto_advanced": None,
+                "auto_advance_attempts": 0,
+            }
+        # Wrong answer on the same quiz: the server's delay is the authoritative elapsed time
+        delay = reply.get("delay")
+        if isinstance(delay, (int, float)):
+            clock = {"quiz_started_at": time.time() - delay}
+
+    updates = _truncate_old_tool_outputs(messages)
+    if updates:
+        print(f"🧹 Truncated {len(updates)} old tool outputs to stay within {CONTEXT_TOKEN_BUDGET} tokens")
+    return {"messages": updates, **clock}
 
 
 # -------------------------------------------------
@@ -263,13 +587,18 @@ def route(state):
     return "agent"
 graph = StateGraph(AgentState)
 
-graph.add_node("agent", agent_node)
-graph.add_node("tools", ToolNode(TOOLS))
+# Sync node for app.invoke, async node for app.ainvoke
+graph.add_node("agent", RunnableLambda(agent_node, afunc=aagent_node, name="agent"))
+# Tool calls of one turn run in parallel (bounded per run); oversized results
+# are stored in the workspace and replaced by a handle
+graph.add_node("tools", build_tool_node(TOOLS))
+graph.add_node("compact", compact_node)
 
 
 
 graph.add_edge(START, "agent")
-graph.add_edge("tools", "agent")
+graph.add_edge("tools", "compact")
+graph.add_edge("compact", "agent")
 graph.add_conditional_edges(
     "agent",    
     route       
@@ -281,28 +610,126 @@ app = graph.compile()
 # -------------------------------------------------
 # RUN AGENT
 # -------------------------------------------------
-def run_agent(url: str) -> str:
-    """Run the agent on a quiz URL until completion.
-    
-    The agent will continue solving quizzes until no new URL is found.
-    When complete, it prints a summary and returns the final state.
-    """
+def _print_start(url: str):
     print(f"\n{'='*60}")
     print(f"🚀 STARTING QUIZ AGENT")
     print(f"{'='*60}")
     print(f"Initial URL: {url}\n")
-    
-    final_state = app.invoke({
-        "messages": [{"role": "user", "content": url}]},
-        config={"recursion_limit": RECURSION_LIMIT},
-    )
-    
+
+
+def _print_done(final_state):
     print(f"\n{'='*60}")
     print(f"✅ ALL QUIZZES COMPLETED!")
     print(f"{'='*60}")
     print(f"Status: Agent returned 'END' - no more quiz URLs found")
     print(f"Total messages exchanged: {len(final_state.get('messages', []))}")
     print(f"{'='*60}\n")
+
+
+def _export_trace(trace, workspace):
+    """Write the run's Chrome trace into its workspace (kept with KEEP_WORKSPACES=1)."""
+    if trace is None:
+        return
+    try:
+        print(f"Trace: {trace.export(workspace.path)}")
+    except OSError as e:
+        print(f"⚠️  Could not write trace: {e}")
+
+
+def _record_run(budget, outcome: str):
+    ACTIVE_RUNS.dec()
+    RUNS.inc(outcome=outcome)
+    QUIZZES_PER_CHAIN.observe(budget.solved)
+
+
+def run_agent(url: str, tool_concurrency: Optional[int] = None,
+              on_step: Optional[Callable[[], None]] = None, run_id: Optional[str] = None) -> str:
+    """Run the agent on a quiz URL until completion.
     
+    The agent will continue solving quizzes until no new URL is found.
+    When complete, it prints a summary and returns the final state.
+    ``tool_concurrency`` caps parallel tool calls (default TOOL_MAX_CONCURRENCY).
+    ``on_step`` is called in the run's context after every agent step; it
+    may raise to abort the run (used by the job scheduler).
+    ``run_id`` names the workspace and the run's trace (see tools/tracing.py).
+    """
+    _print_start(url)
+
+    # Tools clamp their timeouts to the time left on the current quiz
+    budget = start_quiz_budget(url)
+    start_tool_limiter(tool_concurrency)
+    # Isolated directory + warm Python kernel for this run only, so
+    # concurrent /solve jobs never touch each other's files
+    workspace = create_workspace(run_id)
+    trace = start_trace(workspace.run_id, url)
+    with span("start_kernel", "setup"):
+        workspace.start_kernel()
+    print(f"Workspace: {workspace.path}\n")
+
+    ACTIVE_RUNS.inc()
+    outcome = "failed"
+    try:
+        final_state = None
+        with span("run", "run", url=url):
+            for mode, chunk in app.stream(
+                {"messages": [{"role": "user", "content": url}], "quiz_url": url, "quiz_started_at": time.time()},
+                config={"recursion_limit": RECURSION_LIMIT},
+                stream_mode=["updates", "values"],
+            ):
+                if mode == "values":
+                    final_state = chunk
+                elif "agent" in chunk and on_step is not None:
+                    on_step()
+        outcome = "completed"
+    finally:
+        _export_trace(trace, workspace)
+        workspace.cleanup()
+        _record_run(budget, outcome)
+    
+    _print_done(final_state)
     return final_state
 
+
+async def arun_agent(url: str, tool_concurrency: Optional[int] = None,
+                     on_step: Optional[Callable[[], None]] = None, run_id: Optional[str] = None):
+    """Async counterpart of ``run_agent``: the whole chain runs on the event loop.
+
+    LLM calls, HTTP, browser rendering and subprocesses are awaited instead of
+    blocking a thread, so many chains can share one loop. Call it from its own
+    task (asyncio.create_task copies the context), since it sets the run's
+    budget and workspace context variables.
+    """
+    _print_start(url)
+
+    budget = start_quiz_budget(url)
+    start_tool_limiter(tool_concurrency)
+    workspace = create_workspace(run_id)
+    trace = start_trace(workspace.run_id, url)
+    # Spawning the kernel (fork/exec of uv) blocks briefly; start() itself
+    # does not wait for the kernel to be ready
+    with span("start_kernel", "setup"):
+        await asyncio.to_thread(workspace.start_kernel)
+    print(f"Workspace: {workspace.path}\n")
+
+    ACTIVE_RUNS.inc()
+    outcome = "failed"
+    try:
+        final_state = None
+        with span("run", "run", url=url):
+            async for mode, chunk in app.astream(
+                {"messages": [{"role": "user", "content": url}], "quiz_url": url, "quiz_started_at": time.time()},
+                config={"recursion_limit": RECURSION_LIMIT},
+                stream_mode=["updates", "values"],
+            ):
+                if mode == "values":
+                    final_state = chunk
+                elif "agent" in chunk and on_step is not None:
+                    on_step()
+        outcome = "completed"
+    finally:
+        await asyncio.to_thread(_export_trace, trace, workspace)
+        await asyncio.to_thread(workspace.cleanup)
+        _record_run(budget, outcome)
+
+    _print_done(final_state)
+    return final_state
@@ -0,0 +1,107 @@
+"""
+Micro-benchmark: per-step overhead of the compiled agent graph as history grows.
+
+Runs a long synthetic quiz chain through agent.graph with a stub LLM (no
+network) that calls a cheap tool on every step, and reports the average
+time per agent step for each window of steps. --legacy runs the same chain
+with an agent node that returns the full message list, for comparison.
+The chain never submits an answer, so history is never reset by the
+compaction node: what remains of the per-step growth is add_messages
+normalising the stored list and the prompt template formatting it.
+
+    uv run python benchmarks/agent_graph_bench.py --steps 1000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# The agent module validates its API keys at import time
+os.environ.setdefault("AIPIPE_API_KEY", "benchmark")
+os.environ.pop("GOOGLE_API_KEY", None)
+
+from langchain_core.messages import AIMessage  # noqa: E402
+from langchain_core.runnables import RunnableLambda  # noqa: E402
+
+import agent  # noqa: E402
+
+FILLER = "Reasoning about the page and deciding the next tool call. " * 4
+
+
+def stub_llm(steps: int):
+    """Return a runnable that emits ``steps`` tool calls and then END."""
+    counter = {"n": 0}
+
+    def respond(prompt_value, **kwargs):
+        counter["n"] += 1
+        n = counter["n"]
+        if n > steps:
+            return AIMessage(content="END")
+        return AIMessage(
+            content=FILLER,
+            tool_calls=[{"name": "read_artifact", "args": {"artifact_id": "missing"}, "id": f"call_{n}"}],
+        )
+
+    return agent.prompt | RunnableLambda(respond)
+
+
+def legacy_graph():
+    """The graph as it was before delta updates: agent returns the whole history."""
+    def legacy_agent_node(state):
+        return {"messages": state["messages"] + agent.agent_node(state)["messages"]}
+
+    graph = agent.graph.__class__(agent.AgentState)
+    graph.add_node("agent", legacy_agent_node)
+    for name, spec in agent.graph.nodes.items():
+        if name != "agent":
+            graph.add_node(name, spec.runnable)
+    graph.add_edge(agent.START, "agent")
+    graph.add_edge("tools", "compact")
+    graph.add_edge("compact", "agent")
+    graph.add_conditional_edges("agent", agent.route)
+    return graph.compile()
+
+
+def run(steps: int, window: int, legacy: bool):
+    agent.llm_with_prompt = stub_llm(steps)
+    app = legacy_graph() if legacy else agent.app
+
+    step_times = []
+    last = time.perf_counter()
+    start = last
+    for update in app.stream(
+        {"messages": [{"role": "user", "content": "https://example.com/quiz-1"}]},
+        config={"recursion_limit": steps * 3 + 10},
+        stream_mode="updates",
+    ):
+        if "agent" in update:
+            now = time.perf_counter()
+            step_times.append(now - last)
+            last = now
+    total = time.perf_counter() - start
+
+    label = "legacy (full list)" if legacy else "delta"
+    print(f"\n{label}: {len(step_times)} agent steps in {total:.2f}s")
+    print(f"{'steps':>13}  {'history':>8}  {'ms/step':>8}")
+    for i in range(0, len(step_times), window):
+        chunk = step_times[i:i + window]
+        # Each step adds an AI message and a tool message
+        history = 1 + 2 * (i + len(chunk))
+        print(f"{i + 1:>6}-{i + len(chunk):<6}  {history:>8}  {1000 * sum(chunk) / len(chunk):>8.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--steps", type=int, default=500, help="tool-calling steps in the synthetic chain")
+    parser.add_argument("--window", type=int, default=100, help="steps per reported row")
+    parser.add_argument("--legacy", action="store_true", help="also run the old full-list agent node")
+    args = parser.parse_args()
+
+    run(args.steps, args.window, legacy=False)
+    if args.legacy:
+        run(args.steps, args.window, legacy=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Replay benchmark: re-run a recorded quiz chain offline through agent.graph.
+
+First record a real chain once (live LLMs, quiz server and Gemini):
+
+    uv run python benchmarks/replay_bench.py record https://example.com/quiz-1 --cassette cassettes/quiz.jsonl
+
+Then replay it as often as needed. LLM responses, HTTP exchanges and
+browser renders come from the cassette; run_code, the graph, compaction
+and the tool executor run for real. With --latency zero (the default) the
+recorded waits are skipped, so what remains is framework and tool overhead;
+--latency recorded reproduces the original timing. Each replay prints the
+wall time and where it went, from the run's trace.
+
+    uv run python benchmarks/replay_bench.py replay https://example.com/quiz-1 --cassette cassettes/quiz.jsonl --repeat 5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.cassette import use_cassette  # noqa: E402
+
+
+def run_chain(url: str, use_async: bool, run_id: str):
+    import agent
+
+    if use_async:
+        return asyncio.run(agent.arun_agent(url, run_id=run_id))
+    return agent.run_agent(url, run_id=run_id)
+
+
+def breakdown(run_id: str):
+    """Wall time per span category, plus the time between graph steps."""
+    from tools.tracing import get_trace
+
+    trace = get_trace(run_id)
+    if trace is None:
+        print("(tracing disabled: set TRACE_RUNS=1 for a breakdown)")
+        return
+    events = [e for e in trace.to_chrome()["traceEvents"] if e["ph"] == "X"]
+    run = next((e for e in events if e["cat"] == "run"), None)
+    totals = defaultdict(float)
+    counts = defaultdict(int)
+    for e in events:
+        if e["cat"] == "run":
+            continue
+        name = e["name"] if e["cat"] == "graph" else e["cat"]
+        totals[name] += e["dur"] / 1000
+        counts[name] += 1
+    print(f"{'span':>12}  {'count':>6}  {'total ms':>10}")
+    for name in sorted(totals, key=totals.get, reverse=True):
+        print(f"{name:>12}  {counts[name]:>6}  {totals[name]:>10.1f}")
+    if run is not None:
+        steps = sum(totals[n] for n in ("agent", "tools", "compact"))
+        print(f"{'between steps':>12}  {'':>6}  {run['dur'] / 1000 - steps:>10.1f}")
+
+
+def record(args):
+    cassette = use_cassette(args.cassette, "record")
+    started = time.perf_counter()
+    run_chain(args.url, args.use_async, run_id="record")
+    print(f"\nRecorded {args.url} in {time.perf_counter() - started:.1f}s -> {cassette.path}")
+
+
+def replay(args):
+    # Replayed calls never reach a provider, but the modules still expect keys
+    os.environ.setdefault("AIPIPE_API_KEY", "replay")
+    os.environ.setdefault("GOOGLE_API_KEY", "replay")
+    for i in range(args.repeat):
+        cassette = use_cassette(args.cassette, "replay", args.latency)
+        run_id = f"replay{i + 1}"
+        started = time.perf_counter()
+        run_chain(args.url, args.use_async, run_id=run_id)
+        elapsed = time.perf_counter() - started
+        stats = cassette.stats()
+        print(f"\nReplay {i + 1}/{args.repeat} ({args.latency} latency): {elapsed:.3f}s, "
+              f"{stats['served']} interactions served, {stats['llm_remaining']} LLM responses unused, "
+              f"{stats['llm_mismatches']} prompt mismatches")
+        breakdown(run_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("url", help="first quiz URL of the chain")
+    parser.add_argument("--cassette", default="cassettes/run.jsonl", help="cassette file (JSONL)")
+    parser.add_argument("--latency", choices=["zero", "recorded"], default="zero",
+                        help="replay: skip or reproduce the recorded waits")
+    parser.add_argument("--repeat", type=int, default=1, help="replay: number of runs")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="use the async agent (arun_agent)")
+    args = parser.parse_args()
+
+    if args.mode == "record":
+        record(args)
+    else:
+        replay(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Hedged LLM requests.
+The primary model (Aipipe) is asked first. If it has not answered within
+the LLM_HEDGE_PERCENTILE of its recent latencies, the same prompt is sent
+to the fallback model (Gemini) as well; the first complete response wins
+and the other request is cancelled. A hedge is only sent when the
+fallback's rate limiter has a token to spare right now and its circuit
+breaker is closed, so hedging never queues behind (or starves) normal
+fallback traffic.
+In the sync agent the losing request runs in a worker thread and cannot
+be interrupted; its result is discarded.
+A winning hedge is returned as llm_router.ServedBy, so the router records
+the call against the hedge's breaker (and any earlier primary failure
+against the primary's) exactly once.
+"""
+import asyncio
+import contextvars
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from llm_router import ServedBy
+from tools.metrics import LLM_HEDGES
+from tools.tracing import span
+
+load_dotenv()
+
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "90"))
+# Delay used until enough primary latencies have been seen
+LLM_HEDGE_INITIAL_DELAY = float(os.getenv("LLM_HEDGE_INITIAL_DELAY_SECONDS", "15"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "2"))
+LLM_HEDGE_MIN_SAMPLES = 10
+LLM_HEDGE_WINDOW = 200
+
+
+class LatencyTracker:
+    """Sliding window of recent request latencies."""
+
+    def __init__(self, window: int = LLM_HEDGE_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, math.ceil(p / 100 * len(samples)) - 1))
+        return samples[index]
+
+
+def _invoke(chain, name: str, input: Any):
+    with span(name, "llm"):
+        return chain.invoke(input)
+
+
+async def _ainvoke(chain, name: str, input: Any):
+    with span(name, "llm"):
+        return await chain.ainvoke(input)
+
+
+class Hedger:
+    """Races a primary chain against a rate-limited hedge chain."""
+
+    def __init__(self, hedge_limiter=None, hedge_breaker=None, percentile: float = LLM_HEDGE_PERCENTILE):
+        self.hedge_limiter = hedge_limiter
+        self.hedge_breaker = hedge_breaker
+        self.percentile = percentile
+        self.latency = LatencyTracker()
+        self._counts = {
+            "requests": 0,
+            "hedged": 0,
+            "primary_wins": 0,
+            "hedge_wins": 0,
+            "skipped_rate_limited": 0,
+            "hedge_errors": 0,
+        }
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-hedge")
+
+    def delay(self) -> float:
+        """Seconds to wait for the primary before hedging."""
+        if len(self.latency) < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_INITIAL_DELAY
+        return max(LLM_HEDGE_MIN_DELAY, self.latency.percentile(self.percentile))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+        counts["delay_seconds"] = round(self.delay(), 2)
+        counts["latency_samples"] = len(self.latency)
+        return counts
+
+    def _count(self, key: str):
+        with self._lock:
+            self._counts[key] += 1
+        if key != "requests":
+            LLM_HEDGES.inc(outcome=key)
+
+    def invoke(self, primary, hedge, input: Any):
+        """Sync race: threads for both requests, the loser is abandoned."""
+        self._count("requests")
+        started = time.monotonic()
+        # Copy the context so the graph's run config (callbacks, streaming) follows the calls
+        primary_future = self._pool.submit(contextvars.copy_context().run, _invoke, primary, "primary", input)
+        done, _ = wait([primary_future], timeout=self.delay())
+        if done:
+            return self._primary_result(primary_future.result, started)
+        if not self._hedge_allowed() or (
+                self.hedge_limiter is not None and not self.hedge_limiter.acquire(blocking=False)):
+            self._count("skipped_rate_limited")
+            return self._primary_result(primary_future.result, started)
+
+        self._count("hedged")
+        print("⏳ Aipipe is slow - hedging with Gemini")
+        hedge_future = self._pool.submit(contextvars.copy_context().run, _invoke, hedge, "hedge", input)
+        pending = {primary_future, hedge_future}
+        primary_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                error = future.exception()
+                if future is primary_future:
+                    if error is None:
+                        self._primary_won(started)
+                        return future.result()
+                    primary_error = error
+                elif error is None:
+                    return self._hedge_won(started, future.result(), primary_error)
+                else:
+                    self._hedge_failed(error)
+        raise primary_error
+
+    async def ainvoke(self, primary, hedge, input: Any):
+        """Async race: the losing request's task is cancelled."""
+        self._count("requests")
+        started = time.monotonic()
+        primary_task = asyncio.ensure_future(_ainvoke(primary, "primary", input))
+        try:
+            done, _ = await asyncio.wait([primary_task], timeout=self.delay())
+            if done:
+                return self._primary_result(primary_task.result, started)
+            if not self._hedge_allowed() or (
+                    self.hedge_limiter is not None and not await self.hedge_limiter.aacquire(blocking=False)):
+                self._count("skipped_rate_limited")
+                await asyncio.wait([primary_task])
+                return self._primary_result(primary_task.result, started)
+
+            self._count("hedged")
+            print("⏳ Aipipe is slow - hedging with Gemini")
+            hedge_task = asyncio.ensure_future(_ainvoke(hedge, "hedge", input))
+            pending = {primary_task, hedge_task}
+            primary_error = None
+            try:
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        error = task.exception()
+                        if task is primary_task:
+                            if error is None:
+                                self._primary_won(started)
+                                return task.result()
+                            primary_error = error
+                        elif error is None:
+                            return self._hedge_won(started, task.result(), primary_error)
+                        else:
+                            self._hedge_failed(error)
+                raise primary_error
+            finally:
+                hedge_task.cancel()
+        finally:
+            primary_task.cancel()
+
+    def _hedge_allowed(self) -> bool:
+        # Hedges never probe a provider whose circuit is open
+        return self.hedge_breaker is None or self.hedge_breaker.closed
+
+    def _hedge_failed(self, error: BaseException):
+        self._count("hedge_errors")
+        if self.hedge_breaker is not None:
+            self.hedge_breaker.record_failure(error)
+
+    def _primary_result(self, result, started: float):
+        value = result()
+        self.latency.record(time.monotonic() - started)
+        return value
+
+    def _primary_won(self, started: float):
+        self._count("primary_wins")
+        self.latency.record(time.monotonic() - started)
+
+    def _hedge_won(self, started: float, result, primary_error: Optional[BaseException]):
+        self._count("hedge_wins")
+        # The primary took at least this long; keep it as a lower bound so the
+        # percentile does not drift below what the primary really needs
+        self.latency.record(time.monotonic() - started)
+        print("✅ Gemini hedge answered first")
+        if self.hedge_breaker is None:
+            return result
+        return ServedBy(result, self.hedge_breaker, primary_error)
@@ -0,0 +1,301 @@
+"""
+LLM provider routing with a circuit breaker per provider.
+A provider that answers with a 429 / quota error is taken out of rotation
+("open") for its Retry-After (or LLM_BREAKER_COOLDOWN_SECONDS), so later
+steps go straight to the next healthy provider instead of paying a failed
+round trip first. After the cooldown one request is let through as a probe
+("half-open"): success closes the breaker, another failure re-opens it.
+Errors that are not rate limits are raised to the caller unchanged.
+When a breaker has a shared rate limiter, opening it also pauses that
+limiter, so other processes on the host hold off as well.
+A candidate may answer with ``ServedBy`` (a winning hedge): the router
+then records the call once, against the provider that actually answered.
+Calls go through tools.cassette, so they can be recorded and replayed.
+"""
+import asyncio
+import email.utils
+import os
+import re
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from tools.metrics import LLM_BREAKER_TRIPS, LLM_FALLBACKS, LLM_REQUEST_SECONDS, LLM_SKIPPED
+from tools.cassette import allm_call, llm_call
+from tools.tracing import rename_span, size_of, span
+
+load_dotenv()
+
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+# Longest a step waits for a breaker to half-open when every provider is out
+LLM_ROUTER_MAX_WAIT = float(os.getenv("LLM_ROUTER_MAX_WAIT_SECONDS", "10"))
+MAX_RETRY_AFTER = 300.0
+
+RATE_LIMIT_MARKERS = (
+    'rate limit', 'rate_limit', 'ratelimit',
+    'too many requests', '429', 'resource exhausted', 'resource_exhausted',
+    'quota', 'limit exceeded', 'token limit'
+)
+# Gemini puts the delay in the error body: "Please retry in 37.2s" / "retryDelay": "37s"
+RETRY_DELAY_RE = re.compile(r'retry in ([\d.]+)\s*s|"?retry_?delay"?\W+(?:seconds\W+)?([\d.]+)', re.IGNORECASE)
+
+
+def _error_chain(error: BaseException):
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    for e in _error_chain(error):
+        if getattr(e, "status_code", None) == 429 or getattr(e, "code", None) == 429:
+            return True
+        if any(marker in str(e).lower() for marker in RATE_LIMIT_MARKERS):
+            return True
+    return False
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the provider asked us to wait, from headers or the error body."""
+    for e in _error_chain(error):
+        value = getattr(e, "retry_after", None)
+        if isinstance(value, (int, float)) and value > 0:
+            return min(float(value), MAX_RETRY_AFTER)
+        headers = getattr(getattr(e, "response", None), "headers", None)
+        header = headers.get("retry-after") if headers is not None else None
+        if header:
+            try:
+                return min(float(header), MAX_RETRY_AFTER)
+            except ValueError:
+                parsed = email.utils.parsedate_to_datetime(header)
+                if parsed:
+                    return min(max(0.0, parsed.timestamp() - time.time()), MAX_RETRY_AFTER)
+        match = RETRY_DELAY_RE.search(str(e))
+        if match:
+            return min(float(match.group(1) or match.group(2)), MAX_RETRY_AFTER)
+    return None
+
+
+class CircuitBreaker:
+    """closed -> open (rate limited) -> half-open (one probe) -> closed."""
+
+    def __init__(self, name: str, cooldown: float = LLM_BREAKER_COOLDOWN, limiter=None):
+        self.name = name
+        self.cooldown = cooldown
+        self.limiter = limiter
+        self.state = "closed"
+        self.open_until = 0.0
+        self.trips = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def closed(self) -> bool:
+        return self.state == "closed"
+
+    def allow(self) -> bool:
+        """Whether a request may go to this provider now (claims the probe when half-open)."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() >= self.open_until:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                print(f"🔌 {self.name}: cooldown over - probing")
+                return True
+            return False
+
+    def retry_in(self) -> float:
+        """Seconds until the breaker lets a request through again."""
+        if self.state == "closed":
+            return 0.0
+        return max(0.0, self.open_until - time.monotonic())
+
+    def record_success(self):
+        with self._lock:
+            if self.state == "open":
+                # A request that started earlier; a newer rate limit wins
+                return
+            if self.state != "closed":
+                print(f"✅ {self.name}: circuit closed")
+            self.state = "closed"
+            self._probing = False
+
+    def release_probe(self):
+        """The probe was abandoned without an answer; let the next request probe."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self, error: BaseException) -> bool:
+        """Note a failed request. Returns True if it opened the breaker (rate limit)."""
+        with self._lock:
+            was_probe = self._probing
+            self._probing = False
+            if not is_rate_limit_error(error):
+                if was_probe:
+                    # The provider answered, so it is not rate limited any more
+                    self.state = "closed"
+                return False
+            delay = retry_after(error) or self.cooldown
+            already_open = self.state == "open"
+            self.state = "open"
+            self.open_until = max(self.open_until, time.monotonic() + delay)
+            if not already_open:
+                self.trips += 1
+        if not already_open:
+            LLM_BREAKER_TRIPS.inc(provider=self.name)
+            print(f"⚠️  {self.name} rate limited - circuit open for {delay:.1f}s")
+        if self.limiter is not None:
+            self.limiter.pause(delay)
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        return {"state": self.state, "retry_in_seconds": round(self.retry_in(), 1), "trips": self.trips}
+
+
+# (breaker, sync call, async call) per provider, in order of preference
+Candidate = Tuple[CircuitBreaker, Callable[[Any], Any], Callable[[Any], Awaitable[Any]]]
+
+
+class ServedBy:
+    """A candidate's answer that came from another provider (a winning hedge).
+
+    ``primary_error`` is the candidate's own failure, if it failed before
+    the other provider answered.
+    """
+    __slots__ = ("result", "breaker", "primary_error")
+
+    def __init__(self, result: Any, breaker: CircuitBreaker, primary_error: Optional[BaseException] = None):
+        self.result = result
+        self.breaker = breaker
+        self.primary_error = primary_error
+
+
+class ProvidersUnavailable(Exception):
+    """Every provider's breaker is open."""
+
+
+def _next_opening(candidates: List[Candidate]) -> float:
+    return min(breaker.retry_in() for breaker, _, _ in candidates)
+
+
+def _unwrapping(call: Callable[[Any], Any], served: List[ServedBy]) -> Callable[[Any], Any]:
+    """``call`` returning the bare result; a ServedBy is kept in ``served`` (cassettes store the result)."""
+    def unwrap(input):
+        result = call(input)
+        if isinstance(result, ServedBy):
+            served.append(result)
+            return result.result
+        return result
+    return unwrap
+
+
+def _aunwrapping(acall: Callable[[Any], Awaitable[Any]], served: List[ServedBy]) -> Callable[[Any], Awaitable[Any]]:
+    async def unwrap(input):
+        result = await acall(input)
+        if isinstance(result, ServedBy):
+            served.append(result)
+            return result.result
+        return result
+    return unwrap
+
+
+def _note_served(served: List[ServedBy], args: Dict[str, Any]):
+    if served:
+        rename_span(f"llm:{served[0].breaker.name}")
+        args["hedged"] = True
+
+
+def _succeeded(breaker: CircuitBreaker, started: float, served: List[ServedBy]):
+    """Record a successful call once, against the provider that answered it."""
+    if served:
+        if served[0].primary_error is not None:
+            _failed(breaker, served[0].primary_error, started)
+        else:
+            # Still running (or abandoned); if it was the half-open probe, free it
+            breaker.release_probe()
+        breaker = served[0].breaker
+    LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, provider=breaker.name, outcome="ok")
+    breaker.record_success()
+
+
+def _failed(breaker: CircuitBreaker, error: Exception, started: float) -> bool:
+    """Record a failed call; True if it was a rate limit and the next provider should be tried."""
+    rate_limited = breaker.record_failure(error)
+    outcome = "rate_limited" if rate_limited else "error"
+    LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, provider=breaker.name, outcome=outcome)
+    if rate_limited:
+        LLM_FALLBACKS.inc(provider=breaker.name)
+    return rate_limited
+
+
+def route_call(candidates: List[Candidate], input: Any, max_wait: float = LLM_ROUTER_MAX_WAIT):
+    """Call the first provider whose breaker allows it, failing over on rate limits."""
+    last_error: Optional[BaseException] = None
+    for attempt in range(2):
+        for breaker, call, _ in candidates:
+            if not breaker.allow():
+                LLM_SKIPPED.inc(provider=breaker.name)
+                continue
+            started = time.perf_counter()
+            served: List[ServedBy] = []
+            try:
+                with span(f"llm:{breaker.name}", "llm", input_chars=size_of(input)) as args:
+                    result = llm_call(breaker.name, _unwrapping(call, served), input)
+                    args["output_chars"] = size_of(result)
+                    _note_served(served, args)
+            except Exception as e:
+                if _failed(breaker, e, started):
+                    last_error = e
+                    continue
+                raise
+            _succeeded(breaker, started, served)
+            return result
+        wait = _next_opening(candidates)
+        if attempt or wait > max_wait:
+            break
+        print(f"⏳ All LLM providers rate limited - waiting {wait:.1f}s")
+        with span("providers_unavailable", "wait"):
+            time.sleep(wait)
+    raise last_error or ProvidersUnavailable(
+        ", ".join(f"{b.name} open for {b.retry_in():.0f}s" for b, _, _ in candidates))
+
+
+async def aroute_call(candidates: List[Candidate], input: Any, max_wait: float = LLM_ROUTER_MAX_WAIT):
+    """Async counterpart of ``route_call``."""
+    last_error: Optional[BaseException] = None
+    for attempt in range(2):
+        for breaker, _, acall in candidates:
+            if not breaker.allow():
+                LLM_SKIPPED.inc(provider=breaker.name)
+                continue
+            started = time.perf_counter()
+            served: List[ServedBy] = []
+            try:
+                with span(f"llm:{breaker.name}", "llm", input_chars=size_of(input)) as args:
+                    result = await allm_call(breaker.name, _aunwrapping(acall, served), input)
+                    args["output_chars"] = size_of(result)
+                    _note_served(served, args)
+            except asyncio.CancelledError:
+                breaker.release_probe()
+                raise
+            except Exception as e:
+                if _failed(breaker, e, started):
+                    last_error = e
+                    continue
+                raise
+            _succeeded(breaker, started, served)
+            return result
+        wait = _next_opening(candidates)
+        if attempt or wait > max_wait:
+            break
+        print(f"⏳ All LLM providers rate limited - waiting {wait:.1f}s")
+        with span("providers_unavailable", "wait"):
+            await asyncio.sleep(wait)
+    raise last_error or ProvidersUnavailable(
+        ", ".join(f"{b.name} open for {b.retry_in():.0f}s" for b, _, _ in candidates))
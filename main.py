@@ -1,10 +1,20 @@
-from fastapi import FastAPI, Request, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.exceptions import HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from agent import run_agent
+from contextlib import asynccontextmanager
+from scheduler import QueueFull, get_scheduler, start_scheduler
+from agent import aipipe_breaker, gemini_breaker, hedger
+from tools.browser_pool import get_async_browser_pool, get_browser_pool
+from tools.http_client import close_async_client
+from tools.result_cache import get_result_cache
+from tools.rate_limits import aipipe_limiter, gemini_limiter
+from tools.metrics import render as render_metrics
+from tools.tracing import get_trace
+from tools.local_stt import preload_local_model
 from dotenv import load_dotenv
 import uvicorn
+import asyncio
 import os
 import time
 
@@ -12,8 +22,30 @@ load_dotenv()
 
 EMAIL = os.getenv("EMAIL") 
 SECRET = os.getenv("SECRET")
+# Async mode runs every quiz chain on this server's event loop (ainvoke,
+# async tools); set AGENT_ASYNC=0 to run each job on a threadpool thread
+AGENT_ASYNC = os.getenv("AGENT_ASYNC", "1").lower() not in ("0", "false", "no")
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Launch Chromium up front so the first render doesn't pay for it
+    preload_local_model()
+    if AGENT_ASYNC:
+        pool = get_async_browser_pool()
+        await pool.start()
+    else:
+        pool = get_browser_pool()
+    scheduler = start_scheduler(use_async=AGENT_ASYNC)
+    yield
+    await scheduler.stop()
+    if AGENT_ASYNC:
+        await pool.close()
+        await close_async_client()
+    else:
+        pool.close()
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # or specific domains
@@ -23,15 +55,34 @@ app.add_middleware(
 )
 START_TIME = time.time()
 @app.get("/healthz")
-def healthz():
+async def healthz():
     """Simple liveness check."""
+    # SQLite-backed and shared with other workers (their write lock can hold
+    # these for seconds), so read off the event loop
+    cache_stats, aipipe_limits, gemini_limits = await asyncio.gather(
+        asyncio.to_thread(get_result_cache().stats),
+        asyncio.to_thread(aipipe_limiter.status),
+        asyncio.to_thread(gemini_limiter.status),
+    )
     return {
         "status": "ok",
-        "uptime_seconds": int(time.time() - START_TIME)
+        "uptime_seconds": int(time.time() - START_TIME),
+        "mode": "async" if AGENT_ASYNC else "sync",
+        "browser_pool": get_async_browser_pool().status() if AGENT_ASYNC else get_browser_pool().status(),
+        "gemini_result_cache": cache_stats,
+        "jobs": get_scheduler().stats(),
+        "llm_providers": {b.name: b.status() for b in (aipipe_breaker, gemini_breaker)},
+        "rate_limits": {"aipipe": aipipe_limits, "gemini": gemini_limits},
+        "llm_hedging": hedger.stats() if hedger is not None else None
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint (per worker process)."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.post("/solve")
-async def solve(request: Request, background_tasks: BackgroundTasks):
+async def solve(request: Request):
     try:
         data = await request.json()
     except Exception:
@@ -46,9 +97,44 @@ async def solve(request: Request, background_tasks: BackgroundTasks):
     if secret != SECRET:
         raise HTTPException(status_code=403, detail="Invalid secret")
     print("Verified starting the task...")
-    background_tasks.add_task(run_agent, url)
+    try:
+        job = get_scheduler().submit(url)
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Too many queued jobs: {e}")
+
+    return JSONResponse(status_code=200, content={"status": "ok", "job_id": job.id})
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Progress of a /solve job: status, current quiz URL, steps, elapsed time."""
+    job = get_scheduler().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job.to_dict()
+
 
-    return JSONResponse(status_code=200, content={"status": "ok"})
+@app.get("/jobs/{job_id}/trace")
+async def job_trace(job_id: str):
+    """The job's span timeline as Chrome trace JSON (open in Perfetto / chrome://tracing)."""
+    trace = get_trace(job_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="No trace for this job")
+    return trace.to_chrome()
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, request: Request):
+    try:
+        data = await request.json()
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    if not isinstance(data, dict) or data.get("secret") != SECRET:
+        raise HTTPException(status_code=403, detail="Invalid secret")
+    job = get_scheduler().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job.to_dict()
 
 
 if __name__ == "__main__":
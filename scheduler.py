@@ -0,0 +1,215 @@
+"""
+Job scheduler for /solve.
+Quiz chains are admitted into a bounded queue and run by a fixed number of
+worker tasks (SOLVE_MAX_CONCURRENT_JOBS), so a burst of requests waits its
+turn instead of every chain fighting over the LLM rate limiter at once.
+Every job has an id with a status record (current quiz URL, agent steps,
+elapsed time) and can be cancelled. A job whose current quiz is more than
+JOB_QUIZ_GRACE_SECONDS past its deadline (measured with the server's
+"delay") is stopped.
+"""
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from agent import arun_agent, run_agent
+from tools.budget import current_budget
+from tools.metrics import SOLVE_JOBS, SOLVE_JOBS_FINISHED
+
+load_dotenv()
+
+SOLVE_MAX_CONCURRENT_JOBS = int(os.getenv("SOLVE_MAX_CONCURRENT_JOBS", "4"))
+SOLVE_QUEUE_SIZE = int(os.getenv("SOLVE_QUEUE_SIZE", "32"))
+JOB_QUIZ_GRACE_SECONDS = float(os.getenv("JOB_QUIZ_GRACE_SECONDS", "60"))
+# Finished jobs kept for GET /jobs/{id}
+JOB_HISTORY = 200
+
+
+class JobStopped(Exception):
+    """Raised inside a run to stop it (cancellation or missed deadline)."""
+
+
+class QueueFull(Exception):
+    """The admission queue is full; the caller should retry later."""
+
+
+class Job:
+    def __init__(self, url: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.url = url
+        self.status = "queued"
+        self.current_url = url
+        self.steps = 0
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.quiz_remaining: Optional[float] = None
+        self.stop_reason: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed", "cancelled", "deadline_exceeded")
+
+    def on_step(self):
+        """Called in the run's context after every agent step."""
+        self.steps += 1
+        budget = current_budget()
+        if budget is not None:
+            self.current_url = budget.url or self.current_url
+            self.quiz_remaining = budget.remaining()
+            if budget.elapsed() > budget.limit + JOB_QUIZ_GRACE_SECONDS and self.stop_reason is None:
+                self.stop_reason = "deadline_exceeded"
+        if self.stop_reason is not None:
+            raise JobStopped(self.stop_reason)
+
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "url": self.url,
+            "status": self.status,
+            "current_url": self.current_url,
+            "steps": self.steps,
+            "elapsed_seconds": round(self.elapsed(), 1),
+            "quiz_remaining_seconds": None if self.quiz_remaining is None else round(self.quiz_remaining, 1),
+            "queued_seconds": round((self.started_at or time.time()) - self.created_at, 1),
+            "error": self.error,
+        }
+
+
+class JobScheduler:
+    """Bounded worker pool over an admission queue of quiz chains."""
+
+    def __init__(self, workers: int = SOLVE_MAX_CONCURRENT_JOBS, queue_size: int = SOLVE_QUEUE_SIZE,
+                 use_async: bool = True):
+        self.workers = max(1, workers)
+        self.use_async = use_async
+        self._queue: "asyncio.Queue[Job]" = asyncio.Queue(maxsize=max(1, queue_size))
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker(), name=f"solve-worker-{i}") for i in range(self.workers)]
+
+    async def stop(self):
+        for job in self._jobs.values():
+            if not job.finished:
+                self.cancel(job.id)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def submit(self, url: str) -> Job:
+        """Queue a quiz chain. Raises QueueFull when the admission queue is full."""
+        job = Job(url)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFull(f"{self._queue.qsize()} jobs already waiting")
+        self._jobs[job.id] = job
+        self._prune()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a queued or running job; finished jobs are left untouched."""
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+        job.stop_reason = "cancelled"
+        if job.status == "queued":
+            job.status = "cancelled"
+            job.finished_at = time.time()
+            return job
+        job.status = "cancelling"
+        if self.use_async and job.task is not None:
+            job.task.cancel()
+        # Sync runs stop at their next agent step (on_step raises)
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        running = sum(1 for j in self._jobs.values() if j.status in ("running", "cancelling"))
+        return {
+            "workers": self.workers,
+            "running": running,
+            "queued": self._queue.qsize(),
+            "queue_size": self._queue.maxsize,
+            "tracked": len(self._jobs),
+        }
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - JOB_HISTORY)]:
+            del self._jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.status == "queued":
+                    await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        job.status = "running"
+        job.started_at = time.time()
+        print(f"▶️  Job {job.id} started: {job.url}")
+        if self.use_async:
+            # Own task (and context copy) per run, so cancel() only hits this job
+            job.task = asyncio.create_task(arun_agent(job.url, on_step=job.on_step, run_id=job.id))
+            run = job.task
+        else:
+            run = asyncio.to_thread(run_agent, job.url, on_step=job.on_step, run_id=job.id)
+        try:
+            await run
+            job.status = "completed"
+        except JobStopped:
+            job.status = job.stop_reason or "cancelled"
+        except asyncio.CancelledError:
+            job.status = job.stop_reason or "cancelled"
+            # The worker itself is being shut down, not just this job
+            if asyncio.current_task().cancelling():
+                raise
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            print(f"❌ Job {job.id} failed: {e}")
+        finally:
+            job.finished_at = time.time()
+            job.task = None
+            SOLVE_JOBS_FINISHED.inc(status=job.status)
+        print(f"⏹️  Job {job.id} {job.status} after {job.steps} steps ({job.elapsed():.0f}s)")
+
+
+_scheduler: Optional[JobScheduler] = None
+
+
+def start_scheduler(use_async: bool = True) -> JobScheduler:
+    """Create and start the process-wide scheduler (call from the server's lifespan)."""
+    global _scheduler
+    _scheduler = JobScheduler(use_async=use_async)
+    _scheduler.start()
+    SOLVE_JOBS.set_function(lambda: {
+        (state,): _scheduler.stats()[state] for state in ("running", "queued")
+    })
+    return _scheduler
+
+
+def get_scheduler() -> JobScheduler:
+    if _scheduler is None:
+        raise RuntimeError("Job scheduler not started")
+    return _scheduler
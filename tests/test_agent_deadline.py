@@ -0,0 +1,95 @@
+"""The agent node moves on, rather than raising, when an LLM call fails near the deadline."""
+import asyncio
+import os
+import time
+
+os.environ.setdefault("AIPIPE_API_KEY", "test")
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+import agent
+
+
+def _timeout(*args, **kwargs):
+    raise TimeoutError("LLM call timed out")
+
+
+async def _atimeout(*args, **kwargs):
+    raise TimeoutError("LLM call timed out")
+
+
+def _state(remaining: float, **extra):
+    return {
+        "messages": [HumanMessage(content="https://quiz.example/q1")],
+        "quiz_url": "https://quiz.example/q1",
+        "quiz_started_at": time.time() - (agent.QUIZ_TIME_LIMIT - remaining),
+        **extra,
+    }
+
+
+@pytest.fixture
+def failing_llm(monkeypatch):
+    monkeypatch.setattr(agent, "route_call", _timeout)
+    monkeypatch.setattr(agent, "aroute_call", _atimeout)
+
+
+def _submission(update):
+    call = update["messages"][0].tool_calls[0]
+    assert call["name"] == "post_request"
+    return call["args"]
+
+
+@pytest.mark.parametrize("remaining", [0.5, -0.5])
+def test_timeout_at_deadline_submits(failing_llm, remaining):
+    state = _state(remaining, submit_url="https://quiz.example/submit",
+                   submit_payload={"email": "e", "secret": "s", "url": "https://quiz.example/q1", "answer": 7})
+    update = agent.agent_node(state)
+    args = _submission(update)
+    assert args["url"] == "https://quiz.example/submit"
+    assert args["payload"]["answer"] == 7
+    assert update["auto_advanced"] == "https://quiz.example/q1"
+
+
+def test_timeout_at_deadline_without_submit_url_asks_to_submit(failing_llm):
+    update = agent.agent_node(_state(0.5))
+    message = update["messages"][0]
+    assert isinstance(message, HumanMessage) and "Time is up" in message.content
+
+
+def test_failure_with_time_left_retries(failing_llm):
+    update = agent.agent_node(_state(100))
+    message = update["messages"][0]
+    assert isinstance(message, HumanMessage) and "failed" in message.content
+    assert "auto_advanced" not in update
+
+
+def test_async_timeout_at_deadline_submits(failing_llm):
+    state = _state(0.5, submit_url="https://quiz.example/submit",
+                   submit_payload={"email": "e", "secret": "s", "url": "https://quiz.example/q1", "answer": 7})
+    update = asyncio.run(agent.aagent_node(state))
+    assert _submission(update)["payload"]["answer"] == 7
+
+
+def test_failure_after_auto_advance_retries(failing_llm):
+    # The deadline handler already acted and the server replied; no second submission
+    state = _state(-5, auto_advanced="https://quiz.example/q1", auto_advance_attempts=1,
+                   submit_url="https://quiz.example/submit")
+    state["messages"].append(AIMessage(content="thinking"))
+    update = agent.agent_node(state)
+    assert isinstance(update["messages"][0], HumanMessage)
+
+
+def test_new_quiz_forgets_previous_submission():
+    state = _state(-5, submit_url="https://quiz.example/submit",
+                   submit_payload={"url": "https://quiz.example/q1", "answer": 7},
+                   auto_advanced="https://quiz.example/q1", auto_advance_attempts=2)
+    state["messages"].append(ToolMessage(content='{"correct": false, "url": "https://quiz.example/q2"}',
+                                         name="post_request", tool_call_id="deadline_1"))
+    update = agent.compact_node(state)
+    assert update["quiz_url"] == "https://quiz.example/q2"
+    state = {**state, **update}
+    state["quiz_started_at"] = time.time() - agent.QUIZ_TIME_LIMIT - 5
+    # Out of time on the new quiz before any answer: the model is asked, nothing is resubmitted
+    action = agent._deadline_action(state)
+    assert isinstance(action["messages"][0], HumanMessage)
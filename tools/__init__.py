@@ -1,8 +1,10 @@
 from .web_scraper import get_rendered_html
+from .fetch_url import fetch_url
 from .run_code import run_code 
 from .send_request import post_request
 from .get_request import get_request
 from .download_file import download_file
 from .add_dependencies import add_dependencies
 from .transcribe_audio import transcribe_audio
-from .analyze_with_gemini import analyze_with_gemini
\ No newline at end of file
+from .analyze_with_gemini import analyze_with_gemini
+from .artifacts import read_artifact
@@ -1,7 +1,10 @@
 from typing import List
 from langchain_core.tools import tool
+import asyncio
 import subprocess
 
+from .tracing import span
+
 
 @tool
 def add_dependencies(dependencies: List[str]) -> str:
@@ -19,12 +22,13 @@ def add_dependencies(dependencies: List[str]) -> str:
     """
 
     try:
-        subprocess.check_call(
-            ["uv", "add"] + dependencies,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
+        with span("uv add", "subprocess", packages=len(dependencies)):
+            subprocess.check_call(
+                ["uv", "add"] + dependencies,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True
+            )
         return "Successfully installed dependencies: " + ", ".join(dependencies)
     
     except subprocess.CalledProcessError as e:
@@ -36,3 +40,28 @@ def add_dependencies(dependencies: List[str]) -> str:
     
     except Exception as e:
         return f"Unexpected error while installing dependencies: {e}" 
+
+
+async def _aadd_dependencies(dependencies: List[str]) -> str:
+    try:
+        with span("uv add", "subprocess", packages=len(dependencies)):
+            proc = await asyncio.create_subprocess_exec(
+                "uv", "add", *dependencies,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            _, stderr = await proc.communicate()
+        if proc.returncode != 0:
+            return (
+                "Dependency installation failed.\n"
+                f"Exit code: {proc.returncode}\n"
+                f"Error: {stderr.decode('utf-8', errors='replace') or 'No error output.'}"
+            )
+        return "Successfully installed dependencies: " + ", ".join(dependencies)
+
+    except Exception as e:
+        return f"Unexpected error while installing dependencies: {e}"
+
+
+# Used by ainvoke in the async agent mode
+add_dependencies.coroutine = _aadd_dependencies
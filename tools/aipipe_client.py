@@ -5,6 +5,7 @@ Uses AIPIPE_API_KEY and AIPIPE_BASE_URL from environment.
 import os
 from dotenv import load_dotenv
 import requests
+from . import http_client
 from typing import Dict, Any, List
 
 load_dotenv()
@@ -60,8 +61,13 @@ def request(path: str, method: str = "POST", json: dict | None = None, **kwargs)
     base = get_base_url().rstrip("/")
     path = path.lstrip("/")
     url = f"{base}/{path}"
-    sess = get_session()
-    resp = sess.request(method, url, json=json, **kwargs)
+    headers = {
+        "Authorization": f"Bearer {get_api_key()}",
+        "Content-Type": "application/json",
+        **kwargs.pop("headers", {}),
+    }
+    # Shared pooled session: keeps the connection to Aipipe alive between calls
+    resp = http_client.request(method, url, json=json, headers=headers, **kwargs)
     resp.raise_for_status()
     return resp.json()
 
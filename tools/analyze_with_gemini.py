@@ -1,9 +1,20 @@
 from langchain_core.tools import tool
-import requests
+import asyncio
 import os
-import tempfile
 from typing import Optional
-import base64
+from .download_cache import acached_download, cached_download
+from .gemini_media import GEMINI_MODEL, agenerate_content, generate_content, media_part
+from .result_cache import get_result_cache
+
+MIME_TYPES = {
+    '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png',
+    '.pdf': 'application/pdf', '.mp3': 'audio/mpeg', '.wav': 'audio/wav',
+    '.mp4': 'video/mp4', '.avi': 'video/x-msvideo'
+}
+
+
+def _mime_type(file_type: str) -> str:
+    return MIME_TYPES.get(file_type.lower(), 'application/octet-stream')
 
 
 @tool
@@ -58,64 +69,73 @@ def analyze_with_gemini(
         print(f"   Type: {file_type}")
         print(f"   Task: {prompt[:60]}...")
         
-        # Download the file
+        # Download the file (served from the shared download cache when possible)
         print(f"📥 Downloading file...")
-        response = requests.get(file_url, stream=True)
-        response.raise_for_status()
+        blob = cached_download(file_url)
+        
+        # Same file + same question = same answer: skip the Gemini call
+        cache = get_result_cache()
+        cached = cache.get(blob.sha256, prompt, GEMINI_MODEL)
+        if cached is not None:
+            print(f"♻️  Reusing cached analysis ({len(cached)} characters)")
+            return cached
         
-        # Save to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_type) as tmp_file:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    tmp_file.write(chunk)
-            tmp_path = tmp_file.name
+        mime_type = _mime_type(file_type)
         
-        try:
-            # Get API key
-            gemini_key = os.getenv('GOOGLE_API_KEY')
-            if not gemini_key:
-                raise Exception("GOOGLE_API_KEY not found in environment")
-            
-            # Read and encode file
-            print(f"📤 Encoding file...")
-            with open(tmp_path, 'rb') as f:
-                file_data = base64.b64encode(f.read()).decode('utf-8')
-            
-            # Determine MIME type
-            mime_types = {
-                '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png',
-                '.pdf': 'application/pdf', '.mp3': 'audio/mpeg', '.wav': 'audio/wav',
-                '.mp4': 'video/mp4', '.avi': 'video/x-msvideo'
-            }
-            mime_type = mime_types.get(file_type.lower(), 'application/octet-stream')
-            
-            # Call Gemini API with inline data
-            print(f"🤖 Generating analysis with Gemini...")
-            api_response = requests.post(
-                'https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent',
-                params={'key': gemini_key},
-                json={
-                    'contents': [{
-                        'parts': [
-                            {'text': prompt},
-                            {'inlineData': {'mimeType': mime_type, 'data': file_data}}
-                        ]
-                    }]
-                }
-            )
-            api_response.raise_for_status()
-            
-            result = api_response.json()['candidates'][0]['content']['parts'][0]['text'].strip()
-            print(f"✅ Analysis complete ({len(result)} characters)")
-            
-            return result
-            
-        finally:
-            # Clean up temporary file
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
-                
+        # Small files go inline; large ones are streamed to the Files API
+        print(f"📤 Preparing file ({blob.size} bytes)...")
+        file_part = media_part(blob.path, mime_type, sha256=blob.sha256)
+        
+        print(f"🤖 Generating analysis with Gemini...")
+        result = generate_content([{'text': prompt}, file_part])
+        cache.put(blob.sha256, prompt, GEMINI_MODEL, result)
+        print(f"✅ Analysis complete ({len(result)} characters)")
+        
+        return result
+        
+    except Exception as e:
+        error_msg = f"Error analyzing file with Gemini: {str(e)}"
+        print(f"❌ {error_msg}")
+        return error_msg
+
+
+async def _aanalyze_with_gemini(
+    file_url: str,
+    prompt: str = "Analyze this file and provide detailed information about its contents.",
+    file_type: Optional[str] = None
+) -> str:
+    try:
+        if not file_type:
+            file_type = os.path.splitext(file_url)[1] or '.bin'
+
+        print(f"\n🔍 Analyzing file with Gemini (multimodal)")
+        print(f"   URL: {file_url}")
+        print(f"   Task: {prompt[:60]}...")
+
+        blob = await acached_download(file_url)
+
+        cache = get_result_cache()
+        # The result cache is a SQLite file; keep its queries off the loop
+        cached = await asyncio.to_thread(cache.get, blob.sha256, prompt, GEMINI_MODEL)
+        if cached is not None:
+            print(f"♻️  Reusing cached analysis ({len(cached)} characters)")
+            return cached
+
+        # Large-file uploads read from disk chunk by chunk; keep them off the loop
+        file_part = await asyncio.to_thread(media_part, blob.path, _mime_type(file_type), blob.sha256)
+
+        print(f"🤖 Generating analysis with Gemini...")
+        result = await agenerate_content([{'text': prompt}, file_part])
+        await asyncio.to_thread(cache.put, blob.sha256, prompt, GEMINI_MODEL, result)
+        print(f"✅ Analysis complete ({len(result)} characters)")
+
+        return result
+
     except Exception as e:
         error_msg = f"Error analyzing file with Gemini: {str(e)}"
         print(f"❌ {error_msg}")
         return error_msg
+
+
+# Used by ainvoke in the async agent mode
+analyze_with_gemini.coroutine = _aanalyze_with_gemini
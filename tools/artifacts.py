@@ -0,0 +1,120 @@
+"""
+Off-context artifact store for large tool outputs.
+Any tool result longer than ARTIFACT_THRESHOLD_CHARS is written to
+artifacts/ in the run workspace and replaced in the conversation by a
+short handle plus a preview. The agent pulls slices back with the
+read_artifact tool (by offset or regex search), or opens the file from
+run_code, instead of carrying the whole output in every prompt.
+"""
+import os
+import re
+import uuid
+
+from dotenv import load_dotenv
+from langchain_core.messages import ToolMessage
+from langchain_core.tools import tool
+
+from .workspace import workspace_dir
+
+load_dotenv()
+
+ARTIFACT_THRESHOLD_CHARS = int(os.getenv("ARTIFACT_THRESHOLD_CHARS", "8000"))
+ARTIFACT_PREVIEW_CHARS = int(os.getenv("ARTIFACT_PREVIEW_CHARS", "1000"))
+ARTIFACT_READ_MAX_CHARS = int(os.getenv("ARTIFACT_READ_MAX_CHARS", "8000"))
+ARTIFACT_SEARCH_MAX_MATCHES = 50
+ARTIFACT_ID_RE = re.compile(r"^[\w-]+$")
+# read_artifact output is already bounded; post_request replies are read by the compaction node
+ARTIFACT_EXEMPT_TOOLS = {"read_artifact", "post_request"}
+
+
+def artifact_path(artifact_id: str) -> str:
+    if not ARTIFACT_ID_RE.match(artifact_id):
+        raise ValueError(f"Invalid artifact id: {artifact_id!r}")
+    return os.path.join(workspace_dir(), "artifacts", f"{artifact_id}.txt")
+
+
+def store_artifact(tool_name: str, content: str) -> str:
+    """Write ``content`` to the run workspace and return its artifact id."""
+    artifact_id = f"{tool_name}_{uuid.uuid4().hex[:8]}"
+    path = artifact_path(artifact_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return artifact_id
+
+
+def offload_large_output(request, handler):
+    """ToolNode wrap_tool_call hook: move oversized results out of the message list."""
+    return _offload(handler(request))
+
+
+async def aoffload_large_output(request, handler):
+    """Async counterpart of ``offload_large_output`` (ToolNode awrap_tool_call)."""
+    return _offload(await handler(request))
+
+
+def _offload(result):
+    if not isinstance(result, ToolMessage) or not isinstance(result.content, str):
+        return result
+    content = result.content
+    if len(content) <= ARTIFACT_THRESHOLD_CHARS or result.name in ARTIFACT_EXEMPT_TOOLS:
+        return result
+
+    artifact_id = store_artifact(result.name or "tool", content)
+    print(f"📦 Stored {len(content)} chars from {result.name} as artifact {artifact_id}")
+    handle = (
+        f"[Output of {result.name} is {len(content)} chars and was stored as artifact '{artifact_id}' "
+        f"(file artifacts/{artifact_id}.txt in the run_code working directory). "
+        f"First {ARTIFACT_PREVIEW_CHARS} chars:]\n"
+        f"{content[:ARTIFACT_PREVIEW_CHARS]}\n"
+        f"[... use read_artifact('{artifact_id}', offset=..., pattern=...) to read more]"
+    )
+    return result.model_copy(update={"content": handle})
+
+
+@tool
+def read_artifact(artifact_id: str, offset: int = 0, length: int = ARTIFACT_READ_MAX_CHARS, pattern: str = "") -> str:
+    """
+    Read part of a large tool output that was stored as an artifact.
+
+    Large results (full HTML pages, big JSON, long run_code output) are replaced
+    in the conversation by an artifact id and a preview. Use this tool to read
+    a slice of the stored text, or to search it.
+
+    Args:
+        artifact_id (str): The id from the artifact handle, e.g. "get_request_1a2b3c4d".
+        offset (int): Character offset to start reading from.
+        length (int): Number of characters to read (capped at ARTIFACT_READ_MAX_CHARS).
+        pattern (str): Optional regex (case-insensitive). When given, returns the
+            matching lines with their line numbers and offsets instead of a slice.
+
+    Returns:
+        str: The requested text, or an error message.
+    """
+    try:
+        with open(artifact_path(artifact_id), encoding="utf-8") as f:
+            content = f.read()
+    except (OSError, ValueError) as e:
+        return f"Error reading artifact: {e}"
+
+    if pattern:
+        try:
+            regex = re.compile(pattern, re.IGNORECASE)
+        except re.error as e:
+            return f"Invalid pattern: {e}"
+        matches = []
+        position = 0
+        for number, line in enumerate(content.splitlines(keepends=True), start=1):
+            if regex.search(line):
+                matches.append(f"line {number} (offset {position}): {line.rstrip()[:500]}")
+                if len(matches) >= ARTIFACT_SEARCH_MAX_MATCHES:
+                    matches.append(f"[stopped after {ARTIFACT_SEARCH_MAX_MATCHES} matches]")
+                    break
+            position += len(line)
+        return "\n".join(matches) if matches else f"No lines match {pattern!r}"
+
+    offset = max(0, offset)
+    length = max(1, min(length, ARTIFACT_READ_MAX_CHARS))
+    chunk = content[offset:offset + length]
+    end = offset + len(chunk)
+    return f"[chars {offset}-{end} of {len(content)}]\n{chunk}"
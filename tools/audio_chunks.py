@@ -0,0 +1,128 @@
+"""
+Split long audio into segments for parallel transcription.
+Cut points are placed on silences (found with ffmpeg's silencedetect) near
+each TRANSCRIBE_SEGMENT_SECONDS boundary; where no silence is close enough
+we cut hard and overlap neighbouring segments slightly, then remove the
+duplicated words when stitching. Requires ffmpeg/ffprobe on PATH; without
+them long clips are transcribed in one request as before.
+"""
+import os
+import re
+import shutil
+import subprocess
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TRANSCRIBE_SEGMENT_SECONDS = float(os.getenv("TRANSCRIBE_SEGMENT_SECONDS", "60"))
+TRANSCRIBE_MAX_PARALLEL = int(os.getenv("TRANSCRIBE_MAX_PARALLEL", "4"))
+HARD_CUT_OVERLAP = 1.5
+# How far (as a fraction of the segment length) a cut may move to land on silence
+SILENCE_SEARCH_WINDOW = 0.25
+SILENCE_RE = re.compile(r"silence_(start|end): (-?[\d.]+)")
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+
+def probe_duration(path: str) -> float:
+    out = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path],
+        capture_output=True, text=True, check=True, timeout=30,
+    ).stdout.strip()
+    return float(out)
+
+
+def detect_silences(path: str, noise_db: int = -30, min_silence: float = 0.4) -> List[float]:
+    """Return the midpoint (seconds) of every silence in the clip."""
+    stderr = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-nostats", "-i", path,
+         "-af", f"silencedetect=noise={noise_db}dB:d={min_silence}", "-f", "null", "-"],
+        capture_output=True, text=True, timeout=120,
+    ).stderr
+    midpoints, start = [], None
+    for kind, value in SILENCE_RE.findall(stderr):
+        if kind == "start":
+            start = float(value)
+        elif start is not None:
+            midpoints.append((start + float(value)) / 2)
+            start = None
+    return midpoints
+
+
+def plan_segments(duration: float, silences: List[float],
+                  target: float = TRANSCRIBE_SEGMENT_SECONDS) -> List[Tuple[float, float, bool]]:
+    """Return (start, end, overlaps_previous) covering the clip, preferring silence cut points."""
+    segments = []
+    start = 0.0
+    overlaps = False
+    window = target * SILENCE_SEARCH_WINDOW
+    while duration - start > target * (1 + SILENCE_SEARCH_WINDOW):
+        ideal = start + target
+        near = [s for s in silences if abs(s - ideal) <= window]
+        if near:
+            cut = min(near, key=lambda s: abs(s - ideal))
+            segments.append((start, cut, overlaps))
+            start, overlaps = cut, False
+        else:
+            segments.append((start, ideal + HARD_CUT_OVERLAP, overlaps))
+            start, overlaps = ideal - HARD_CUT_OVERLAP, True
+    segments.append((start, duration, overlaps))
+    return segments
+
+
+def split_audio(path: str, out_dir: str) -> Optional[List[Tuple[str, bool]]]:
+    """Cut a long clip into mono 16 kHz WAV segments in ``out_dir``.
+
+    Returns (segment_path, overlaps_previous) pairs, or None when the clip
+    is short enough for one request, ffmpeg is not available or cannot
+    read it (the caller then sends it whole).
+    """
+    if not ffmpeg_available():
+        return None
+    try:
+        duration = probe_duration(path)
+    except (subprocess.SubprocessError, ValueError) as e:
+        print(f"⚠️  ffprobe could not read the clip, transcribing it in one request: {e}")
+        return None
+    if duration <= TRANSCRIBE_SEGMENT_SECONDS * (1 + SILENCE_SEARCH_WINDOW):
+        return None
+
+    segments = plan_segments(duration, detect_silences(path))
+    paths = []
+    for i, (start, end, overlaps) in enumerate(segments):
+        out = os.path.join(out_dir, f"segment_{i:03d}.wav")
+        subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+             "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}", "-i", path,
+             "-vn", "-ac", "1", "-ar", "16000", "-c:a", "pcm_s16le", out],
+            check=True, timeout=120,
+        )
+        paths.append((out, overlaps))
+    print(f"✂️  Split {duration:.0f}s of audio into {len(paths)} segments")
+    return paths
+
+
+def _words(text: str) -> List[str]:
+    return [re.sub(r"[^\w']", "", w).casefold() for w in text.split()]
+
+
+def stitch(transcripts: List[str], overlapped: Optional[List[bool]] = None, max_overlap_words: int = 25) -> str:
+    """Join segment transcripts in order, dropping words repeated across overlapping cuts."""
+    overlapped = overlapped or [True] * len(transcripts)
+    result: List[str] = []
+    for text, overlaps in zip(transcripts, overlapped):
+        words = text.split()
+        if result and words and overlaps:
+            prev, nxt = _words(" ".join(result[-max_overlap_words:])), _words(" ".join(words[:max_overlap_words]))
+            overlap = 0
+            for n in range(min(len(prev), len(nxt)), 0, -1):
+                if prev[-n:] == nxt[:n]:
+                    overlap = n
+                    break
+            words = words[overlap:]
+        result.extend(words)
+    return " ".join(result)
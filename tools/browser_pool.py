@@ -0,0 +1,324 @@
+"""
+Process-wide pool of warm headless Chromium browsers.
+Playwright's sync API is bound to the thread that started it, so every
+browser lives on its own worker thread and callers hand it jobs to run
+against a fresh, isolated browser context.
+The async agent mode uses AsyncBrowserPool instead: async Playwright on the
+event loop itself, with a semaphore-like queue of warm browsers.
+Configured with BROWSER_POOL_SIZE and BROWSER_MAX_PAGES from environment.
+"""
+import asyncio
+import atexit
+import os
+import queue
+import threading
+import weakref
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+from playwright.async_api import Page as AsyncPage, async_playwright
+from playwright.sync_api import Page, sync_playwright
+
+load_dotenv()
+
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "50"))
+
+_STOP = object()
+
+
+class _BrowserWorker(threading.Thread):
+    """Owns one Playwright runtime + Chromium and serves jobs from the pool queue."""
+
+    def __init__(self, index: int, jobs: "queue.Queue", max_pages: int):
+        super().__init__(name=f"browser-pool-{index}", daemon=True)
+        self.jobs = jobs
+        self.max_pages = max_pages
+        self.pages_served = 0
+        self.launches = 0
+        self.busy = False
+        self.connected = False
+        self._browser = None
+
+    def _ensure_browser(self, playwright):
+        """Launch Chromium if missing, disconnected, or due for recycling."""
+        browser = self._browser
+        if browser is not None and browser.is_connected() and self.pages_served < self.max_pages:
+            return browser
+        if browser is not None:
+            try:
+                browser.close()
+            except Exception:
+                pass
+        self.connected = False
+        self._browser = playwright.chromium.launch(headless=True)
+        self.connected = True
+        self.pages_served = 0
+        self.launches += 1
+        return self._browser
+
+    def run(self):
+        with sync_playwright() as p:
+            try:
+                self._ensure_browser(p)
+            except Exception as e:
+                print(f"❌ Browser pool: initial Chromium launch failed: {e}")
+
+            while True:
+                job = self.jobs.get()
+                if job is _STOP:
+                    break
+                fn, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self.busy = True
+                try:
+                    browser = self._ensure_browser(p)
+                    context = browser.new_context()
+                    try:
+                        result = fn(context.new_page())
+                    finally:
+                        context.close()
+                        self.pages_served += 1
+                    future.set_result(result)
+                except Exception as e:
+                    future.set_exception(e)
+                finally:
+                    # Playwright objects must only be touched from this thread,
+                    # so record liveness here for status()
+                    self.connected = bool(self._browser is not None and self._browser.is_connected())
+                    self.busy = False
+
+            if self._browser is not None:
+                try:
+                    self._browser.close()
+                except Exception:
+                    pass
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "alive": self.is_alive(),
+            "connected": self.connected,
+            "busy": self.busy,
+            "pages_served": self.pages_served,
+            "launches": self.launches,
+        }
+
+
+class BrowserPool:
+    """A fixed-size pool of warm Chromium browsers.
+
+    Each job gets its own browser context (cookies, storage and cache are not
+    shared between calls). Browsers are relaunched after ``max_pages`` pages or
+    whenever they are found disconnected.
+    """
+
+    def __init__(self, size: int = BROWSER_POOL_SIZE, max_pages: int = BROWSER_MAX_PAGES):
+        self.size = max(1, size)
+        self.max_pages = max(1, max_pages)
+        self._jobs: "queue.Queue" = queue.Queue()
+        self._workers: List[_BrowserWorker] = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start (or restart dead) worker threads."""
+        with self._lock:
+            self._workers = [w for w in self._workers if w.is_alive()]
+            while len(self._workers) < self.size:
+                worker = _BrowserWorker(len(self._workers), self._jobs, self.max_pages)
+                worker.start()
+                self._workers.append(worker)
+
+    def run(self, fn: Callable[[Page], Any], timeout: Optional[float] = None) -> Any:
+        """Run ``fn(page)`` on a fresh page from the pool and return its result.
+
+        Args:
+            fn: Callable receiving a new Playwright ``Page``.
+            timeout: Max seconds to wait for a free browser and the job to finish.
+
+        Raises:
+            concurrent.futures.TimeoutError: If the job does not finish in time.
+            Exception: Whatever ``fn`` raised.
+        """
+        self.start()
+        future: Future = Future()
+        self._jobs.put((fn, future))
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Drop the job if it is still waiting for a browser
+            future.cancel()
+            raise
+
+    def status(self) -> Dict[str, Any]:
+        """Health snapshot of the pool for diagnostics."""
+        return {
+            "size": self.size,
+            "max_pages": self.max_pages,
+            "queued": self._jobs.qsize(),
+            "workers": [w.status() for w in self._workers],
+        }
+
+    def close(self, timeout: float = 10):
+        """Stop all workers and close their browsers."""
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._jobs.put(_STOP)
+        for worker in workers:
+            worker.join(timeout=timeout)
+
+
+_pool: Optional[BrowserPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    """Return the process-wide browser pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+            atexit.register(_pool.close)
+    _pool.start()
+    return _pool
+
+
+# -------------------------------------------------
+# ASYNC POOL
+# -------------------------------------------------
+class _AsyncBrowserSlot:
+    """One warm Chromium owned by the async pool."""
+
+    def __init__(self, index: int):
+        self.name = f"async-browser-{index}"
+        self.browser = None
+        self.pages_served = 0
+        self.launches = 0
+        self.busy = False
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "connected": bool(self.browser is not None and self.browser.is_connected()),
+            "busy": self.busy,
+            "pages_served": self.pages_served,
+            "launches": self.launches,
+        }
+
+
+class AsyncBrowserPool:
+    """Async counterpart of BrowserPool, bound to one event loop.
+
+    Browsers are handed out through a queue, so at most ``size`` pages render
+    at once and later callers wait for a free slot without holding a thread.
+    """
+
+    def __init__(self, size: int = BROWSER_POOL_SIZE, max_pages: int = BROWSER_MAX_PAGES):
+        self.size = max(1, size)
+        self.max_pages = max(1, max_pages)
+        self._slots = [_AsyncBrowserSlot(i) for i in range(self.size)]
+        # LIFO, so the most recently used (warm) browser is handed out first
+        self._idle: "asyncio.LifoQueue[_AsyncBrowserSlot]" = asyncio.LifoQueue()
+        for slot in self._slots:
+            self._idle.put_nowait(slot)
+        self._playwright = None
+        self._start_lock = asyncio.Lock()
+
+    async def start(self):
+        """Start the Playwright driver and launch the first browser."""
+        async with self._start_lock:
+            if self._playwright is not None:
+                return
+            self._playwright = await async_playwright().start()
+        # Take the slot from the queue like run() does, so a concurrent job
+        # never launches a second Chromium into it
+        slot = await self._idle.get()
+        slot.busy = True
+        try:
+            await self._ensure_browser(slot)
+        except Exception as e:
+            print(f"❌ Async browser pool: initial Chromium launch failed: {e}")
+        finally:
+            slot.busy = False
+            self._idle.put_nowait(slot)
+
+    async def _ensure_browser(self, slot: _AsyncBrowserSlot):
+        browser = slot.browser
+        if browser is not None and browser.is_connected() and slot.pages_served < self.max_pages:
+            return browser
+        if browser is not None:
+            try:
+                await browser.close()
+            except Exception:
+                pass
+        slot.browser = None
+        slot.browser = await self._playwright.chromium.launch(headless=True)
+        slot.pages_served = 0
+        slot.launches += 1
+        return slot.browser
+
+    async def run(self, fn: Callable[[AsyncPage], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        """Await ``fn(page)`` on a fresh page from the pool and return its result.
+
+        Raises:
+            asyncio.TimeoutError: If waiting for a browser plus the job exceeds ``timeout``.
+            Exception: Whatever ``fn`` raised.
+        """
+        return await asyncio.wait_for(self._run(fn), timeout=timeout)
+
+    async def _run(self, fn):
+        if self._playwright is None:
+            await self.start()
+        slot = await self._idle.get()
+        slot.busy = True
+        try:
+            browser = await self._ensure_browser(slot)
+            context = await browser.new_context()
+            try:
+                return await fn(await context.new_page())
+            finally:
+                slot.pages_served += 1
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+        finally:
+            slot.busy = False
+            self._idle.put_nowait(slot)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "max_pages": self.max_pages,
+            "idle": self._idle.qsize(),
+            "workers": [slot.status() for slot in self._slots],
+        }
+
+    async def close(self):
+        for slot in self._slots:
+            if slot.browser is not None:
+                try:
+                    await slot.browser.close()
+                except Exception:
+                    pass
+                slot.browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+
+# Async Playwright objects belong to the loop that created them
+_async_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncBrowserPool]" = weakref.WeakKeyDictionary()
+
+
+def get_async_browser_pool() -> AsyncBrowserPool:
+    """Return the async browser pool for the running event loop (started lazily)."""
+    loop = asyncio.get_running_loop()
+    pool = _async_pools.get(loop)
+    if pool is None:
+        pool = AsyncBrowserPool()
+        _async_pools[loop] = pool
+    return pool
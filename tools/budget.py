@@ -0,0 +1,67 @@
+"""
+Per-quiz time budget shared between the agent and its tools.
+Each quiz has a hard time limit (QUIZ_TIME_LIMIT_SECONDS, default 180).
+The budget is stored in a context variable so tools running on LangGraph
+worker threads see the same budget object as the run that started them.
+The quiz clock itself lives in the agent's graph state (quiz_url,
+quiz_started_at); the agent node copies it here before every step, so the
+graph's deadline and the tools' timeouts always read the same clock.
+"""
+import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+QUIZ_TIME_LIMIT = float(os.getenv("QUIZ_TIME_LIMIT_SECONDS", "180"))
+MIN_TOOL_TIMEOUT = 1.0
+
+
+class QuizBudget:
+    """Wall-clock budget for the quiz currently being solved."""
+
+    def __init__(self, url: Optional[str] = None, limit: float = QUIZ_TIME_LIMIT):
+        self.limit = limit
+        # Quizzes answered correctly in this chain (for metrics)
+        self.solved = 0
+        self.reset(url)
+
+    def reset(self, url: Optional[str] = None, started_at: Optional[float] = None):
+        """Start the clock for a quiz (``started_at`` in epoch seconds, default now)."""
+        self.url = url
+        self.started_at = time.time() if started_at is None else started_at
+
+    def elapsed(self) -> float:
+        return time.time() - self.started_at
+
+    def remaining(self) -> float:
+        return max(0.0, self.limit - self.elapsed())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+_current_budget: ContextVar[Optional[QuizBudget]] = ContextVar("quiz_budget", default=None)
+
+
+def start_quiz_budget(url: Optional[str] = None, limit: float = QUIZ_TIME_LIMIT) -> QuizBudget:
+    """Create a budget for ``url`` and make it current for this run."""
+    budget = QuizBudget(url, limit)
+    _current_budget.set(budget)
+    return budget
+
+
+def current_budget() -> Optional[QuizBudget]:
+    """Return the budget of the quiz being solved, if any."""
+    return _current_budget.get()
+
+
+def budget_timeout(timeout: float) -> float:
+    """Clamp a tool timeout (seconds) to the time left on the current quiz."""
+    budget = current_budget()
+    if budget is None:
+        return timeout
+    return max(MIN_TOOL_TIMEOUT, min(timeout, budget.remaining()))
@@ -0,0 +1,317 @@
+"""
+Record/replay cassettes for offline, reproducible agent runs.
+In record mode every LLM call (through llm_router), every outbound HTTP
+exchange (through http_client) and every browser render (web_scraper) is
+appended to a JSONL cassette. In replay mode the same calls are answered
+from the cassette without touching the network, after sleeping the recorded
+latency (CASSETTE_LATENCY=recorded) or not at all (zero), so a real quiz
+chain can be re-run through the compiled graph to measure framework and
+tool overhead on its own.
+LLM responses are served in recorded order; HTTP exchanges and renders are
+matched by request (method, URL without secret query parameters, body
+hash). While a cassette is active the on-disk caches (downloads, Gemini
+results) are not read, so every exchange goes through it.
+Replay one chain at a time: concurrent chains would interleave the LLM
+sequence.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from dotenv import load_dotenv
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+
+load_dotenv()
+
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off").lower()
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", "cassettes/run.jsonl")
+CASSETTE_LATENCY = os.getenv("CASSETTE_LATENCY", "recorded").lower()
+MODES = ("record", "replay")
+# Never written to a cassette or used in a match key
+SECRET_PARAMS = frozenset({"key", "api_key", "apikey", "token", "access_token", "secret"})
+# Describe the body as stored, not as it came over the wire
+DROPPED_HEADERS = frozenset({"content-encoding", "transfer-encoding", "content-length", "set-cookie"})
+
+
+class CassetteMiss(Exception):
+    """Replay found no recorded interaction for a request."""
+
+
+class ReplayedError(Exception):
+    """A recorded LLM failure raised again on replay (rate limits keep their status code)."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def request_key(method: str, url: str, params: Any = None, body: bytes = b"") -> str:
+    """Match key for an HTTP exchange; secret query parameters are left out."""
+    parts = urlsplit(str(url))
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if isinstance(params, dict):
+        query += list(params.items())
+    elif params:
+        query += list(params)
+    query = sorted((str(k), str(v)) for k, v in query if str(k).lower() not in SECRET_PARAMS)
+    digest = hashlib.sha256(body).hexdigest()[:16] if body else "-"
+    return f"{method.upper()} {parts.scheme}://{parts.netloc}{parts.path}?{urlencode(query)} {digest}"
+
+
+def request_body(kwargs: Dict[str, Any]) -> bytes:
+    """The request body from requests/httpx keyword arguments, for the match key."""
+    if kwargs.get("json") is not None:
+        return json.dumps(kwargs["json"], sort_keys=True, default=str).encode()
+    data = kwargs.get("content", kwargs.get("data"))
+    if data is None:
+        return b""
+    if isinstance(data, bytes):
+        return data
+    if isinstance(data, str):
+        return data.encode()
+    if isinstance(data, dict):
+        return json.dumps(data, sort_keys=True, default=str).encode()
+    # Streams and iterators cannot be read twice; match on the URL alone
+    return b""
+
+
+def encode_body(body: bytes) -> Dict[str, str]:
+    try:
+        return {"text": body.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"body_b64": base64.b64encode(body).decode("ascii")}
+
+
+def decode_body(entry: Dict[str, Any]) -> bytes:
+    if "body_b64" in entry:
+        return base64.b64decode(entry["body_b64"])
+    return entry.get("text", "").encode("utf-8")
+
+
+def stored_headers(headers) -> Dict[str, str]:
+    return {k: v for k, v in dict(headers).items() if k.lower() not in DROPPED_HEADERS}
+
+
+class Cassette:
+    """One JSONL file of recorded interactions."""
+
+    def __init__(self, path: str, mode: str, latency: str = CASSETTE_LATENCY):
+        if mode not in MODES:
+            raise ValueError(f"Cassette mode must be one of {MODES}, got {mode!r}")
+        self.path = os.path.abspath(path)
+        self.mode = mode
+        self.latency_scale = 0.0 if latency == "zero" else 1.0
+        self.served = 0
+        self.llm_mismatches = 0
+        self._lock = threading.Lock()
+        self._llm: deque = deque()
+        self._by_key: Dict[str, deque] = defaultdict(deque)
+        self._last: Dict[str, Dict[str, Any]] = {}
+        if mode == "replay":
+            self._load()
+        else:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # A recording always starts a fresh cassette
+            open(self.path, "w").close()
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _load(self):
+        with open(self.path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry["kind"] == "llm":
+                    self._llm.append(entry)
+                else:
+                    self._by_key[f"{entry['kind']} {entry['key']}"].append(entry)
+
+    def record(self, kind: str, key: str, latency: float, **data):
+        line = json.dumps({"kind": kind, "key": key, "latency": round(latency, 4), **data}, default=str)
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+    def take(self, kind: str, key: str) -> Dict[str, Any]:
+        """Next recorded interaction for ``key``; the last one is reused once they run out."""
+        name = f"{kind} {key}"
+        with self._lock:
+            queue = self._by_key.get(name)
+            if queue:
+                self._last[name] = queue.popleft()
+            entry = self._last.get(name)
+            if entry is None:
+                raise CassetteMiss(f"No recorded {kind} interaction for {key}")
+            self.served += 1
+        return entry
+
+    def take_llm(self, provider: str, prompt_hash: str) -> Dict[str, Any]:
+        with self._lock:
+            if not self._llm:
+                raise CassetteMiss("Cassette has no more recorded LLM responses")
+            entry = self._llm.popleft()
+            self.served += 1
+            if entry.get("prompt") != prompt_hash or entry["key"] != provider:
+                # The chain has drifted from the recording (e.g. a deadline hit at a different step)
+                self.llm_mismatches += 1
+        return entry
+
+    def delay(self, entry: Dict[str, Any]) -> float:
+        return entry.get("latency", 0.0) * self.latency_scale
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "path": self.path,
+                "served": self.served,
+                "llm_remaining": len(self._llm),
+                "llm_mismatches": self.llm_mismatches,
+            }
+
+
+_active: Optional[Cassette] = None
+
+
+def use_cassette(path: Optional[str], mode: str = "replay", latency: str = CASSETTE_LATENCY) -> Optional[Cassette]:
+    """Make a cassette active for the whole process (mode "off" deactivates)."""
+    global _active
+    _active = Cassette(path, mode, latency) if mode != "off" else None
+    return _active
+
+
+def active_cassette() -> Optional[Cassette]:
+    return _active
+
+
+# -------------------------------------------------
+# LLM CALLS
+# -------------------------------------------------
+def _prompt_hash(input: Any) -> str:
+    messages = input.get("messages", input) if isinstance(input, dict) else input
+    if isinstance(messages, list):
+        text = json.dumps([getattr(m, "content", m) for m in messages], default=str)
+    else:
+        text = str(messages)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def _dump_result(result: Any) -> Dict[str, Any]:
+    if isinstance(result, BaseMessage):
+        data = message_to_dict(result)
+        # Rate-limit headers describe the recording session, not the replay
+        data["data"].get("response_metadata", {}).pop("headers", None)
+        return {"message": data}
+    return {"value": result}
+
+
+def _load_result(entry: Dict[str, Any]) -> Any:
+    if "error" in entry:
+        raise ReplayedError(entry["error"], entry.get("status_code"))
+    if "message" in entry:
+        return messages_from_dict([entry["message"]])[0]
+    return entry.get("value")
+
+
+def _record_llm(cassette: Cassette, provider: str, prompt: str, started: float,
+                result: Any = None, error: Optional[BaseException] = None):
+    latency = time.perf_counter() - started
+    if error is not None:
+        status = getattr(error, "status_code", None)
+        cassette.record("llm", provider, latency, prompt=prompt, error=str(error),
+                        status_code=status if isinstance(status, int) else None)
+    else:
+        cassette.record("llm", provider, latency, prompt=prompt, **_dump_result(result))
+
+
+def llm_call(provider: str, call: Callable[[Any], Any], input: Any) -> Any:
+    """``call(input)``, recorded to or replayed from the active cassette."""
+    cassette = _active
+    if cassette is None:
+        return call(input)
+    prompt = _prompt_hash(input)
+    if cassette.replaying:
+        entry = cassette.take_llm(provider, prompt)
+        time.sleep(cassette.delay(entry))
+        return _load_result(entry)
+    started = time.perf_counter()
+    try:
+        result = call(input)
+    except Exception as e:
+        _record_llm(cassette, provider, prompt, started, error=e)
+        raise
+    _record_llm(cassette, provider, prompt, started, result=result)
+    return result
+
+
+async def allm_call(provider: str, acall: Callable[[Any], Awaitable[Any]], input: Any) -> Any:
+    """Async counterpart of ``llm_call``."""
+    cassette = _active
+    if cassette is None:
+        return await acall(input)
+    prompt = _prompt_hash(input)
+    if cassette.replaying:
+        entry = cassette.take_llm(provider, prompt)
+        await asyncio.sleep(cassette.delay(entry))
+        return _load_result(entry)
+    started = time.perf_counter()
+    try:
+        result = await acall(input)
+    except Exception as e:
+        _record_llm(cassette, provider, prompt, started, error=e)
+        raise
+    _record_llm(cassette, provider, prompt, started, result=result)
+    return result
+
+
+# -------------------------------------------------
+# BROWSER RENDERS
+# -------------------------------------------------
+def _page_key(url: str, wait_for: Optional[str]) -> str:
+    return request_key("GET", url) + (f" wait_for={wait_for}" if wait_for else "")
+
+
+def render(url: str, wait_for: Optional[str], render_page: Callable[[], Any]) -> Any:
+    """``render_page()`` -> (final_url, html), recorded to or replayed from the active cassette."""
+    cassette = _active
+    if cassette is None:
+        return render_page()
+    key = _page_key(url, wait_for)
+    if cassette.replaying:
+        entry = cassette.take("page", key)
+        time.sleep(cassette.delay(entry))
+        return entry["final_url"], entry["html"]
+    started = time.perf_counter()
+    final_url, html = render_page()
+    cassette.record("page", key, time.perf_counter() - started, final_url=final_url, html=html)
+    return final_url, html
+
+
+async def arender(url: str, wait_for: Optional[str], render_page: Callable[[], Awaitable[Any]]) -> Any:
+    """Async counterpart of ``render``."""
+    cassette = _active
+    if cassette is None:
+        return await render_page()
+    key = _page_key(url, wait_for)
+    if cassette.replaying:
+        entry = cassette.take("page", key)
+        await asyncio.sleep(cassette.delay(entry))
+        return entry["final_url"], entry["html"]
+    started = time.perf_counter()
+    final_url, html = await render_page()
+    cassette.record("page", key, time.perf_counter() - started, final_url=final_url, html=html)
+    return final_url, html
+
+
+if CASSETTE_MODE in MODES:
+    use_cassette(CASSETTE_PATH, CASSETTE_MODE, CASSETTE_LATENCY)
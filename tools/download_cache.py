@@ -0,0 +1,265 @@
+"""
+Content-addressed download cache shared by every downloading tool.
+Blobs are stored once per SHA-256 under DOWNLOAD_CACHE_DIR and indexed by
+URL in a small SQLite database together with their ETag/Last-Modified.
+Recently fetched URLs are served straight from disk; older ones are
+revalidated with a conditional GET. Total size is bounded by
+DOWNLOAD_CACHE_MAX_MB with least-recently-used eviction; blobs handed out
+in the last DOWNLOAD_CACHE_PIN_SECONDS count as in use and are never
+evicted, by this process or any other sharing the directory.
+"""
+import asyncio
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import closing, contextmanager
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from dotenv import load_dotenv
+
+from . import http_client
+from .cassette import active_cassette
+from .metrics import CACHE_REQUESTS
+from .tracing import span
+
+load_dotenv()
+
+DOWNLOAD_CACHE_DIR = os.path.abspath(os.getenv("DOWNLOAD_CACHE_DIR", ".cache/downloads"))
+DOWNLOAD_CACHE_MAX_BYTES = int(float(os.getenv("DOWNLOAD_CACHE_MAX_MB", "1024")) * 1024 * 1024)
+# Within this window a cached URL is reused without asking the server
+DOWNLOAD_CACHE_FRESH_SECONDS = float(os.getenv("DOWNLOAD_CACHE_FRESH_SECONDS", "300"))
+# Callers read a blob's path after fetch returns; keep recently handed-out blobs on disk
+DOWNLOAD_CACHE_PIN_SECONDS = float(os.getenv("DOWNLOAD_CACHE_PIN_SECONDS", "900"))
+
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class CachedBlob:
+    """A downloaded URL as stored in the cache."""
+    url: str
+    path: str
+    sha256: str
+    size: int
+    content_type: str
+    from_cache: bool
+
+
+class DownloadCache:
+    def __init__(self, root: str = DOWNLOAD_CACHE_DIR, max_bytes: int = DOWNLOAD_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.blob_dir = os.path.join(root, "blobs")
+        self.db_path = os.path.join(root, "index.sqlite3")
+        self._lock = threading.Lock()
+        os.makedirs(self.blob_dir, exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                """CREATE TABLE IF NOT EXISTS entries (
+                    url TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    content_type TEXT,
+                    etag TEXT,
+                    last_modified TEXT,
+                    validated_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )"""
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """One short-lived transaction: committed (or rolled back), then the connection is closed.
+
+        A connection per operation keeps this safe across threads and processes.
+        """
+        with closing(sqlite3.connect(self.db_path, timeout=30)) as db, db:
+            yield db
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.blob_dir, sha256)
+
+    def _lookup(self, url: str) -> Optional[dict]:
+        with self._connect() as db:
+            db.row_factory = sqlite3.Row
+            # Touch before reading: from here on the blob is pinned against eviction
+            db.execute("UPDATE entries SET last_access = ? WHERE url = ?", (time.time(), url))
+            row = db.execute("SELECT * FROM entries WHERE url = ?", (url,)).fetchone()
+        if row is None or not os.path.exists(self.blob_path(row["sha256"])):
+            return None
+        return dict(row)
+
+    def _hit(self, entry: dict, revalidated: bool) -> CachedBlob:
+        CACHE_REQUESTS.inc(cache="downloads", result="revalidated" if revalidated else "hit")
+        now = time.time()
+        with self._connect() as db:
+            if revalidated:
+                db.execute("UPDATE entries SET last_access = ?, validated_at = ? WHERE url = ?", (now, now, entry["url"]))
+            else:
+                db.execute("UPDATE entries SET last_access = ? WHERE url = ?", (now, entry["url"]))
+        return CachedBlob(
+            url=entry["url"],
+            path=self.blob_path(entry["sha256"]),
+            sha256=entry["sha256"],
+            size=entry["size"],
+            content_type=entry["content_type"] or "",
+            from_cache=True,
+        )
+
+    def _conditional_headers(self, entry: Optional[dict]) -> Optional[dict]:
+        """Revalidation headers for ``entry``, or None when it is fresh enough to serve as is."""
+        headers = {}
+        if entry is not None:
+            if time.time() - entry["validated_at"] < DOWNLOAD_CACHE_FRESH_SECONDS:
+                return None
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def _record(self, url: str, tmp_path: str, sha256: str, size: int, response_headers) -> CachedBlob:
+        """Index a finished download and move it into place as blob ``sha256``."""
+        CACHE_REQUESTS.inc(cache="downloads", result="miss")
+        now = time.time()
+        content_type = response_headers.get("Content-Type", "")
+        # Index first, so an eviction running meanwhile sees the blob as in use
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, sha256, size, content_type, response_headers.get("ETag"),
+                 response_headers.get("Last-Modified"), now, now),
+            )
+        # Same content from another URL is stored once
+        os.replace(tmp_path, self.blob_path(sha256))
+        self.evict()
+        return CachedBlob(url=url, path=self.blob_path(sha256), sha256=sha256,
+                          size=size, content_type=content_type, from_cache=False)
+
+    def fetch(self, url: str, timeout: Optional[float] = None) -> CachedBlob:
+        """Return ``url`` as a local blob, downloading only if needed.
+
+        Raises:
+            requests.HTTPError: If the server answers with an error status.
+        """
+        entry = self._lookup(url) if active_cassette() is None else None
+        headers = self._conditional_headers(entry)
+        if headers is None:
+            return self._hit(entry, revalidated=False)
+
+        response = http_client.get(url, stream=True, headers=headers, timeout=timeout)
+        with response:
+            if entry is not None and response.status_code == 304:
+                return self._hit(entry, revalidated=True)
+            response.raise_for_status()
+
+            digest = hashlib.sha256()
+            size = 0
+            fd, tmp_path = tempfile.mkstemp(dir=self.blob_dir, suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        if chunk:
+                            f.write(chunk)
+                            digest.update(chunk)
+                            size += len(chunk)
+                return self._record(url, tmp_path, digest.hexdigest(), size, response.headers)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+
+    async def afetch(self, url: str, timeout: Optional[float] = None) -> CachedBlob:
+        """Async counterpart of ``fetch``, streaming the body with httpx.
+
+        Index queries and disk writes run on worker threads, off the loop.
+
+        Raises:
+            httpx.HTTPStatusError: If the server answers with an error status.
+        """
+        entry = await asyncio.to_thread(self._lookup, url) if active_cassette() is None else None
+        headers = self._conditional_headers(entry)
+        if headers is None:
+            return await asyncio.to_thread(self._hit, entry, False)
+
+        async with http_client.astream("GET", url, headers=headers, timeout=timeout) as response:
+            if entry is not None and response.status_code == 304:
+                return await asyncio.to_thread(self._hit, entry, True)
+            response.raise_for_status()
+
+            digest = hashlib.sha256()
+            size = 0
+            fd, tmp_path = tempfile.mkstemp(dir=self.blob_dir, suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    async for chunk in response.aiter_bytes(chunk_size=CHUNK_SIZE):
+                        await asyncio.to_thread(f.write, chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+                return await asyncio.to_thread(self._record, url, tmp_path, digest.hexdigest(), size,
+                                               response.headers)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+
+    def evict(self):
+        """Drop least-recently-used blobs until the cache fits in ``max_bytes``.
+
+        Blobs accessed within DOWNLOAD_CACHE_PIN_SECONDS may still be read
+        by a tool and are kept, even if that leaves the cache over its size.
+        """
+        pinned_since = time.time() - DOWNLOAD_CACHE_PIN_SECONDS
+        with self._lock, self._connect() as db:
+            # One row per blob, with the most recent access of any URL pointing at it
+            blobs = db.execute(
+                "SELECT sha256, MAX(size), MAX(last_access) AS last FROM entries "
+                "GROUP BY sha256 ORDER BY last ASC"
+            ).fetchall()
+            total = sum(size for _, size, _ in blobs)
+            for sha256, size, last in blobs:
+                if total <= self.max_bytes or last >= pinned_since:
+                    break
+                # Rows touched since the SELECT survive (another process just handed the blob out);
+                # from the first DELETE on this transaction holds the write lock
+                db.execute("DELETE FROM entries WHERE sha256 = ? AND last_access < ?", (sha256, pinned_since))
+                if db.execute("SELECT 1 FROM entries WHERE sha256 = ?", (sha256,)).fetchone():
+                    continue
+                try:
+                    os.unlink(self.blob_path(sha256))
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+_cache: Optional[DownloadCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_download_cache() -> DownloadCache:
+    """Return the process-wide download cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DownloadCache()
+    return _cache
+
+
+def cached_download(url: str, timeout: Optional[float] = None) -> CachedBlob:
+    """Fetch ``url`` through the shared download cache."""
+    with span("download", "io", url=http_client.redacted_url(url)) as args:
+        blob = get_download_cache().fetch(url, timeout=timeout)
+        args.update(bytes=blob.size, from_cache=blob.from_cache)
+    return blob
+
+
+async def acached_download(url: str, timeout: Optional[float] = None) -> CachedBlob:
+    """Async counterpart of ``cached_download``."""
+    with span("download", "io", url=http_client.redacted_url(url)) as args:
+        blob = await get_download_cache().afetch(url, timeout=timeout)
+        args.update(bytes=blob.size, from_cache=blob.from_cache)
+    return blob
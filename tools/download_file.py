@@ -1,31 +1,50 @@
 from langchain_core.tools import tool
-import requests
+import asyncio
 import os
+import shutil
+from .download_cache import acached_download, cached_download
+from .workspace import workspace_dir
 
 @tool
 def download_file(url: str, filename: str) -> str:
     """
     Download a file from a URL and save it with the given filename
-    in the current working directory.
+    in this run's workspace directory (the working directory of 'run_code').
+    Downloads are cached, so fetching the same URL again is instant.
 
     Args:
         url (str): Direct URL to the file.
         filename (str): The filename to save the downloaded content as.
 
     Returns:
-        str: Full path to the saved file.
+        str: The filename to use from 'run_code'.
     """
     try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        directory_name = "LLMFiles"
-        os.makedirs(directory_name, exist_ok=True)
-        path = os.path.join(directory_name, filename)
-        with open(path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+        blob = cached_download(url)
+        # Bare filename only: files must stay inside the run's workspace
+        filename = os.path.basename(filename)
+        path = os.path.join(workspace_dir(), filename)
+        # Copy rather than link: run_code may modify the file in place
+        shutil.copyfile(blob.path, path)
+        print(f"📥 {'Cache hit' if blob.from_cache else 'Downloaded'}: {url} → {filename} ({blob.size} bytes)")
 
         return filename
     except Exception as e:
-        return f"Error downloading file: {str(e)}"
\ No newline at end of file
+        return f"Error downloading file: {str(e)}"
+
+
+async def _adownload_file(url: str, filename: str) -> str:
+    try:
+        blob = await acached_download(url)
+        filename = os.path.basename(filename)
+        path = os.path.join(workspace_dir(), filename)
+        await asyncio.to_thread(shutil.copyfile, blob.path, path)
+        print(f"📥 {'Cache hit' if blob.from_cache else 'Downloaded'}: {url} → {filename} ({blob.size} bytes)")
+
+        return filename
+    except Exception as e:
+        return f"Error downloading file: {str(e)}"
+
+
+# Used by ainvoke in the async agent mode
+download_file.coroutine = _adownload_file
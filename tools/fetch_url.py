@@ -0,0 +1,178 @@
+from langchain_core.tools import tool
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from dotenv import load_dotenv
+from typing import Any, Dict, List, Tuple, Union
+import asyncio
+import os
+import re
+import httpx
+import requests
+from . import http_client
+from .page_extractor import extract_page
+from .web_scraper import arender_page, render_page
+
+load_dotenv()
+
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT_SECONDS", "20"))
+FETCH_MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", "8"))
+# Pages with less visible text than this are assumed to be rendered client-side
+MIN_STATIC_TEXT = int(os.getenv("FETCH_MIN_STATIC_TEXT", "40"))
+
+SPA_MARKERS = [
+    re.compile(r'<div[^>]+id=["\'](?:root|app|__next|__nuxt)["\'][^>]*>\s*</div>', re.IGNORECASE),
+    re.compile(r"\bng-app\b|\bng-version\b|data-reactroot|data-v-app", re.IGNORECASE),
+    re.compile(r"<noscript>[^<]*(?:enable|requires?)\s+javascript", re.IGNORECASE),
+]
+# Inline scripts that write page content themselves; appendChild/fetch/atob
+# also appear in the analytics and polyfill snippets of most static pages
+DOM_WRITE_RE = re.compile(
+    r"document\.write|\.(?:innerHTML|textContent|innerText)\s*=(?!=)|\.insertAdjacentHTML",
+)
+TEXT_CONTENT_TYPES = ("text/", "json", "xml", "javascript", "csv", "yaml")
+SCRIPT_RE = re.compile(r"<script\b[^>]*>(.*?)</script>", re.IGNORECASE | re.DOTALL)
+
+
+def needs_browser(html: str, page: Dict[str, Any]) -> str | None:
+    """Return why a statically fetched page needs JavaScript, or None if it doesn't."""
+    if len(page["text"]) < MIN_STATIC_TEXT:
+        return "little or no visible text"
+    for marker in SPA_MARKERS:
+        if marker.search(html):
+            return "single-page-app marker"
+    if any(DOM_WRITE_RE.search(script) for script in SCRIPT_RE.findall(html)):
+        return "inline script writes to the DOM"
+    return None
+
+
+def _static_result(url: str, response, raw_html: bool) -> Tuple[Any, str | None]:
+    """Turn a plain HTTP response (requests or httpx) into a tool result.
+
+    Returns (result, None), or (None, reason) when the page needs the browser.
+    """
+    content_type = response.headers.get("Content-Type", "").lower()
+    if "html" not in content_type:
+        if not any(t in content_type for t in TEXT_CONTENT_TYPES):
+            return (
+                f"Binary content ({content_type or 'unknown type'}, {len(response.content)} bytes). "
+                "Use 'download_file' or a Gemini tool for this URL."
+            ), None
+        # Data endpoint: JSON or plain text, no rendering involved
+        try:
+            return response.json(), None
+        except ValueError:
+            return response.text, None
+
+    html = response.text
+    page = extract_page(html, str(response.url), include_html=raw_html)
+    reason = needs_browser(html, page)
+    if reason is None:
+        page["fetched_with"] = "http"
+        print(f"⚡ Static fetch OK: {url}")
+        return page, None
+    print(f"🌐 Escalating to browser ({reason}): {url}")
+    return None, reason
+
+
+def _rendered_result(url: str, final_url: str, html: str, raw_html: bool) -> Dict[str, Any]:
+    page = extract_page(html, final_url or url, include_html=raw_html)
+    page["fetched_with"] = "browser"
+    return page
+
+
+def fetch_one(url: str, raw_html: bool = False, force_browser: bool = False) -> Any:
+    """Fetch a single URL over plain HTTP, escalating to the browser when needed."""
+    try:
+        if not force_browser:
+            response = http_client.get(url, timeout=http_client.default_timeout(FETCH_TIMEOUT, clamp=True))
+            response.raise_for_status()
+            result, reason = _static_result(url, response, raw_html)
+            if reason is None:
+                return result
+
+        final_url, html = render_page(url)
+        return _rendered_result(url, final_url, html, raw_html)
+
+    except requests.HTTPError as e:
+        return f"HTTP {e.response.status_code}: {e.response.text}"
+    except Exception as e:
+        return f"Error fetching {url}: {str(e)}"
+
+
+async def afetch_one(url: str, raw_html: bool = False, force_browser: bool = False) -> Any:
+    """Async counterpart of ``fetch_one`` (httpx + async Playwright)."""
+    try:
+        if not force_browser:
+            response = await http_client.aget(url, timeout=http_client.default_timeout(FETCH_TIMEOUT, clamp=True))
+            response.raise_for_status()
+            result, reason = _static_result(url, response, raw_html)
+            if reason is None:
+                return result
+
+        final_url, html = await arender_page(url)
+        return _rendered_result(url, final_url, html, raw_html)
+
+    except httpx.HTTPStatusError as e:
+        return f"HTTP {e.response.status_code}: {e.response.text}"
+    except Exception as e:
+        return f"Error fetching {url}: {str(e)}"
+
+
+@tool
+def fetch_url(url: Union[str, List[str]], raw_html: bool = False, force_browser: bool = False) -> Any:
+    """
+    Fetch one or more web pages or data URLs, using a headless browser only when needed.
+
+    This is the default tool for loading quiz pages and data endpoints. It first
+    does a fast plain HTTP GET. If the page looks client-side rendered (empty
+    body, script-only content, SPA markers, inline scripts that write the page)
+    it automatically re-loads it in headless Chromium.
+
+    HTML pages come back in the same compact form as 'get_rendered_html'
+    (text, links, forms, media, submit_endpoints) plus "fetched_with":
+    "http" or "browser". JSON endpoints return parsed JSON; other text
+    endpoints return the raw text.
+
+    Parameters
+    ----------
+    url : str or list of str
+        A URL, or a list of URLs to fetch concurrently.
+    raw_html : bool, optional
+        Include the full HTML under "html" for HTML pages.
+    force_browser : bool, optional
+        Skip the plain HTTP attempt and render with the browser directly.
+
+    Returns
+    -------
+    Any
+        The result for a single URL, or a list of results in the same order
+        as the given URLs. Failed URLs yield an error string in their slot.
+    """
+    if isinstance(url, str):
+        print(f"\n📄 Fetching: {url}")
+        return fetch_one(url, raw_html, force_browser)
+
+    print(f"\n📄 Fetching {len(url)} URLs concurrently")
+    with ThreadPoolExecutor(max_workers=max(1, min(FETCH_MAX_WORKERS, len(url)))) as pool:
+        # Each worker runs in a copy of our context so it sees the quiz budget
+        futures = [pool.submit(copy_context().run, fetch_one, u, raw_html, force_browser) for u in url]
+        return [f.result() for f in futures]
+
+
+async def _afetch_url(url: Union[str, List[str]], raw_html: bool = False, force_browser: bool = False) -> Any:
+    if isinstance(url, str):
+        print(f"\n📄 Fetching: {url}")
+        return await afetch_one(url, raw_html, force_browser)
+
+    print(f"\n📄 Fetching {len(url)} URLs concurrently")
+    limit = asyncio.Semaphore(max(1, FETCH_MAX_WORKERS))
+
+    async def bounded(u):
+        async with limit:
+            return await afetch_one(u, raw_html, force_browser)
+
+    return list(await asyncio.gather(*(bounded(u) for u in url)))
+
+
+# Used by ainvoke in the async agent mode
+fetch_url.coroutine = _afetch_url
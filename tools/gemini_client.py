@@ -9,6 +9,8 @@ from dotenv import load_dotenv
 load_dotenv()
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+# Read timeout for raw Gemini REST calls
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "120"))
 
 
 def get_gemini_client() -> genai.Client:
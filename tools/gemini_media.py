@@ -0,0 +1,217 @@
+"""
+Gemini REST helpers for multimodal tools: media upload and generateContent.
+Small files are sent inline (base64). Larger files are streamed from disk
+to the Gemini Files API with the resumable upload protocol, chunk by chunk,
+and referenced by their file URI, so memory use stays at one chunk no
+matter how big the video or PDF is.
+Uploads and generateContent calls take a token from the host-wide
+"gemini" rate limiter (shared with the Gemini chat model) and report
+Retry-After / x-ratelimit-* response headers back to it.
+GEMINI_API_BASE can point at a local stand-in server for testing.
+"""
+import asyncio
+import base64
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from . import http_client
+from .gemini_client import GEMINI_TIMEOUT
+from .metrics import CACHE_REQUESTS
+from .rate_limits import gemini_limiter
+
+load_dotenv()
+
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com").rstrip("/")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+# Requests are capped at 20 MB including base64 overhead; stay well below it
+GEMINI_INLINE_MAX_BYTES = int(float(os.getenv("GEMINI_INLINE_MAX_MB", "8")) * 1024 * 1024)
+# Resumable upload chunks must be a multiple of 256 KiB
+GEMINI_UPLOAD_CHUNK_BYTES = max(1, int(os.getenv("GEMINI_UPLOAD_CHUNK_MB", "8"))) * 1024 * 1024
+GEMINI_UPLOAD_RETRIES = 3
+FILE_ACTIVE_TIMEOUT = 120
+GEMINI_RATE_LIMIT_PAUSE = 10
+# Uploaded files expire after 48h on Gemini's side; reuse them for less than that
+UPLOAD_REUSE_SECONDS = 24 * 3600
+
+# sha256 -> (file dict, uploaded_at); avoids re-uploading the same content
+_uploaded: Dict[str, tuple] = {}
+_uploaded_lock = threading.Lock()
+
+
+class GeminiError(RuntimeError):
+    """Gemini answered with an error or an unexpected payload."""
+
+
+def get_gemini_key() -> str:
+    key = os.getenv("GOOGLE_API_KEY")
+    if not key:
+        raise GeminiError("GOOGLE_API_KEY not found in environment")
+    return key
+
+
+def _note_limits(response):
+    """Report the response's rate-limit headers to the shared "gemini" bucket (SQLite)."""
+    gemini_limiter.update_from_headers(response.headers)
+    if response.status_code == 429 and "retry-after" not in response.headers:
+        # No hint from the server: hold the whole host off for a short while
+        gemini_limiter.pause(GEMINI_RATE_LIMIT_PAUSE)
+
+
+def _check(response, what: str):
+    _note_limits(response)
+    _raise_for_error(response, what)
+
+
+async def _acheck(response, what: str):
+    await asyncio.to_thread(_note_limits, response)
+    _raise_for_error(response, what)
+
+
+def _raise_for_error(response, what: str):
+    if response.status_code >= 400:
+        detail = response.text[:500]
+        print(f"❌ Gemini {what} error {response.status_code}: {detail}")
+        raise GeminiError(f"Gemini {what} returned {response.status_code}: {detail}")
+
+
+def _query_offset(upload_url: str) -> int:
+    """Ask the upload session how many bytes it already has."""
+    response = http_client.post(upload_url, headers={"X-Goog-Upload-Command": "query"})
+    _check(response, "upload query")
+    return int(response.headers.get("X-Goog-Upload-Size-Received", "0"))
+
+
+def upload_file(path: str, mime_type: str, display_name: Optional[str] = None) -> Dict[str, Any]:
+    """Stream ``path`` to the Gemini Files API and return the file resource.
+
+    Uses the resumable protocol: start a session, then send fixed-size chunks
+    read from disk, resuming from the server's offset after a failed chunk.
+    """
+    size = os.path.getsize(path)
+    # One token per upload; the chunks of a session are not separate API requests
+    gemini_limiter.acquire()
+    start = http_client.post(
+        f"{GEMINI_API_BASE}/upload/v1beta/files",
+        params={"key": get_gemini_key()},
+        headers={
+            "X-Goog-Upload-Protocol": "resumable",
+            "X-Goog-Upload-Command": "start",
+            "X-Goog-Upload-Header-Content-Length": str(size),
+            "X-Goog-Upload-Header-Content-Type": mime_type,
+        },
+        json={"file": {"display_name": display_name or os.path.basename(path)}},
+    )
+    _check(start, "upload start")
+    upload_url = start.headers.get("X-Goog-Upload-URL")
+    if not upload_url:
+        raise GeminiError("Gemini upload start did not return an upload URL")
+
+    offset = 0
+    failures = 0
+    result = None
+    with open(path, "rb") as f:
+        while result is None:
+            f.seek(offset)
+            chunk = f.read(GEMINI_UPLOAD_CHUNK_BYTES)
+            last = offset + len(chunk) >= size
+            try:
+                response = http_client.post(
+                    upload_url,
+                    headers={
+                        "X-Goog-Upload-Command": "upload, finalize" if last else "upload",
+                        "X-Goog-Upload-Offset": str(offset),
+                    },
+                    data=chunk,
+                    timeout=GEMINI_TIMEOUT,
+                )
+                _check(response, "upload chunk")
+            except Exception:
+                failures += 1
+                if failures > GEMINI_UPLOAD_RETRIES:
+                    raise
+                offset = _query_offset(upload_url)
+                continue
+            if last:
+                result = response.json()["file"]
+            else:
+                offset += len(chunk)
+
+    print(f"📤 Uploaded {size} bytes to Gemini Files API ({result.get('name')})")
+    return result
+
+
+def wait_until_active(file: Dict[str, Any], timeout: float = FILE_ACTIVE_TIMEOUT) -> Dict[str, Any]:
+    """Poll an uploaded file until Gemini has finished processing it (videos)."""
+    deadline = time.monotonic() + timeout
+    while file.get("state", "ACTIVE") == "PROCESSING":
+        if time.monotonic() > deadline:
+            raise GeminiError(f"Gemini file {file.get('name')} still processing after {timeout}s")
+        time.sleep(2)
+        response = http_client.get(f"{GEMINI_API_BASE}/v1beta/{file['name']}", params={"key": get_gemini_key()})
+        _check(response, "file status")
+        file = response.json()
+    if file.get("state") == "FAILED":
+        raise GeminiError(f"Gemini could not process file {file.get('name')}")
+    return file
+
+
+def media_part(path: str, mime_type: str, sha256: Optional[str] = None) -> Dict[str, Any]:
+    """Return a generateContent part for the file at ``path``.
+
+    Files up to GEMINI_INLINE_MAX_MB are inlined; larger ones are uploaded
+    (once per content hash) and referenced by URI.
+    """
+    size = os.path.getsize(path)
+    if size <= GEMINI_INLINE_MAX_BYTES:
+        with open(path, "rb") as f:
+            data = base64.b64encode(f.read()).decode("utf-8")
+        return {"inlineData": {"mimeType": mime_type, "data": data}}
+
+    with _uploaded_lock:
+        cached = _uploaded.get(sha256) if sha256 else None
+    if cached and time.time() - cached[1] < UPLOAD_REUSE_SECONDS:
+        CACHE_REQUESTS.inc(cache="gemini_uploads", result="hit")
+        file = cached[0]
+    else:
+        CACHE_REQUESTS.inc(cache="gemini_uploads", result="miss")
+        file = wait_until_active(upload_file(path, mime_type))
+        if sha256:
+            with _uploaded_lock:
+                _uploaded[sha256] = (file, time.time())
+    return {"fileData": {"mimeType": file.get("mimeType", mime_type), "fileUri": file["uri"]}}
+
+
+def _generate_request(parts: List[Dict[str, Any]], model: str) -> Dict[str, Any]:
+    return {
+        "url": f"{GEMINI_API_BASE}/v1beta/models/{model}:generateContent",
+        "params": {"key": get_gemini_key()},
+        "json": {"contents": [{"parts": parts}]},
+        "timeout": GEMINI_TIMEOUT,
+    }
+
+
+def _first_text(response) -> str:
+    try:
+        return response.json()["candidates"][0]["content"]["parts"][0]["text"].strip()
+    except (KeyError, IndexError, ValueError) as e:
+        raise GeminiError(f"Unexpected Gemini response: {response.text[:500]}") from e
+
+
+def generate_content(parts: List[Dict[str, Any]], model: str = GEMINI_MODEL) -> str:
+    """Call generateContent with ``parts`` and return the text of the first candidate."""
+    gemini_limiter.acquire()
+    response = http_client.post(**_generate_request(parts, model))
+    _check(response, "API")
+    return _first_text(response)
+
+
+async def agenerate_content(parts: List[Dict[str, Any]], model: str = GEMINI_MODEL) -> str:
+    """Async counterpart of ``generate_content``."""
+    await gemini_limiter.aacquire()
+    response = await http_client.apost(**_generate_request(parts, model))
+    await _acheck(response, "API")
+    return _first_text(response)
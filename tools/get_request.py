@@ -1,5 +1,7 @@
 from langchain_core.tools import tool
+import httpx
 import requests
+from . import http_client
 from typing import Any, Dict, Optional
 
 
@@ -42,24 +44,11 @@ def get_request(url: str, headers: Optional[Dict[str, str]] = None, params: Opti
     params = params or {}
     
     try:
-        print(f"\n📡 GET Request to: {url}")
-        if headers:
-            print(f"   Headers: {list(headers.keys())}")
-        if params:
-            print(f"   Params: {params}")
-        
-        response = requests.get(url, headers=headers, params=params)
+        _log_request(url, headers, params)
+        response = http_client.get(url, headers=headers, params=params,
+                                   timeout=http_client.default_timeout(clamp=True))
         response.raise_for_status()
-        
-        # Try to return JSON, fallback to text
-        try:
-            data = response.json()
-            print(f"✅ Response received ({len(str(data))} chars)")
-            return data
-        except ValueError:
-            text = response.text
-            print(f"✅ Response received ({len(text)} chars, non-JSON)")
-            return text
+        return _parse_response(response)
             
     except requests.HTTPError as e:
         error_msg = f"HTTP {e.response.status_code}: {e.response.text}"
@@ -69,3 +58,48 @@ def get_request(url: str, headers: Optional[Dict[str, str]] = None, params: Opti
         error_msg = f"Error: {str(e)}"
         print(f"❌ {error_msg}")
         return error_msg
+
+
+def _log_request(url: str, headers: Dict[str, str], params: Dict[str, Any]):
+    print(f"\n📡 GET Request to: {url}")
+    if headers:
+        print(f"   Headers: {list(headers.keys())}")
+    if params:
+        print(f"   Params: {params}")
+
+
+def _parse_response(response) -> Any:
+    # Try to return JSON, fallback to text
+    try:
+        data = response.json()
+        print(f"✅ Response received ({len(str(data))} chars)")
+        return data
+    except ValueError:
+        text = response.text
+        print(f"✅ Response received ({len(text)} chars, non-JSON)")
+        return text
+
+
+async def _aget_request(url: str, headers: Optional[Dict[str, str]] = None, params: Optional[Dict[str, Any]] = None) -> Any:
+    headers = headers or {}
+    params = params or {}
+
+    try:
+        _log_request(url, headers, params)
+        response = await http_client.aget(url, headers=headers, params=params,
+                                          timeout=http_client.default_timeout(clamp=True))
+        response.raise_for_status()
+        return _parse_response(response)
+
+    except httpx.HTTPStatusError as e:
+        error_msg = f"HTTP {e.response.status_code}: {e.response.text}"
+        print(f"❌ {error_msg}")
+        return error_msg
+    except Exception as e:
+        error_msg = f"Error: {str(e)}"
+        print(f"❌ {error_msg}")
+        return error_msg
+
+
+# Used by ainvoke in the async agent mode
+get_request.coroutine = _aget_request
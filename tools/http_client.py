@@ -0,0 +1,345 @@
+"""
+Shared, pooled HTTP client for every tool.
+One requests.Session with keep-alive connection pools (per-host limits),
+default timeouts and retry/backoff on transient errors, so tools stop paying
+a fresh TCP/TLS handshake per call and can never hang forever.
+The async half (arequest/aget/apost) does the same with one pooled
+httpx.AsyncClient per event loop, for the async agent mode.
+Both clients record latency and retries in tools.metrics through their
+response hooks, so every tool's outbound HTTP is measured in one place.
+With a cassette active (tools.cassette) exchanges are recorded or
+replayed here instead of going out.
+Configured with the HTTP_* variables below.
+"""
+import asyncio
+import datetime
+import email.utils
+import http
+import os
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .budget import budget_timeout, current_budget
+from .cassette import Cassette, active_cassette, decode_body, encode_body, request_body, request_key, stored_headers
+from .metrics import HTTP_RETRY_COUNT, HTTP_SECONDS
+from .tracing import span
+
+load_dotenv()
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT_SECONDS", "60"))
+HTTP_POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", "20"))
+HTTP_POOL_PER_HOST = int(os.getenv("HTTP_POOL_PER_HOST", "10"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF_SECONDS", "0.5"))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Never sleep longer than this for a Retry-After header
+MAX_RETRY_AFTER = 30.0
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _host(url) -> str:
+    return urlsplit(str(url)).hostname or "unknown"
+
+
+def redacted_url(url) -> str:
+    """``url`` without its query string (which can carry API keys), for traces and logs."""
+    parts = urlsplit(str(url))
+    return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+
+def _response_bytes(response, streamed: bool) -> int:
+    if streamed:
+        return int(response.headers.get("Content-Length") or 0)
+    return len(response.content)
+
+
+def _record_response(response: requests.Response, *args, **kwargs):
+    """requests response hook: latency until headers, plus urllib3 retries."""
+    host = _host(response.url)
+    HTTP_SECONDS.observe(response.elapsed.total_seconds(), client="requests",
+                         method=response.request.method, host=host, status=str(response.status_code))
+    retries = getattr(response.raw, "retries", None)
+    if retries is not None and retries.history:
+        HTTP_RETRY_COUNT.inc(len(retries.history), client="requests", host=host)
+
+
+def _max_retry_after() -> float:
+    """Longest Retry-After to honour: MAX_RETRY_AFTER, cut to the quiz time left."""
+    budget = current_budget()
+    if budget is None:
+        return MAX_RETRY_AFTER
+    return min(MAX_RETRY_AFTER, budget.remaining())
+
+
+class _ClampedRetry(Retry):
+    """urllib3 Retry whose Retry-After sleeps are capped like the async client's."""
+
+    def get_retry_after(self, response) -> Optional[float]:
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, _max_retry_after())
+
+
+def _build_session() -> requests.Session:
+    # Only idempotent methods are retried: a re-sent POST could submit an answer twice
+    retry = _ClampedRetry(
+        total=HTTP_RETRIES,
+        connect=HTTP_RETRIES,
+        read=HTTP_RETRIES,
+        status=HTTP_RETRIES,
+        backoff_factor=HTTP_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD", "OPTIONS"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_HOSTS,
+        pool_maxsize=HTTP_POOL_PER_HOST,
+        pool_block=False,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.hooks["response"].append(_record_response)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide pooled session."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def default_timeout(read: Optional[float] = None, clamp: bool = False) -> Tuple[float, float]:
+    """(connect, read) timeout; ``clamp`` shortens the read part to the quiz time left.
+
+    Only GET fetches made for the agent (fetch_url, get_request) clamp:
+    answer submissions, Gemini calls and cache-filling downloads keep the
+    configured timeouts.
+    """
+    read = read or HTTP_READ_TIMEOUT
+    if clamp:
+        read = budget_timeout(read)
+    return (min(HTTP_CONNECT_TIMEOUT, read), read)
+
+
+def request(method: str, url: str, timeout=None, **kwargs) -> requests.Response:
+    """Send a request through the shared session.
+
+    Args:
+        method: HTTP method.
+        url: Target URL.
+        timeout: Seconds, a (connect, read) tuple, or None for the defaults.
+        **kwargs: Passed through to ``requests.Session.request``.
+    """
+    if timeout is None or isinstance(timeout, (int, float)):
+        timeout = default_timeout(timeout)
+    with span(f"{method} {_host(url)}", "http", url=redacted_url(url)) as args:
+        response = _send(method, url, timeout, kwargs)
+        args["status"] = response.status_code
+        args["response_bytes"] = _response_bytes(response, kwargs.get("stream", False))
+    return response
+
+
+def _record_exchange(cassette: Cassette, key: str, method: str, url: str, status: int,
+                     headers, body: bytes, started: float):
+    cassette.record("http", key, time.perf_counter() - started, method=method, url=redacted_url(url),
+                    status=status, headers=stored_headers(headers), **encode_body(body))
+
+
+def _replayed_response(entry: Dict[str, Any], method: str, url: str) -> requests.Response:
+    response = requests.Response()
+    response.status_code = entry["status"]
+    try:
+        response.reason = http.HTTPStatus(entry["status"]).phrase
+    except ValueError:
+        response.reason = ""
+    response.headers = requests.structures.CaseInsensitiveDict(entry["headers"])
+    # Already "read": iter_content and .content serve the recorded body
+    response._content = decode_body(entry)
+    response._content_consumed = True
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response.url = url
+    response.request = requests.Request(method, url).prepare()
+    response.elapsed = datetime.timedelta(seconds=entry.get("latency", 0.0))
+    return response
+
+
+def _send(method: str, url: str, timeout, kwargs: Dict[str, Any]) -> requests.Response:
+    cassette = active_cassette()
+    if cassette is None:
+        return get_session().request(method, url, timeout=timeout, **kwargs)
+    key = request_key(method, url, kwargs.get("params"), request_body(kwargs))
+    if cassette.replaying:
+        entry = cassette.take("http", key)
+        time.sleep(cassette.delay(entry))
+        return _replayed_response(entry, method, url)
+    started = time.perf_counter()
+    response = get_session().request(method, url, timeout=timeout, **kwargs)
+    # Buffers streamed bodies too; iter_content then serves them from memory
+    _record_exchange(cassette, key, method, url, response.status_code, response.headers,
+                     response.content, started)
+    return response
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+# -------------------------------------------------
+# ASYNC CLIENT
+# -------------------------------------------------
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+# httpx connection pools are bound to the loop that created them
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+async def _mark_request(request: httpx.Request):
+    request.extensions["metrics_started"] = time.perf_counter()
+
+
+async def _record_async_response(response: httpx.Response):
+    request = response.request
+    started = request.extensions.get("metrics_started")
+    if started is not None:
+        HTTP_SECONDS.observe(time.perf_counter() - started, client="httpx", method=request.method,
+                             host=_host(request.url), status=str(response.status_code))
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the pooled async client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_POOL_HOSTS * HTTP_POOL_PER_HOST,
+                max_keepalive_connections=HTTP_POOL_HOSTS * HTTP_POOL_PER_HOST,
+            ),
+            transport=httpx.AsyncHTTPTransport(retries=HTTP_RETRIES),
+            follow_redirects=True,
+            event_hooks={"request": [_mark_request], "response": [_record_async_response]},
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def close_async_client():
+    """Close the running loop's client (call on shutdown)."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def async_timeout(timeout=None) -> httpx.Timeout:
+    """The same (connect, read) defaults as the sync client, as an httpx.Timeout."""
+    if isinstance(timeout, httpx.Timeout):
+        return timeout
+    if timeout is None or isinstance(timeout, (int, float)):
+        timeout = default_timeout(timeout)
+    connect, read = timeout
+    return httpx.Timeout(read, connect=connect)
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return min(float(value), _max_retry_after())
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(value)
+        return min(max(0.0, parsed.timestamp() - time.time()), _max_retry_after()) if parsed else None
+
+
+async def _asend(client: httpx.AsyncClient, method: str, url: str, timeout: httpx.Timeout,
+                 kwargs: Dict[str, Any]) -> httpx.Response:
+    cassette = active_cassette()
+    if cassette is None:
+        return await client.request(method, url, timeout=timeout, **kwargs)
+    key = request_key(method, url, kwargs.get("params"), request_body(kwargs))
+    if cassette.replaying:
+        entry = cassette.take("http", key)
+        await asyncio.sleep(cassette.delay(entry))
+        return httpx.Response(entry["status"], headers=entry["headers"], content=decode_body(entry),
+                              request=httpx.Request(method, url))
+    started = time.perf_counter()
+    response = await client.request(method, url, timeout=timeout, **kwargs)
+    _record_exchange(cassette, key, method, url, response.status_code, response.headers,
+                     response.content, started)
+    return response
+
+
+async def arequest(method: str, url: str, timeout=None, **kwargs) -> httpx.Response:
+    """Async counterpart of ``request``.
+
+    Connection errors are retried by the transport; idempotent methods are
+    also retried on RETRY_STATUSES with exponential backoff, honouring
+    Retry-After, like the sync session.
+    """
+    client = get_async_client()
+    timeout = async_timeout(timeout)
+    attempts = HTTP_RETRIES + 1 if method.upper() in IDEMPOTENT_METHODS else 1
+    for attempt in range(attempts):
+        with span(f"{method} {_host(url)}", "http", url=redacted_url(url), attempt=attempt) as args:
+            response = await _asend(client, method, url, timeout, kwargs)
+            args["status"] = response.status_code
+            args["response_bytes"] = _response_bytes(response, False)
+        if response.status_code not in RETRY_STATUSES or attempt == attempts - 1:
+            return response
+        delay = _retry_after(response)
+        if delay is None:
+            delay = HTTP_BACKOFF * (2 ** attempt)
+        await response.aclose()
+        HTTP_RETRY_COUNT.inc(client="httpx", host=_host(url))
+        await asyncio.sleep(delay)
+    return response
+
+
+@asynccontextmanager
+async def astream(method: str, url: str, timeout=None, **kwargs):
+    """``client.stream`` on the pooled client, for large bodies.
+
+    With a cassette active the body is buffered instead, so the exchange can
+    be recorded or replayed whole.
+    """
+    client = get_async_client()
+    if active_cassette() is not None:
+        yield await _asend(client, method, url, async_timeout(timeout), kwargs)
+        return
+    async with client.stream(method, url, timeout=async_timeout(timeout), **kwargs) as response:
+        yield response
+
+
+async def aget(url: str, **kwargs) -> httpx.Response:
+    return await arequest("GET", url, **kwargs)
+
+
+async def apost(url: str, **kwargs) -> httpx.Response:
+    return await arequest("POST", url, **kwargs)
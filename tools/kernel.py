@@ -0,0 +1,198 @@
+"""
+Warm, stateful Python kernel for run_code.
+One worker process per agent run (owned by its Workspace) keeps the scientific stack imported and
+variables alive between run_code calls. Hung executions are interrupted
+with SIGINT and, if that does not help, the worker is killed and restarted.
+Configured with KERNEL_MODE ("warm" or "oneshot") and RUN_CODE_TIMEOUT_SECONDS.
+"""
+import itertools
+import json
+import os
+import queue
+import signal
+import subprocess
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+from .tracing import span
+
+load_dotenv()
+
+KERNEL_MODE = os.getenv("KERNEL_MODE", "warm").lower()
+RUN_CODE_TIMEOUT = float(os.getenv("RUN_CODE_TIMEOUT_SECONDS", "120"))
+KERNEL_START_TIMEOUT = float(os.getenv("KERNEL_START_TIMEOUT_SECONDS", "60"))
+INTERRUPT_GRACE = 3.0
+# How often a startup wait checks whether the worker has already exited
+START_POLL_INTERVAL = 0.1
+
+WORKER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kernel_worker.py")
+
+
+class KernelError(RuntimeError):
+    """The kernel process could not be started or died mid-execution."""
+
+
+class PythonKernel:
+    """A persistent Python worker process executing code in a shared namespace."""
+
+    def __init__(self, cwd: str = "LLMFiles", preexec_fn: Optional[Callable[[], None]] = None,
+                 cpu_seconds: int = 0):
+        self.cwd = cwd
+        self.preexec_fn = preexec_fn
+        # CPU time allowed per execution, enforced by the worker (0: unlimited)
+        self.cpu_seconds = cpu_seconds
+        self._proc: Optional[subprocess.Popen] = None
+        self._pid: Optional[int] = None
+        self._responses: "queue.Queue" = queue.Queue()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    # ---------------- process management ----------------
+
+    def start(self):
+        """Spawn the worker without waiting for it to finish preloading."""
+        if self._proc is not None and self._proc.poll() is None:
+            return
+        os.makedirs(self.cwd, exist_ok=True)
+        self._ready.clear()
+        self._responses = queue.Queue()
+        try:
+            self._proc = subprocess.Popen(
+                ["uv", "run", "python", WORKER_PATH],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                text=True,
+                cwd=self.cwd,
+                env={**os.environ, "KERNEL_CPU_SECONDS": str(self.cpu_seconds)},
+                start_new_session=True,  # own process group, so kill() also reaps the interpreter under uv
+                preexec_fn=self.preexec_fn,
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            self._proc = None
+            raise KernelError(f"Could not start kernel: {e}")
+        threading.Thread(
+            target=self._read_responses,
+            args=(self._proc, self._responses),
+            name="kernel-reader",
+            daemon=True,
+        ).start()
+
+    def _read_responses(self, proc: subprocess.Popen, responses: "queue.Queue"):
+        for line in proc.stdout:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if message.get("ready"):
+                self._pid = message.get("pid")
+                self._ready.set()
+            else:
+                responses.put(message)
+        responses.put(None)  # EOF: worker exited
+
+    def _wait_ready(self, timeout: float):
+        """Wait for the worker's ready message, failing fast if it exits during startup."""
+        self.start()
+        deadline = time.monotonic() + timeout
+        while not self._ready.wait(min(START_POLL_INTERVAL, max(0.0, deadline - time.monotonic()))):
+            exit_code = self._proc.poll()
+            if exit_code is not None:
+                self.kill()
+                raise KernelError(f"Kernel exited during startup (exit code {exit_code})")
+            if time.monotonic() >= deadline:
+                self.kill()
+                raise KernelError(f"Kernel did not start within {timeout:.0f}s")
+
+    def interrupt(self):
+        """Send SIGINT to the worker (the interpreter, not the uv wrapper)."""
+        pid = self._pid or (self._proc.pid if self._proc else None)
+        if pid:
+            try:
+                os.kill(pid, signal.SIGINT)
+            except ProcessLookupError:
+                pass
+
+    def kill(self):
+        """Terminate the worker; the next execute() starts a fresh one."""
+        proc, self._proc, self._pid = self._proc, None, None
+        self._ready.clear()
+        if proc is None:
+            return
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            proc.kill()
+        try:
+            proc.wait(timeout=5)
+        except Exception:
+            pass
+
+    def restart(self):
+        self.kill()
+        self.start()
+
+    shutdown = kill
+
+    # ---------------- execution ----------------
+
+    def execute(self, code: str, timeout: float = RUN_CODE_TIMEOUT) -> Dict[str, Any]:
+        """Run ``code`` in the kernel and return stdout/stderr/return_code.
+
+        On timeout the code is interrupted; if the worker does not respond to
+        the interrupt it is killed and restarted on the next call.
+        """
+        with span("kernel.execute", "subprocess", code_chars=len(code)) as args:
+            response = self._execute(code, timeout)
+            args.update(return_code=response.get("return_code"),
+                        output_chars=len(response.get("stdout") or "") + len(response.get("stderr") or ""))
+        return response
+
+    def _execute(self, code: str, timeout: float) -> Dict[str, Any]:
+        with self._lock:
+            self._wait_ready(KERNEL_START_TIMEOUT)
+            request_id = next(self._ids)
+            try:
+                self._proc.stdin.write(json.dumps({"id": request_id, "code": code}) + "\n")
+                self._proc.stdin.flush()
+            except (BrokenPipeError, OSError) as e:
+                self.kill()
+                raise KernelError(f"Kernel is not accepting input: {e}")
+
+            response = self._wait_for(request_id, timeout)
+            if response is not None:
+                return response
+
+            # Timed out: try a soft interrupt first
+            self.interrupt()
+            response = self._wait_for(request_id, INTERRUPT_GRACE)
+            if response is None:
+                self.kill()
+                response = {"stdout": "", "stderr": "", "return_code": -9}
+                note = f"Execution exceeded {timeout:.0f}s; kernel was restarted and its state lost."
+            else:
+                note = f"Execution exceeded {timeout:.0f}s and was interrupted (kernel state kept)."
+            response["stderr"] = (response.get("stderr") or "") + f"\n{note}"
+            return response
+
+    def _wait_for(self, request_id: int, timeout: float) -> Optional[Dict[str, Any]]:
+        responses = self._responses
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                message = responses.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if message is None:
+                self.kill()
+                raise KernelError("Kernel process exited unexpectedly")
+            if message.get("id") == request_id:
+                message.pop("id", None)
+                return message
+            # Late answer from an earlier, interrupted request: ignore
@@ -0,0 +1,159 @@
+"""
+Long-lived Python worker used by run_code (see tools/kernel.py).
+Reads one JSON request per line from stdin, executes the code in a
+persistent namespace and answers with one JSON line on a private copy of
+the original stdout. File descriptors 1 and 2 point at temp files, so output
+written below Python (child processes, os.system, C extensions) is
+collected into the result like the one-shot runner's.
+Must stay free of project imports: it runs under `uv run` in the run's workspace.
+"""
+import contextlib
+import ctypes
+import importlib
+import io
+import json
+import os
+import signal
+import sys
+import tempfile
+import traceback
+
+try:
+    import resource
+except ImportError:  # not POSIX: no CPU limit
+    resource = None
+
+PRELOAD = [m.strip() for m in os.getenv("KERNEL_PRELOAD", "numpy,pandas").split(",") if m.strip()]
+# CPU seconds per execution; RLIMIT_CPU counts the whole process, so it is re-armed before each one
+CPU_SECONDS = int(os.getenv("KERNEL_CPU_SECONDS", "0"))
+_cpu_armed = False
+
+
+class CPULimitExceeded(Exception):
+    pass
+
+
+def _on_sigxcpu(signum, frame):
+    # A signal delivered after the execution finished is ignored
+    if _cpu_armed:
+        raise CPULimitExceeded(f"CPU time limit exceeded: the code used more than {CPU_SECONDS}s of CPU")
+
+
+def _arm_cpu_limit():
+    """Allow CPU_SECONDS more CPU time from now (SIGXCPU once it is used up)."""
+    global _cpu_armed
+    if resource is None or CPU_SECONDS <= 0:
+        return
+    _cpu_armed = True
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = int(usage.ru_utime + usage.ru_stime) + CPU_SECONDS + 1
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _disarm_cpu_limit():
+    global _cpu_armed
+    if resource is None or CPU_SECONDS <= 0:
+        return
+    _cpu_armed = False
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+
+
+class FdCapture:
+    """Points a file descriptor at a temp file whose content is read back per execution."""
+
+    def __init__(self, fd: int):
+        self._file = tempfile.TemporaryFile()
+        os.dup2(self._file.fileno(), fd)
+
+    def clear(self):
+        self._file.seek(0)
+        self._file.truncate()
+
+    def read(self) -> str:
+        _flush_c_stdio()
+        self._file.seek(0)
+        return self._file.read().decode("utf-8", errors="replace")
+
+
+def _flush_c_stdio():
+    # printf() output of C extensions sits in libc's buffer until flushed
+    try:
+        ctypes.CDLL(None).fflush(None)
+    except (OSError, AttributeError):
+        pass
+
+
+def main():
+    # The protocol gets its own copy of stdout; fd 1 and 2 are captured
+    proto = os.fdopen(os.dup(1), "w", buffering=1)
+    fd_stdout, fd_stderr = FdCapture(1), FdCapture(2)
+
+    # SIGINT only interrupts running code; the parent uses it on timeouts
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    if resource is not None and CPU_SECONDS > 0:
+        signal.signal(signal.SIGXCPU, _on_sigxcpu)
+
+    for module in PRELOAD:
+        try:
+            importlib.import_module(module)
+        except Exception:
+            pass
+
+    namespace = {"__name__": "__main__", "__builtins__": __builtins__}
+    proto.write(json.dumps({"ready": True, "pid": os.getpid()}) + "\n")
+
+    while True:
+        try:
+            line = sys.stdin.readline()
+        except KeyboardInterrupt:
+            continue
+        if not line:
+            break
+        request = json.loads(line)
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        fd_stdout.clear()
+        fd_stderr.clear()
+        return_code = 0
+        importlib.invalidate_caches()  # pick up packages added with add_dependencies
+        try:
+            _arm_cpu_limit()
+            try:
+                with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                    exec(compile(request["code"], "runner.py", "exec"), namespace)
+            finally:
+                _disarm_cpu_limit()
+        except CPULimitExceeded as e:
+            stderr.write(f"{e}\n")
+            return_code = -24
+        except SystemExit as e:
+            if isinstance(e.code, int):
+                return_code = e.code
+            elif e.code is not None:
+                stderr.write(f"{e.code}\n")
+                return_code = 1
+        except KeyboardInterrupt:
+            stderr.write("KeyboardInterrupt: execution interrupted\n")
+            return_code = -2
+        except BaseException:
+            stderr.write(traceback.format_exc())
+            return_code = 1
+
+        try:
+            proto.write(json.dumps({
+                "id": request["id"],
+                # Python-level output first, then what went straight to the descriptors
+                "stdout": stdout.getvalue() + fd_stdout.read(),
+                "stderr": stderr.getvalue() + fd_stderr.read(),
+                "return_code": return_code,
+            }) + "\n")
+        except KeyboardInterrupt:
+            continue
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Optional local CPU speech-to-text backend for transcribe_audio.
+Uses faster-whisper (int8-quantized Whisper on CTranslate2) when installed
+(`uv sync --extra local-stt`). The model is loaded once and kept in memory.
+TRANSCRIBE_BACKEND picks the backend: "gemini" (default), "local", or
+"auto" (local for clips up to TRANSCRIBE_LOCAL_MAX_SECONDS, Gemini beyond).
+Gemini is always the fallback when the local model fails or is missing.
+"""
+import os
+import threading
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from .audio_chunks import ffmpeg_available, probe_duration
+
+load_dotenv()
+
+try:
+    from faster_whisper import WhisperModel
+except ImportError:
+    WhisperModel = None
+
+TRANSCRIBE_BACKEND = os.getenv("TRANSCRIBE_BACKEND", "gemini").lower()
+TRANSCRIBE_LOCAL_MAX_SECONDS = float(os.getenv("TRANSCRIBE_LOCAL_MAX_SECONDS", "120"))
+LOCAL_WHISPER_MODEL = os.getenv("LOCAL_WHISPER_MODEL", "base")
+LOCAL_WHISPER_THREADS = int(os.getenv("LOCAL_WHISPER_THREADS", "0"))
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def local_stt_available() -> bool:
+    return WhisperModel is not None
+
+
+def local_model_name() -> str:
+    """Identifier used in result-cache keys for local transcriptions."""
+    return f"local-whisper:{LOCAL_WHISPER_MODEL}"
+
+
+def get_local_model():
+    """Load the Whisper model on first use and keep it for the process lifetime."""
+    global _model
+    if WhisperModel is None:
+        raise RuntimeError("faster-whisper is not installed (uv sync --extra local-stt)")
+    with _model_lock:
+        if _model is None:
+            print(f"🧠 Loading local Whisper model '{LOCAL_WHISPER_MODEL}' (int8, CPU)...")
+            _model = WhisperModel(
+                LOCAL_WHISPER_MODEL,
+                device="cpu",
+                compute_type="int8",
+                cpu_threads=LOCAL_WHISPER_THREADS,
+            )
+    return _model
+
+
+def preload_local_model():
+    """Warm the model in the background when the local backend may be used."""
+    if TRANSCRIBE_BACKEND in ("local", "auto") and local_stt_available():
+        threading.Thread(target=get_local_model, name="whisper-preload", daemon=True).start()
+
+
+def choose_backend(path: str) -> str:
+    """Return "local" or "gemini" for the clip at ``path``."""
+    if TRANSCRIBE_BACKEND == "gemini" or not local_stt_available():
+        return "gemini"
+    if TRANSCRIBE_BACKEND == "local":
+        return "local"
+    # auto: short clips locally; unknown length counts as short
+    duration: Optional[float] = None
+    if ffmpeg_available():
+        try:
+            duration = probe_duration(path)
+        except Exception:
+            duration = None
+    if duration is None or duration <= TRANSCRIBE_LOCAL_MAX_SECONDS:
+        return "local"
+    return "gemini"
+
+
+def transcribe_local(path: str) -> str:
+    """Transcribe an audio file with the in-memory Whisper model."""
+    segments, _ = get_local_model().transcribe(path, beam_size=1, vad_filter=True)
+    return " ".join(segment.text.strip() for segment in segments).strip()
@@ -0,0 +1,228 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+A deliberately small registry (counters, gauges, histograms with labels)
+so the agent, the tools and the HTTP clients can record timings and counts
+without pulling in a client library; main.py serves ``render()`` on
+/metrics. Gauges can be backed by a callback that is read at scrape time.
+Values are per process: with several uvicorn workers, scrape each one.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Seconds; covers fast cache hits up to slow LLM calls and page renders
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, float("inf"))
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else f"{int(value)}.0"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """Exposition lines for every label combination."""
+
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+        return header + "".join(line + "\n" for line in self.samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], Dict[LabelValues, float]]] = None
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], Dict[LabelValues, float]]):
+        """Read the values at scrape time: ``function`` returns {label values: value}."""
+        self._function = function
+
+    def samples(self) -> List[str]:
+        if self._function is not None:
+            try:
+                items = sorted(self._function().items())
+            except Exception:
+                # A broken source must not take the whole scrape down
+                items = []
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(set(buckets) | {float("inf")}))
+        # label values -> ([count per bucket], sum, count)
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the ``with`` block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "".join(metric.render() for metric in metrics)
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Iterable[str] = (),
+              buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def render() -> str:
+    """All metrics in the Prometheus text format (version 0.0.4)."""
+    return REGISTRY.render()
+
+
+# -------------------------------------------------
+# METRICS SHARED ACROSS MODULES
+# -------------------------------------------------
+AGENT_STEP_SECONDS = histogram("agent_step_seconds", "Duration of one agent node step.", ["mode"])
+LLM_REQUEST_SECONDS = histogram("llm_request_seconds", "LLM request latency per provider.", ["provider", "outcome"])
+LLM_TOKENS = counter("llm_tokens_total", "LLM tokens used, by model and kind (prompt/completion).", ["model", "kind"])
+LLM_FALLBACKS = counter("llm_fallbacks_total", "Requests moved to the next provider after a rate limit.", ["provider"])
+LLM_SKIPPED = counter("llm_provider_skipped_total", "Requests that skipped a provider whose circuit was open.", ["provider"])
+LLM_BREAKER_TRIPS = counter("llm_breaker_trips_total", "Circuit breaker openings per provider.", ["provider"])
+LLM_HEDGES = counter("llm_hedges_total", "Hedged LLM requests by outcome.", ["outcome"])
+TOOL_SECONDS = histogram("tool_call_seconds", "Tool call latency.", ["tool", "status"])
+HTTP_SECONDS = histogram("http_request_seconds", "Outbound HTTP latency until response headers.",
+                         ["client", "method", "host", "status"])
+HTTP_RETRY_COUNT = counter("http_retries_total", "Outbound HTTP retries.", ["client", "host"])
+CACHE_REQUESTS = counter("cache_requests_total", "Cache lookups by cache and result (hit/revalidated/miss).",
+                         ["cache", "result"])
+QUIZ_ANSWERS = counter("quiz_answers_total", "Answers submitted, by server verdict.", ["result"])
+QUIZZES_PER_CHAIN = histogram("quizzes_solved_per_chain", "Correctly answered quizzes per chain.",
+                              buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, float("inf")))
+RUNS = counter("agent_runs_total", "Finished quiz chains by outcome.", ["outcome"])
+ACTIVE_RUNS = gauge("agent_active_runs", "Quiz chains currently running in this process.")
+SOLVE_JOBS = gauge("solve_jobs", "/solve jobs by scheduler state (running/queued).", ["state"])
+SOLVE_JOBS_FINISHED = counter("solve_jobs_finished_total", "Finished /solve jobs by final status.", ["status"])
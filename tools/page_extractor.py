@@ -0,0 +1,144 @@
+"""
+Compact extraction of rendered HTML pages.
+Turns a full HTML document into visible text plus structured links, forms,
+media and submit endpoints so the agent doesn't carry raw markup in its
+message history.
+"""
+import re
+from typing import Any, Dict, List
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup, Comment
+
+# Tags that never carry readable content for the agent
+NOISE_TAGS = ["script", "style", "noscript", "template", "svg", "canvas", "link", "meta"]
+MEDIA_TAGS = ["audio", "video", "img", "source", "track", "embed", "object"]
+BLOCK_TAGS = [
+    "p", "div", "br", "li", "tr", "pre", "section", "article", "header", "footer",
+    "table", "form", "ul", "ol", "blockquote", "h1", "h2", "h3", "h4", "h5", "h6",
+]
+
+URL_RE = re.compile(r"""(?:https?://|/)[^\s"'<>`)\]]+""")
+SUBMIT_HINT_RE = re.compile(r"submit|answer", re.IGNORECASE)
+
+
+def _absolute(base_url: str, value: str | None) -> str | None:
+    if not value:
+        return None
+    value = value.strip()
+    if not value or value.startswith(("javascript:", "data:", "#", "mailto:")):
+        return None
+    return urljoin(base_url, value)
+
+
+def _dedupe(items: List[Dict[str, Any]], key: str) -> List[Dict[str, Any]]:
+    seen = set()
+    result = []
+    for item in items:
+        if item[key] in seen:
+            continue
+        seen.add(item[key])
+        result.append(item)
+    return result
+
+
+def _visible_text(soup: BeautifulSoup) -> str:
+    # Break lines at block elements only, so inline links stay inside sentences
+    for tag in soup.find_all(BLOCK_TAGS):
+        tag.insert_before("\n")
+        tag.insert_after("\n")
+    text = soup.get_text()
+    lines = [re.sub(r"[ \t\r\f\v]+", " ", line).strip() for line in text.splitlines()]
+    return "\n".join(line for line in lines if line)
+
+
+def _find_submit_endpoints(base_url: str, text: str, scripts: List[str], forms: List[Dict[str, Any]]) -> List[str]:
+    """Collect URLs that look like answer endpoints (form actions, '.../submit' mentions)."""
+    endpoints = [f["action"] for f in forms if f.get("action")]
+    for source in [text, *scripts]:
+        for match in URL_RE.findall(source):
+            match = match.rstrip(".,;:")
+            if SUBMIT_HINT_RE.search(match):
+                endpoints.append(urljoin(base_url, match))
+    return list(dict.fromkeys(endpoints))
+
+
+def extract_page(html: str, base_url: str, include_html: bool = False) -> Dict[str, Any]:
+    """Extract a compact, LLM-friendly view of an HTML page.
+
+    Args:
+        html: Full HTML document.
+        base_url: URL the page was loaded from (used to resolve relative links).
+        include_html: Also return the untouched HTML under "html".
+
+    Returns:
+        Dict with url, title, text, links, forms, media and submit_endpoints.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+
+    base_tag = soup.find("base", href=True)
+    if base_tag:
+        base_url = urljoin(base_url, base_tag["href"])
+
+    # Scripts are dropped from the text but may still mention the submit URL
+    scripts = [s.get_text() for s in soup.find_all("script") if s.get_text()]
+
+    media = []
+    for tag in soup.find_all(MEDIA_TAGS):
+        src = _absolute(base_url, tag.get("src") or tag.get("data") or tag.get("data-src"))
+        if not src:
+            continue
+        kind = tag.name
+        if kind in ("source", "track") and tag.parent is not None:
+            kind = tag.parent.name
+        entry = {"type": kind, "src": src}
+        if tag.get("alt"):
+            entry["alt"] = tag["alt"]
+        media.append(entry)
+
+    links = []
+    for a in soup.find_all("a", href=True):
+        href = _absolute(base_url, a["href"])
+        if href:
+            links.append({"text": a.get_text(" ", strip=True), "href": href})
+
+    forms = []
+    for form in soup.find_all("form"):
+        fields = []
+        for field in form.find_all(["input", "select", "textarea", "button"]):
+            name = field.get("name")
+            if not name:
+                continue
+            fields.append({
+                "name": name,
+                "type": field.get("type") or ("text" if field.name == "input" else field.name),
+                "value": field.get("value", ""),
+            })
+        forms.append({
+            "action": _absolute(base_url, form.get("action")) or base_url,
+            "method": (form.get("method") or "GET").upper(),
+            "fields": fields,
+        })
+
+    for tag in soup.find_all(NOISE_TAGS):
+        tag.decompose()
+    for comment in soup.find_all(string=lambda s: isinstance(s, Comment)):
+        comment.extract()
+
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    if soup.title:
+        soup.title.decompose()
+    text = _visible_text(soup)
+
+    page = {
+        "url": base_url,
+        "title": title,
+        "text": text,
+        "links": _dedupe(links, "href"),
+        "forms": forms,
+        "media": _dedupe(media, "src"),
+        "submit_endpoints": _find_submit_endpoints(base_url, text, scripts, forms),
+    }
+    if include_html:
+        page["html"] = html
+    return page
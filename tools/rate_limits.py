@@ -0,0 +1,230 @@
+"""
+Host-wide token-bucket rate limiters for the LLM providers.
+Buckets live in a small SQLite database (RATE_LIMIT_DB_PATH), so every
+uvicorn worker and every process on the host draws from the same
+per-provider budget instead of each assuming it owns the whole quota.
+Each acquire is one short write transaction (BEGIN IMMEDIATE) that
+refills and takes a token.
+Buckets adapt to what the provider reports: x-ratelimit-remaining /
+x-ratelimit-reset headers lower the token count and the refill rate until
+the reset, and Retry-After (or a rate-limit error) pauses the bucket for
+every process. The configured rate is never exceeded.
+Aipipe uses it through ChatOpenAI's rate_limiter; Gemini's chat model and
+the raw Gemini REST calls (analyze_with_gemini, transcribe_audio) share
+the "gemini" bucket.
+"""
+import asyncio
+import email.utils
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Mapping, Optional
+
+from dotenv import load_dotenv
+from langchain_core.rate_limiters import BaseRateLimiter
+
+from .cassette import active_cassette
+from .tracing import span
+
+load_dotenv()
+
+RATE_LIMIT_DB_PATH = os.path.abspath(os.getenv("RATE_LIMIT_DB_PATH", ".cache/rate_limits.sqlite3"))
+AIPIPE_RPM = float(os.getenv("AIPIPE_RPM", "9"))
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "12"))
+MAX_PAUSE_SECONDS = 300.0
+# "6m0s", "1.5s", "20ms" (OpenAI-style reset durations)
+DURATION_RE = re.compile(r"([\d.]+)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def _header(headers: Mapping[str, Any], *names: str) -> Optional[str]:
+    lowered = {str(k).lower(): v for k, v in headers.items()}
+    for name in names:
+        if lowered.get(name) not in (None, ""):
+            return str(lowered[name])
+    return None
+
+
+def _seconds_until(value: Optional[str], now: float) -> Optional[float]:
+    """Parse a reset/retry value: duration, seconds, epoch (s or ms) or HTTP date."""
+    if value is None:
+        return None
+    value = value.strip()
+    durations = DURATION_RE.findall(value)
+    if durations and "".join(n + u for n, u in durations) == value:
+        return sum(float(n) * DURATION_UNITS[u] for n, u in durations)
+    try:
+        number = float(value)
+    except ValueError:
+        try:
+            parsed = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, parsed.timestamp() - now)
+    if number > 1e12:
+        return max(0.0, number / 1000 - now)
+    if number > 1e9:
+        return max(0.0, number - now)
+    return max(0.0, number)
+
+
+def _replaying() -> bool:
+    # Replayed calls never reach a provider: no tokens, and old headers must not
+    # throttle live processes on the host
+    cassette = active_cassette()
+    return cassette is not None and cassette.replaying
+
+
+class SharedRateLimiter(BaseRateLimiter):
+    """Token bucket shared by all processes on the host through SQLite."""
+
+    def __init__(self, name: str, requests_per_second: float, max_bucket_size: float = 1,
+                 check_every_n_seconds: float = 0.2, path: str = RATE_LIMIT_DB_PATH):
+        self.name = name
+        self.requests_per_second = requests_per_second
+        self.max_bucket_size = max(1.0, max_bucket_size)
+        self.check_every_n_seconds = check_every_n_seconds
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._transaction() as db:
+            db.execute(
+                """CREATE TABLE IF NOT EXISTS buckets (
+                    name TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    rate REAL NOT NULL,
+                    rate_until REAL NOT NULL,
+                    paused_until REAL NOT NULL
+                )"""
+            )
+            # A fresh bucket starts empty, like InMemoryRateLimiter
+            db.execute(
+                "INSERT OR IGNORE INTO buckets VALUES (?, 0, ?, ?, 0, 0)",
+                (name, time.time(), requests_per_second),
+            )
+
+    @contextmanager
+    def _transaction(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            # Take the write lock up front so read-modify-write is atomic across processes
+            db.execute("BEGIN IMMEDIATE")
+            yield db
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+    def _refilled(self, db, now: float):
+        tokens, updated_at, rate, rate_until, paused_until = db.execute(
+            "SELECT tokens, updated_at, rate, rate_until, paused_until FROM buckets WHERE name = ?",
+            (self.name,),
+        ).fetchone()
+        if now >= rate_until:
+            rate = self.requests_per_second
+        rate = min(rate, self.requests_per_second)
+        tokens = min(self.max_bucket_size, tokens + max(0.0, now - updated_at) * rate)
+        return tokens, rate, rate_until, paused_until
+
+    def _try_consume(self) -> bool:
+        now = time.time()
+        with self._transaction() as db:
+            tokens, rate, rate_until, paused_until = self._refilled(db, now)
+            consumed = now >= paused_until and tokens >= 1
+            if consumed:
+                tokens -= 1
+            db.execute(
+                "UPDATE buckets SET tokens = ?, updated_at = ?, rate = ?, rate_until = ? WHERE name = ?",
+                (tokens, now, rate, rate_until, self.name),
+            )
+        return consumed
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        if _replaying() or self._try_consume():
+            return True
+        if not blocking:
+            return False
+        # Only actual waits show up in the run trace
+        with span(f"rate_limit:{self.name}", "wait"):
+            while not self._try_consume():
+                time.sleep(self.check_every_n_seconds)
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        if _replaying() or await asyncio.to_thread(self._try_consume):
+            return True
+        if not blocking:
+            return False
+        with span(f"rate_limit:{self.name}", "wait"):
+            while not await asyncio.to_thread(self._try_consume):
+                await asyncio.sleep(self.check_every_n_seconds)
+        return True
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens, in every process, for ``seconds``."""
+        if _replaying():
+            return
+        until = time.time() + min(seconds, MAX_PAUSE_SECONDS)
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE buckets SET paused_until = MAX(paused_until, ?) WHERE name = ?",
+                (until, self.name),
+            )
+
+    def update_from_headers(self, headers: Optional[Mapping[str, Any]]):
+        """Adapt the bucket to the provider's rate-limit response headers."""
+        if not headers or _replaying():
+            return
+        now = time.time()
+        retry = _seconds_until(_header(headers, "retry-after"), now)
+        remaining = _header(headers, "x-ratelimit-remaining-requests", "x-ratelimit-remaining")
+        reset = _seconds_until(_header(headers, "x-ratelimit-reset-requests", "x-ratelimit-reset"), now)
+        try:
+            remaining = float(remaining) if remaining is not None else None
+        except ValueError:
+            remaining = None
+        if retry is None and remaining is None:
+            return
+
+        with self._transaction() as db:
+            tokens, rate, rate_until, paused_until = self._refilled(db, now)
+            if retry is not None:
+                paused_until = max(paused_until, now + min(retry, MAX_PAUSE_SECONDS))
+            if remaining is not None:
+                tokens = min(tokens, max(0.0, remaining))
+                if reset:
+                    reset = min(reset, MAX_PAUSE_SECONDS)
+                    if remaining < 1:
+                        paused_until = max(paused_until, now + reset)
+                    # Spread what is left of the provider's window over the time until it resets
+                    rate = min(self.requests_per_second, max(0.0, remaining) / reset)
+                    rate_until = now + reset
+            db.execute(
+                "UPDATE buckets SET tokens = ?, updated_at = ?, rate = ?, rate_until = ?, paused_until = ? "
+                "WHERE name = ?",
+                (tokens, now, rate, rate_until, paused_until, self.name),
+            )
+
+    async def aupdate_from_headers(self, headers: Optional[Mapping[str, Any]]):
+        """``update_from_headers`` off the event loop: the write lock can be held by another process."""
+        if headers and not _replaying():
+            await asyncio.to_thread(self.update_from_headers, headers)
+
+    def status(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._transaction() as db:
+            tokens, rate, _, paused_until = self._refilled(db, now)
+        return {
+            "tokens": round(tokens, 2),
+            "requests_per_minute": round(rate * 60, 2),
+            "paused_seconds": round(max(0.0, paused_until - now), 1),
+        }
+
+
+# One bucket per provider, shared by the chat model and raw REST calls
+aipipe_limiter = SharedRateLimiter("aipipe", AIPIPE_RPM / 60, max_bucket_size=AIPIPE_RPM)
+gemini_limiter = SharedRateLimiter("gemini", GEMINI_RPM / 60, max_bucket_size=3)
@@ -0,0 +1,123 @@
+"""
+Persistent memoization cache for multimodal (Gemini) results.
+Results are keyed on (content hash, normalized prompt, model), so asking the
+same question about the same file again - after a wrong answer or a loop -
+costs a SQLite lookup instead of a rate-limited Gemini call.
+Bounded by RESULT_CACHE_TTL_SECONDS and RESULT_CACHE_MAX_ENTRIES.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from dotenv import load_dotenv
+
+from .cassette import active_cassette
+from .metrics import CACHE_REQUESTS
+
+load_dotenv()
+
+RESULT_CACHE_PATH = os.path.abspath(os.getenv("RESULT_CACHE_PATH", ".cache/gemini_results.sqlite3"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "86400"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "5000"))
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace and case so trivially rephrased prompts share a key."""
+    return " ".join(prompt.split()).casefold()
+
+
+def cache_key(content_hash: str, prompt: str, model: str) -> str:
+    raw = "\x00".join([content_hash, normalize_prompt(prompt), model])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, path: str = RESULT_CACHE_PATH, ttl: float = RESULT_CACHE_TTL,
+                 max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                """CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )"""
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """One transaction on a fresh connection, closed afterwards."""
+        with closing(sqlite3.connect(self.path, timeout=30)) as db, db:
+            yield db
+
+    def get(self, content_hash: str, prompt: str, model: str) -> Optional[str]:
+        """Return the cached result, or None on a miss or expired entry."""
+        if active_cassette() is not None:
+            # Cassettes must contain the Gemini exchange itself
+            return None
+        key = cache_key(content_hash, prompt, model)
+        now = time.time()
+        with self._connect() as db:
+            row = db.execute("SELECT result, created_at FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                db.execute("DELETE FROM results WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                db.execute("UPDATE results SET last_access = ? WHERE key = ?", (now, key))
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        CACHE_REQUESTS.inc(cache="gemini_results", result="miss" if row is None else "hit")
+        return row[0] if row is not None else None
+
+    def put(self, content_hash: str, prompt: str, model: str, result: str):
+        key = cache_key(content_hash, prompt, model)
+        now = time.time()
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)", (key, result, now, now))
+            db.execute("DELETE FROM results WHERE created_at < ?", (now - self.ttl,))
+            # Least recently used entries go first once over the size bound
+            db.execute(
+                "DELETE FROM results WHERE key IN ("
+                "SELECT key FROM results ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._connect() as db:
+            entries = db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / total, 3) if total else 0.0,
+            "entries": entries,
+        }
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """Return the process-wide multimodal result cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+    return _cache
@@ -1,7 +1,12 @@
+import asyncio
 import subprocess
 from langchain_core.tools import tool
 from dotenv import load_dotenv
 import os
+from .budget import budget_timeout
+from .kernel import RUN_CODE_TIMEOUT, KernelError
+from .tracing import span
+from .workspace import current_workspace, limit_resources, workspace_dir
 
 load_dotenv()
 
@@ -16,20 +21,91 @@ def strip_code_fences(code: str) -> str:
         code = code.rsplit("\n", 1)[0]
     return code.strip()
 
+def _write_runner(code: str) -> tuple:
+    filename = "runner.py"
+    cwd = workspace_dir()
+    with open(os.path.join(cwd, filename), "w") as f:
+        f.write(code)
+    return filename, cwd
+
+
+def run_code_oneshot(code: str, timeout: float = RUN_CODE_TIMEOUT) -> dict:
+    """Run ``code`` as a fresh `uv run` process (the pre-kernel behaviour)."""
+    filename, cwd = _write_runner(code)
+
+    with span("uv run", "subprocess", code_chars=len(code)) as args:
+        proc = subprocess.Popen(
+            ["uv", "run", filename],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            cwd=cwd,
+            preexec_fn=limit_resources()
+        )
+        try:
+            stdout, stderr = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            stdout, stderr = proc.communicate()
+            stderr += f"\nExecution exceeded {timeout:.0f}s and was killed."
+        args.update(return_code=proc.returncode, output_chars=len(stdout) + len(stderr))
+
+    return {
+        "stdout": stdout,
+        "stderr": stderr,
+        "return_code": proc.returncode
+    }
+
+
+async def arun_code_oneshot(code: str, timeout: float = RUN_CODE_TIMEOUT) -> dict:
+    """Async counterpart of ``run_code_oneshot`` using an asyncio subprocess."""
+    filename, cwd = _write_runner(code)
+
+    with span("uv run", "subprocess", code_chars=len(code)) as args:
+        proc = await asyncio.create_subprocess_exec(
+            "uv", "run", filename,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+            preexec_fn=limit_resources()
+        )
+        note = ""
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            stdout, stderr = await proc.communicate()
+            note = f"\nExecution exceeded {timeout:.0f}s and was killed."
+        args.update(return_code=proc.returncode, output_chars=len(stdout) + len(stderr))
+
+    return {
+        "stdout": stdout.decode("utf-8", errors="replace"),
+        "stderr": stderr.decode("utf-8", errors="replace") + note,
+        "return_code": proc.returncode
+    }
+
+
 @tool
-def run_code(code: str) -> dict:
+def run_code(code: str, reset: bool = False) -> dict:
     """
-    Executes a Python code 
+    Executes Python code in a persistent, warm Python kernel.
+
     This tool:
       1. Takes in python code as input
-      3. Writes code into a temporary .py file
-      4. Executes the file
-      5. Returns its output
+      2. Runs it in a long-lived interpreter (numpy/pandas already imported)
+      3. Keeps variables, imports and DataFrames between calls, like a notebook
+      4. Returns its output
+
+    Files are read/written relative to this run's workspace directory
+    (where 'download_file' saves files). Use print()
+    to see results. Long-running code is interrupted after a timeout.
 
     Parameters
     ----------
     code : str
         Python source code to execute.
+    reset : bool, optional
+        Restart the kernel first, discarding all previous state.
 
     Returns
     -------
@@ -40,30 +116,51 @@ def run_code(code: str) -> dict:
             "return_code": <exit code>
         }
     """
-    try: 
-        filename = "runner.py"
-        os.makedirs("LLMFiles", exist_ok=True)
-        with open(os.path.join("LLMFiles", filename), "w") as f:
-            f.write(code)
+    code = strip_code_fences(code)
+    timeout = budget_timeout(RUN_CODE_TIMEOUT)
+    try:
+        workspace = current_workspace()
+        kernel = workspace.kernel if workspace is not None else None
+        if kernel is not None:
+            try:
+                if reset:
+                    kernel.restart()
+                return kernel.execute(code, timeout=timeout)
+            except KernelError as e:
+                print(f"⚠️  Warm kernel unavailable ({e}), falling back to one-shot run")
 
-        proc = subprocess.Popen(
-            ["uv", "run", filename],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            cwd="LLMFiles"
-        )
-        stdout, stderr = proc.communicate()
-
-        # --- Step 4: Return everything ---
+        return run_code_oneshot(code, timeout=timeout)
+    except Exception as e:
         return {
-            "stdout": stdout,
-            "stderr": stderr,
-            "return_code": proc.returncode
+            "stdout": "",
+            "stderr": str(e),
+            "return_code": -1
         }
+
+
+async def _arun_code(code: str, reset: bool = False) -> dict:
+    code = strip_code_fences(code)
+    timeout = budget_timeout(RUN_CODE_TIMEOUT)
+    try:
+        workspace = current_workspace()
+        kernel = workspace.kernel if workspace is not None else None
+        if kernel is not None:
+            # The kernel protocol is served by its own reader thread; wait on it off the loop
+            try:
+                if reset:
+                    await asyncio.to_thread(kernel.restart)
+                return await asyncio.to_thread(kernel.execute, code, timeout)
+            except KernelError as e:
+                print(f"⚠️  Warm kernel unavailable ({e}), falling back to one-shot run")
+
+        return await arun_code_oneshot(code, timeout=timeout)
     except Exception as e:
         return {
             "stdout": "",
             "stderr": str(e),
             "return_code": -1
-        }
\ No newline at end of file
+        }
+
+
+# Used by ainvoke in the async agent mode
+run_code.coroutine = _arun_code
@@ -1,7 +1,15 @@
 from langchain_core.tools import tool
+import httpx
 import requests
+from . import http_client
 import json
+import os
 from typing import Any, Dict, Optional
+from .budget import QUIZ_TIME_LIMIT, current_budget
+from .metrics import QUIZ_ANSWERS
+
+# Fixed, never clamped to the quiz budget: a late answer still earns the next URL
+SUBMIT_TIMEOUT = float(os.getenv("SUBMIT_TIMEOUT_SECONDS", "30"))
 
 @tool
 def post_request(url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> Any:
@@ -29,36 +37,67 @@ def post_request(url: str, payload: Dict[str, Any], headers: Optional[Dict[str,
     headers = headers or {"Content-Type": "application/json"}
     try:
         print(f"\nSending Answer \n{json.dumps(payload, indent=4)}\n to url: {url}")
-        response = requests.post(url, json=payload, headers=headers)
+        response = http_client.post(url, json=payload, headers=headers,
+                                    timeout=http_client.default_timeout(SUBMIT_TIMEOUT))
 
         # Raise on 4xx/5xx
         response.raise_for_status()
 
-        # Try to return JSON, fallback to raw text
-        data = response.json()
-        delay = data.get("delay", 0)
-        delay = delay if isinstance(delay, (int, float)) else 0
-        correct = data.get("correct")
-        if not correct and delay < 180:
-            del data["url"]
-        if delay >= 180:
-            data = {
-                "url": data.get("url")
-            }
-        print("Got the response: \n", json.dumps(data, indent=4), '\n')
-        return data
+        return _process_response(response.json())
     except requests.HTTPError as e:
-        # Extract server’s error response
-        err_resp = e.response
+        return _error_body(e.response)
+
+    except Exception as e:
+        print("Unexpected error:", e)
+        return str(e)
+
+
+def _process_response(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Trim the server's reply to what the agent should act on."""
+    delay = data.get("delay", 0)
+    delay = delay if isinstance(delay, (int, float)) else 0
+    correct = data.get("correct")
+    QUIZ_ANSWERS.inc(result="correct" if correct else "wrong")
+    if not correct and delay < QUIZ_TIME_LIMIT:
+        del data["url"]
+    if delay >= QUIZ_TIME_LIMIT:
+        data = {
+            "url": data.get("url")
+        }
+    # The quiz clock moves with the graph state (compact_node), not here
+    budget = current_budget()
+    if budget is not None and correct:
+        budget.solved += 1
+    print("Got the response: \n", json.dumps(data, indent=4), '\n')
+    return data
+
+
+def _error_body(err_resp) -> Any:
+    # Extract server’s error response
+    try:
+        err_data = err_resp.json()
+    except ValueError:
+        err_data = err_resp.text
+
+    print("HTTP Error Response:\n", err_data)
+    return err_data
 
-        try:
-            err_data = err_resp.json()
-        except ValueError:
-            err_data = err_resp.text
 
-        print("HTTP Error Response:\n", err_data)
-        return err_data
+async def _apost_request(url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> Any:
+    headers = headers or {"Content-Type": "application/json"}
+    try:
+        print(f"\nSending Answer \n{json.dumps(payload, indent=4)}\n to url: {url}")
+        response = await http_client.apost(url, json=payload, headers=headers,
+                                           timeout=http_client.default_timeout(SUBMIT_TIMEOUT))
+        response.raise_for_status()
+        return _process_response(response.json())
+    except httpx.HTTPStatusError as e:
+        return _error_body(e.response)
 
     except Exception as e:
         print("Unexpected error:", e)
-        return str(e)
\ No newline at end of file
+        return str(e)
+
+
+# Used by ainvoke in the async agent mode
+post_request.coroutine = _apost_request
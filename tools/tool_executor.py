@@ -0,0 +1,167 @@
+"""
+Bounded-parallel execution of the tool calls in one agent turn.
+ToolNode already fans out every tool call of an AI message (threads for
+invoke, asyncio.gather for ainvoke) and returns results in call order;
+this module bounds that fan-out per run and keeps it safe:
+- at most TOOL_MAX_CONCURRENCY tool calls of a run execute at once;
+- calls to stateful tools (SEQUENTIAL_TOOLS: the shared kernel, the
+  environment, answer submission) still run in the order the model
+  emitted them, while independent calls overlap with them;
+- an exception in one call becomes an error ToolMessage for that call
+  only, instead of failing the whole turn.
+"""
+import asyncio
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from langgraph.prebuilt import ToolNode
+
+from .artifacts import aoffload_large_output, offload_large_output
+from .metrics import TOOL_SECONDS
+from .tracing import size_of, span
+
+load_dotenv()
+
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "4"))
+# Tools whose calls depend on each other's side effects
+SEQUENTIAL_TOOLS = {"run_code", "add_dependencies", "post_request"}
+
+
+def _earlier_sequential_calls(request) -> List[str]:
+    """Ids of the stateful calls emitted before this one in the same AI message."""
+    if request.tool_call["name"] not in SEQUENTIAL_TOOLS:
+        return []
+    state = request.state
+    messages = state.get("messages", []) if isinstance(state, dict) else state
+    if not messages:
+        return []
+    calls = getattr(messages[-1], "tool_calls", None) or []
+    earlier = []
+    for call in calls:
+        if call["id"] == request.tool_call["id"]:
+            return earlier
+        if call["name"] in SEQUENTIAL_TOOLS:
+            earlier.append(call["id"])
+    return []
+
+
+class ToolCallLimiter:
+    """Per-run concurrency limit and ordering gate for tool calls."""
+
+    def __init__(self, limit: int = TOOL_MAX_CONCURRENCY):
+        self.limit = max(1, limit)
+        self._finished = set()
+        self._slots = threading.BoundedSemaphore(self.limit)
+        self._done = threading.Condition()
+        # Created on first async use, inside the run's event loop
+        self._aslots: Optional[asyncio.Semaphore] = None
+        self._adone: Optional[asyncio.Condition] = None
+
+    def run(self, request, handler):
+        earlier = _earlier_sequential_calls(request)
+        # Wait for our turn before taking a slot, so earlier calls can always get one
+        with self._done:
+            self._done.wait_for(lambda: self._finished.issuperset(earlier))
+        try:
+            with self._slots:
+                return handler(request)
+        finally:
+            with self._done:
+                self._finished.add(request.tool_call["id"])
+                self._done.notify_all()
+
+    async def arun(self, request, handler):
+        if self._aslots is None:
+            self._aslots = asyncio.Semaphore(self.limit)
+            self._adone = asyncio.Condition()
+        earlier = _earlier_sequential_calls(request)
+        async with self._adone:
+            await self._adone.wait_for(lambda: self._finished.issuperset(earlier))
+        try:
+            async with self._aslots:
+                return await handler(request)
+        finally:
+            async with self._adone:
+                self._finished.add(request.tool_call["id"])
+                self._adone.notify_all()
+
+
+_current_limiter: ContextVar[Optional[ToolCallLimiter]] = ContextVar("tool_call_limiter", default=None)
+
+
+def start_tool_limiter(limit: Optional[int] = None) -> ToolCallLimiter:
+    """Create the tool-call limiter for this run and make it current."""
+    limiter = ToolCallLimiter(limit if limit is not None else TOOL_MAX_CONCURRENCY)
+    _current_limiter.set(limiter)
+    return limiter
+
+
+def _observe(request, result, started: float):
+    # handle_tool_errors turns exceptions into ToolMessages with status="error"
+    status = getattr(result, "status", "success") if result is not None else "error"
+    TOOL_SECONDS.observe(time.perf_counter() - started, tool=request.tool_call["name"], status=status)
+
+
+def _timed_call(request, handler):
+    started = time.perf_counter()
+    result = None
+    try:
+        with span(request.tool_call["name"], "tool", input_chars=size_of(request.tool_call["args"])) as args:
+            result = offload_large_output(request, handler)
+            args["output_chars"] = size_of(result)
+        return result
+    finally:
+        _observe(request, result, started)
+
+
+async def _atimed_call(request, handler):
+    started = time.perf_counter()
+    result = None
+    try:
+        with span(request.tool_call["name"], "tool", input_chars=size_of(request.tool_call["args"])) as args:
+            result = await aoffload_large_output(request, handler)
+            args["output_chars"] = size_of(result)
+        return result
+    finally:
+        _observe(request, result, started)
+
+
+def _wrap_tool_call(request, handler):
+    limiter = _current_limiter.get()
+    if limiter is None:
+        return _timed_call(request, handler)
+    # Timed inside the limiter, so waiting for a slot is not counted as tool time
+    return limiter.run(request, lambda req: _timed_call(req, handler))
+
+
+async def _awrap_tool_call(request, handler):
+    limiter = _current_limiter.get()
+    if limiter is None:
+        return await _atimed_call(request, handler)
+    return await limiter.arun(request, lambda req: _atimed_call(req, handler))
+
+
+class _TracedToolNode(ToolNode):
+    """ToolNode whose whole step shows up as one span around its tool calls."""
+
+    def _func(self, input, config, runtime):
+        with span("tools", "graph"):
+            return super()._func(input, config, runtime)
+
+    async def _afunc(self, input, config, runtime):
+        with span("tools", "graph"):
+            return await super()._afunc(input, config, runtime)
+
+
+def build_tool_node(tools) -> ToolNode:
+    """The graph's tool node: bounded-parallel, ordered where needed, errors isolated per call."""
+    return _TracedToolNode(
+        tools,
+        handle_tool_errors=True,
+        wrap_tool_call=_wrap_tool_call,
+        awrap_tool_call=_awrap_tool_call,
+    )
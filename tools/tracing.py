@@ -0,0 +1,249 @@
+"""
+Per-run timeline traces.
+Every agent run records a tree of spans (graph steps, LLM calls, tool
+calls, HTTP requests, downloads, subprocesses) with start/end times and
+payload sizes. At the end of the run the tree is written as Chrome trace
+JSON (``trace.json`` in the run workspace; open it in Perfetto or
+chrome://tracing) and the last TRACE_HISTORY traces stay in memory for
+GET /jobs/{id}/trace.
+Spans find their run and parent through context variables, like the
+budget and the workspace. Concurrent spans (parallel tool calls, hedged
+requests) are laid out on separate lanes ("threads" in the viewer) so each
+lane stays properly nested.
+"""
+import asyncio
+import functools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TRACE_RUNS = os.getenv("TRACE_RUNS", "1") == "1"
+# Spans kept per run; later spans are counted but dropped
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "20000"))
+# Recent traces kept in memory for the API
+TRACE_HISTORY = int(os.getenv("TRACE_HISTORY", "50"))
+TRACE_FILENAME = "trace.json"
+
+
+class Span:
+    __slots__ = ("id", "parent", "name", "cat", "start", "end", "args", "lane")
+
+    def __init__(self, id: int, parent: Optional["Span"], name: str, cat: str, args: Dict[str, Any]):
+        self.id = id
+        self.parent = parent
+        self.name = name
+        self.cat = cat
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.args = args
+        self.lane = 0
+
+
+class RunTrace:
+    """Spans recorded for one agent run."""
+
+    def __init__(self, run_id: str, url: Optional[str] = None):
+        self.run_id = run_id
+        self.url = url
+        self.started_at = time.time()
+        self._origin = time.perf_counter()
+        self._spans: List[Span] = []
+        self.dropped = 0
+        # Innermost open span per lane; None when the lane is free
+        self._lane_top: List[Optional[Span]] = []
+        self._lock = threading.Lock()
+
+    def start_span(self, name: str, cat: str, parent: Optional[Span], args: Dict[str, Any]) -> Optional[Span]:
+        with self._lock:
+            if len(self._spans) >= TRACE_MAX_SPANS:
+                self.dropped += 1
+                return None
+            span = Span(len(self._spans) + 1, parent, name, cat, args)
+            span.lane = self._take_lane(parent)
+            self._lane_top[span.lane] = span
+            self._spans.append(span)
+        return span
+
+    def _take_lane(self, parent: Optional[Span]) -> int:
+        # Nest on the parent's lane unless a sibling is already open there
+        if parent is not None and self._lane_top[parent.lane] is parent:
+            return parent.lane
+        for lane, top in enumerate(self._lane_top):
+            if top is None:
+                return lane
+        self._lane_top.append(None)
+        return len(self._lane_top) - 1
+
+    def end_span(self, span: Span):
+        with self._lock:
+            span.end = time.perf_counter()
+            if self._lane_top[span.lane] is not span:
+                # An open child (e.g. a cancelled request still unwinding) keeps the lane
+                return
+            # Hand the lane back to the innermost ancestor on it that is still open
+            top = span.parent
+            while top is not None and top.lane == span.lane and top.end is not None:
+                top = top.parent
+            self._lane_top[span.lane] = top if top is not None and top.lane == span.lane else None
+
+    def to_chrome(self) -> Dict[str, Any]:
+        """The trace in the Chrome trace event format (complete "X" events)."""
+        now = time.perf_counter()
+        with self._lock:
+            spans = list(self._spans)
+            lanes = len(self._lane_top)
+        events: List[Dict[str, Any]] = [
+            {"ph": "M", "name": "process_name", "pid": 1, "tid": 0, "args": {"name": f"run {self.run_id}"}},
+        ]
+        for lane in range(lanes):
+            events.append({"ph": "M", "name": "thread_name", "pid": 1, "tid": lane,
+                           "args": {"name": "main" if lane == 0 else f"parallel {lane}"}})
+        for span in spans:
+            end = span.end if span.end is not None else now
+            args = {"span_id": span.id, "parent_id": span.parent.id if span.parent else None, **span.args}
+            if span.end is None:
+                args["unfinished"] = True
+            events.append({
+                "ph": "X",
+                "name": span.name,
+                "cat": span.cat,
+                "pid": 1,
+                "tid": span.lane,
+                "ts": round((span.start - self._origin) * 1e6, 1),
+                "dur": round((end - span.start) * 1e6, 1),
+                "args": args,
+            })
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "run_id": self.run_id,
+                "url": self.url,
+                "started_at": self.started_at,
+                "spans": len(spans),
+                "dropped_spans": self.dropped,
+            },
+        }
+
+    def export(self, directory: str) -> str:
+        """Write the Chrome trace to ``directory``/trace.json and return the path."""
+        path = os.path.join(directory, TRACE_FILENAME)
+        with open(path, "w") as f:
+            json.dump(self.to_chrome(), f, default=str)
+        return path
+
+
+_current_trace: ContextVar[Optional[RunTrace]] = ContextVar("run_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+_traces: "OrderedDict[str, RunTrace]" = OrderedDict()
+_traces_lock = threading.Lock()
+
+
+def start_trace(run_id: str, url: Optional[str] = None) -> Optional[RunTrace]:
+    """Create a trace for this run and make it current (None when TRACE_RUNS=0)."""
+    trace = RunTrace(run_id, url) if TRACE_RUNS else None
+    _current_trace.set(trace)
+    _current_span.set(None)
+    if trace is not None:
+        # Visible to the API while the run is still going
+        _remember(trace)
+    return trace
+
+
+def current_trace() -> Optional[RunTrace]:
+    return _current_trace.get()
+
+
+def _remember(trace: RunTrace):
+    with _traces_lock:
+        _traces[trace.run_id] = trace
+        _traces.move_to_end(trace.run_id)
+        while len(_traces) > TRACE_HISTORY:
+            _traces.popitem(last=False)
+
+
+def get_trace(run_id: str) -> Optional[RunTrace]:
+    """A recent run's trace (finished or in progress), if still kept."""
+    with _traces_lock:
+        return _traces.get(run_id)
+
+
+@contextmanager
+def span(name: str, cat: str, **args) -> Iterator[Dict[str, Any]]:
+    """Record the ``with`` block as a span of the current run.
+
+    Yields the span's args dict, so the block can add result sizes. Outside
+    a traced run this is a no-op.
+    """
+    trace = _current_trace.get()
+    record = trace.start_span(name, cat, _current_span.get(), args) if trace is not None else None
+    if record is None:
+        yield args
+        return
+    token = _current_span.set(record)
+    try:
+        yield record.args
+    except BaseException as e:
+        record.args["error"] = type(e).__name__
+        raise
+    finally:
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Exited in another context than it was entered in
+            _current_span.set(record.parent)
+        trace.end_span(record)
+
+
+def rename_span(name: str):
+    """Rename the innermost open span, e.g. once it is known which provider answered."""
+    record = _current_span.get()
+    if record is not None:
+        record.name = name
+
+
+def traced(name: str, cat: str = "graph"):
+    """Decorator recording every call of a (sync or async) function as a span."""
+    def decorate(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, cat):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, cat):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def size_of(value: Any) -> int:
+    """Rough payload size in characters, for span args."""
+    if value is None:
+        return 0
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    content = getattr(value, "content", None)
+    if content is not None:
+        # Messages: text plus any tool-call arguments
+        return size_of(content) + size_of([call.get("args") for call in getattr(value, "tool_calls", None) or []])
+    if isinstance(value, (list, tuple)):
+        return sum(size_of(item) for item in value)
+    if isinstance(value, dict):
+        return sum(size_of(item) for item in value.values())
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return len(str(value))
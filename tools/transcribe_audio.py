@@ -1,8 +1,31 @@
 from langchain_core.tools import tool
-import requests
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
 import os
 import tempfile
-import base64
+from .audio_chunks import TRANSCRIBE_MAX_PARALLEL, split_audio, stitch
+from .download_cache import cached_download
+from .local_stt import choose_backend, local_model_name, transcribe_local
+from .gemini_media import GEMINI_MODEL, generate_content, media_part
+from .result_cache import get_result_cache
+
+from .workspace import workspace_dir
+
+TRANSCRIBE_PROMPT = 'Transcribe this audio file. Return ONLY the transcribed text, nothing else.'
+
+
+def _transcribe_file(path: str, mime_type: str, sha256: str | None = None) -> str:
+    audio_part = media_part(path, mime_type, sha256=sha256)
+    return generate_content([{'text': TRANSCRIBE_PROMPT}, audio_part])
+
+
+def transcribe_segments(segments: list[tuple[str, bool]]) -> str:
+    """Transcribe WAV segments concurrently and stitch them back in order."""
+    workers = max(1, min(TRANSCRIBE_MAX_PARALLEL, len(segments)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(copy_context().run, _transcribe_file, path, 'audio/wav') for path, _ in segments]
+        return stitch([f.result() for f in futures], [overlaps for _, overlaps in segments])
 
 
 @tool
@@ -12,6 +35,10 @@ def transcribe_audio(audio_url: str) -> str:
     
     This tool uses Gemini's multimodal capabilities to transcribe audio files.
     It downloads the audio file and sends it to Gemini for transcription.
+    Long recordings are split at silences and the pieces are transcribed in
+    parallel, so long clips take roughly as long as one short one. Short
+    clips can be transcribed by a local Whisper model instead (see
+    TRANSCRIBE_BACKEND), with Gemini as fallback.
     
     IMPORTANT:
     - Use this for audio transcription tasks (MP3, WAV, etc.)
@@ -31,82 +58,77 @@ def transcribe_audio(audio_url: str) -> str:
     try:
         print(f"\n🎧 Transcribing audio from: {audio_url}")
         
-        # Download the audio file
-        response = requests.get(audio_url, stream=True)
-        response.raise_for_status()
-        
-        # Save to temporary file
+        # Download the audio file (served from the shared download cache when possible)
         suffix = os.path.splitext(audio_url)[1] or '.mp3'
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    tmp_file.write(chunk)
-            tmp_path = tmp_file.name
+        blob = cached_download(audio_url)
+        
+        # Local Whisper for short clips when configured, Gemini otherwise
+        backend = choose_backend(blob.path)
+        requested_model = model = local_model_name() if backend == "local" else GEMINI_MODEL
+        
+        cache = get_result_cache()
+        cached = cache.get(blob.sha256, TRANSCRIBE_PROMPT, requested_model)
+        if cached is not None:
+            print(f"♻️  Reusing cached transcription ({len(cached)} characters)")
+            return cached
+        
+        # Determine MIME type based on file extension
+        mime_map = {
+            '.mp3': 'audio/mpeg',
+            '.MP3': 'audio/mpeg',
+            '.wav': 'audio/wav',
+            '.WAV': 'audio/wav',
+            '.opus': 'audio/ogg',
+            '.OPUS': 'audio/ogg',
+            '.ogg': 'audio/ogg',
+            '.OGG': 'audio/ogg',
+            '.m4a': 'audio/mp4',
+            '.M4A': 'audio/mp4',
+            '.flac': 'audio/flac',
+            '.FLAC': 'audio/flac'
+        }
+        mime_type = mime_map.get(suffix, 'audio/mpeg')
+        print(f"📝 Using MIME type: {mime_type} for {suffix}")
+        
+        transcription = None
+        if backend == "local":
+            try:
+                print(f"🖥️  Transcribing locally with {model}...")
+                transcription = transcribe_local(blob.path)
+            except Exception as e:
+                print(f"⚠️  Local transcription failed ({e}) - falling back to Gemini")
+                model = GEMINI_MODEL
+        
+        if transcription is None:
+            with tempfile.TemporaryDirectory(dir=workspace_dir()) as segment_dir:
+                segments = split_audio(blob.path, segment_dir)
+                if segments:
+                    print(f"🔄 Transcribing {len(segments)} segments in parallel with Gemini...")
+                    transcription = transcribe_segments(segments)
+                else:
+                    # Short clip (or no ffmpeg): one request, inline or via the Files API
+                    print(f"🔄 Generating transcription with Gemini ({blob.size} bytes)...")
+                    transcription = _transcribe_file(blob.path, mime_type, sha256=blob.sha256)
+        cache.put(blob.sha256, TRANSCRIBE_PROMPT, model, transcription)
+        if model != requested_model:
+            # Also under the key looked up above, so the next call does not retry the failing local model
+            cache.put(blob.sha256, TRANSCRIBE_PROMPT, requested_model, transcription)
+        print(f"✅ Transcription complete ({len(transcription)} characters)")
+        
+        return transcription
         
-        try:
-            # Get API key
-            gemini_key = os.getenv('GOOGLE_API_KEY')
-            if not gemini_key:
-                raise Exception("GOOGLE_API_KEY not found in environment")
-            
-            # Read and encode audio file
-            print(f"📤 Encoding audio file...")
-            with open(tmp_path, 'rb') as f:
-                audio_data = base64.b64encode(f.read()).decode('utf-8')
-            
-            # Determine MIME type based on file extension
-            mime_map = {
-                '.mp3': 'audio/mpeg',
-                '.MP3': 'audio/mpeg',
-                '.wav': 'audio/wav',
-                '.WAV': 'audio/wav',
-                '.opus': 'audio/ogg',
-                '.OPUS': 'audio/ogg',
-                '.ogg': 'audio/ogg',
-                '.OGG': 'audio/ogg',
-                '.m4a': 'audio/mp4',
-                '.M4A': 'audio/mp4',
-                '.flac': 'audio/flac',
-                '.FLAC': 'audio/flac'
-            }
-            mime_type = mime_map.get(suffix, 'audio/mpeg')
-            print(f"📝 Using MIME type: {mime_type} for {suffix}")
-            
-            # Call Gemini API with inline data
-            print(f"🔄 Generating transcription with Gemini...")
-            api_response = requests.post(
-                'https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent',
-                params={'key': gemini_key},
-                json={
-                    'contents': [{
-                        'parts': [
-                            {'text': 'Transcribe this audio file. Return ONLY the transcribed text, nothing else.'},
-                            {'inlineData': {'mimeType': mime_type, 'data': audio_data}}
-                        ]
-                    }]
-                },
-                timeout=60
-            )
-            
-            # Better error handling for API response
-            if api_response.status_code != 200:
-                error_detail = api_response.text[:500]
-                print(f"❌ Gemini API error {api_response.status_code}: {error_detail}")
-                raise Exception(f"Gemini API returned {api_response.status_code}: {error_detail}")
-            
-            api_response.raise_for_status()
-            
-            transcription = api_response.json()['candidates'][0]['content']['parts'][0]['text'].strip()
-            print(f"✅ Transcription complete ({len(transcription)} characters)")
-            
-            return transcription
-            
-        finally:
-            # Clean up temporary file
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
-                
     except Exception as e:
         error_msg = f"Error transcribing audio: {str(e)}"
         print(f"❌ {error_msg}")
         return error_msg
+
+
+async def _atranscribe_audio(audio_url: str) -> str:
+    # ffmpeg splitting and local Whisper are CPU-bound and the segment
+    # requests already run in parallel threads, so the whole pipeline runs
+    # on a worker thread (to_thread keeps the run's context)
+    return await asyncio.to_thread(transcribe_audio.func, audio_url)
+
+
+# Used by ainvoke in the async agent mode
+transcribe_audio.coroutine = _atranscribe_audio
@@ -1,15 +1,156 @@
 from langchain_core.tools import tool
-from playwright.sync_api import sync_playwright
-from bs4 import BeautifulSoup
+from playwright.async_api import TimeoutError as AsyncPlaywrightTimeoutError
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+from dotenv import load_dotenv
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+import os
+import time
+from .browser_pool import get_async_browser_pool, get_browser_pool
+from . import cassette
+from .budget import budget_timeout
+from .page_extractor import extract_page
+
+load_dotenv()
+
+PAGE_TIMEOUT = float(os.getenv("PAGE_TIMEOUT_SECONDS", "30"))
+DOM_SETTLE_MS = int(os.getenv("PAGE_DOM_SETTLE_MS", "500"))
+
+# Resource types the agent never needs to read a page
+BLOCKED_RESOURCE_TYPES = {
+    t.strip() for t in os.getenv("BROWSER_BLOCKED_RESOURCES", "image,media,font,stylesheet,ping").split(",") if t.strip()
+}
+BLOCKED_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net",
+    "facebook.net", "hotjar.com", "segment.io", "plausible.io",
+)
+
+# Resolves once the DOM has had no mutations for `quietMs` (or after `maxMs`)
+DOM_SETTLED_JS = """
+([quietMs, maxMs]) => new Promise(resolve => {
+    let timer;
+    const done = () => { observer.disconnect(); clearTimeout(timer); resolve(); };
+    const observer = new MutationObserver(() => {
+        clearTimeout(timer);
+        timer = setTimeout(done, quietMs);
+    });
+    observer.observe(document, {subtree: true, childList: true, characterData: true, attributes: true});
+    timer = setTimeout(done, quietMs);
+    setTimeout(done, maxMs);
+})
+"""
+
+
+def _is_non_essential(request) -> bool:
+    host = urlparse(request.url).hostname or ""
+    return request.resource_type in BLOCKED_RESOURCE_TYPES or host.endswith(BLOCKED_HOSTS)
+
+
+def _block_non_essential(route):
+    if _is_non_essential(route.request):
+        route.abort()
+    else:
+        route.continue_()
+
+
+async def _ablock_non_essential(route):
+    if _is_non_essential(route.request):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+def render_page(
+    url: str,
+    wait_for: Optional[str] = None,
+    timeout: Optional[float] = None,
+    block_resources: bool = True,
+) -> Tuple[str, str]:
+    """Render ``url`` in the browser pool and return ``(final_url, html)``.
+
+    Navigation returns at DOMContentLoaded; after that we wait for ``wait_for``
+    (a CSS selector) if given, otherwise until the DOM stops changing. The whole
+    call is bounded by ``timeout`` seconds, clamped to the quiz time remaining.
+    """
+    timeout = budget_timeout(timeout or PAGE_TIMEOUT)
+    deadline = time.monotonic() + timeout
+
+    def remaining_ms() -> float:
+        return max(1.0, (deadline - time.monotonic()) * 1000)
+
+    def render(page):
+        if block_resources:
+            page.route("**/*", _block_non_essential)
+
+        page.goto(url, wait_until="domcontentloaded", timeout=remaining_ms())
+        try:
+            if wait_for:
+                page.wait_for_selector(wait_for, state="attached", timeout=remaining_ms())
+            else:
+                # Give deferred/async scripts a chance to run, then let the DOM settle
+                page.wait_for_load_state("load", timeout=remaining_ms())
+                page.evaluate(DOM_SETTLED_JS, [DOM_SETTLE_MS, remaining_ms()])
+        except PlaywrightTimeoutError:
+            print(f"⚠️  Page did not settle within {timeout:.0f}s, using current DOM")
+
+        return page.url, page.content()
+
+    # Small grace period on top of the page timeout for waiting on a free browser
+    return cassette.render(url, wait_for, lambda: get_browser_pool().run(render, timeout=timeout + 5))
+
+
+async def arender_page(
+    url: str,
+    wait_for: Optional[str] = None,
+    timeout: Optional[float] = None,
+    block_resources: bool = True,
+) -> Tuple[str, str]:
+    """Async counterpart of ``render_page`` using the event loop's browser pool."""
+    timeout = budget_timeout(timeout or PAGE_TIMEOUT)
+    deadline = time.monotonic() + timeout
+
+    def remaining_ms() -> float:
+        return max(1.0, (deadline - time.monotonic()) * 1000)
+
+    async def render(page):
+        if block_resources:
+            await page.route("**/*", _ablock_non_essential)
+
+        await page.goto(url, wait_until="domcontentloaded", timeout=remaining_ms())
+        try:
+            if wait_for:
+                await page.wait_for_selector(wait_for, state="attached", timeout=remaining_ms())
+            else:
+                await page.wait_for_load_state("load", timeout=remaining_ms())
+                await page.evaluate(DOM_SETTLED_JS, [DOM_SETTLE_MS, remaining_ms()])
+        except AsyncPlaywrightTimeoutError:
+            print(f"⚠️  Page did not settle within {timeout:.0f}s, using current DOM")
+
+        return page.url, await page.content()
+
+    return await cassette.arender(url, wait_for, lambda: get_async_browser_pool().run(render, timeout=timeout + 5))
+
 
 @tool
-def get_rendered_html(url: str) -> str:
+def get_rendered_html(
+    url: str,
+    raw_html: bool = False,
+    wait_for: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> Dict[str, Any] | str:
     """
-    Fetch and return the fully rendered HTML of a webpage.
+    Fetch a webpage, render it, and return a compact view of its content.
 
     This function uses Playwright to load a webpage in a headless Chromium
     browser, allowing all JavaScript on the page to execute. Use this for
-    dynamic websites that require rendering.
+    dynamic websites that require rendering. Browsers are kept warm in a
+    process-wide pool; every call gets its own isolated context. Images,
+    fonts, stylesheets and trackers are not downloaded, and the call returns
+    as soon as the DOM stops changing (or `wait_for` appears).
+
+    Scripts, styles and other markup are stripped; you get the visible text
+    plus structured links, forms, media and likely submit endpoints, with all
+    URLs already resolved to absolute form.
 
     IMPORTANT RESTRICTIONS:
     - ONLY use this for actual HTML webpages (articles, documentation, dashboards).
@@ -20,27 +161,58 @@ def get_rendered_html(url: str) -> str:
     ----------
     url : str
         The URL of the webpage to retrieve and render.
+    raw_html : bool, optional
+        Also include the full rendered HTML under "html". Only set this when
+        the compact view is missing something you need (e.g. element attributes).
+    wait_for : str, optional
+        CSS selector to wait for before reading the page (e.g. "#question").
+    timeout : float, optional
+        Max seconds for the whole render. Defaults to PAGE_TIMEOUT_SECONDS and
+        never exceeds the time left on the current quiz.
 
     Returns
     -------
-    str
-        The fully rendered and cleaned HTML content.
+    dict
+        {
+            "url": <final page URL>,
+            "title": <page title>,
+            "text": <visible text>,
+            "links": [{"text", "href"}],
+            "forms": [{"action", "method", "fields"}],
+            "media": [{"type", "src"}],   # audio / video / img, absolute URLs
+            "submit_endpoints": [<urls>],
+            "html": <raw HTML, only when raw_html=True>
+        }
     """
-    # ... existing code ...
     print("\nFetching and rendering:", url)
+
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
+        final_url, html = render_page(url, wait_for=wait_for, timeout=timeout)
+        page = extract_page(html, final_url or url, include_html=raw_html)
+        print(f"✅ Rendered {len(html)} chars of HTML → {len(page['text'])} chars of text")
+        return page
+
+    except Exception as e:
+        return f"Error fetching/rendering page: {str(e)}"
 
-            # Load the page (let JS execute)
-            page.goto(url, wait_until="networkidle")
 
-            # Extract rendered HTML
-            content = page.content()
+async def _aget_rendered_html(
+    url: str,
+    raw_html: bool = False,
+    wait_for: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> Dict[str, Any] | str:
+    print("\nFetching and rendering:", url)
 
-            browser.close()
-            return content
+    try:
+        final_url, html = await arender_page(url, wait_for=wait_for, timeout=timeout)
+        page = extract_page(html, final_url or url, include_html=raw_html)
+        print(f"✅ Rendered {len(html)} chars of HTML → {len(page['text'])} chars of text")
+        return page
 
     except Exception as e:
-        return f"Error fetching/rendering page: {str(e)}"
\ No newline at end of file
+        return f"Error fetching/rendering page: {str(e)}"
+
+
+# Used by ainvoke in the async agent mode
+get_rendered_html.coroutine = _aget_rendered_html
@@ -0,0 +1,115 @@
+"""
+Per-run isolated workspaces.
+Every agent run gets its own directory under WORKSPACE_ROOT plus its own
+Python kernel, so concurrent /solve jobs never share files. Tools find the
+workspace of the run they belong to through a context variable.
+Every run_code execution is bounded by RUN_CPU_SECONDS and RUN_MEMORY_MB
+(the warm kernel re-arms its CPU limit per execution, since RLIMIT_CPU
+counts the whole life of a process); the run as a whole by
+RUN_WALL_CLOCK_SECONDS.
+"""
+import os
+import shutil
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+
+from .kernel import KERNEL_MODE, PythonKernel
+
+load_dotenv()
+
+WORKSPACE_ROOT = os.path.abspath(os.getenv("WORKSPACE_ROOT", "LLMFiles"))
+KEEP_WORKSPACES = os.getenv("KEEP_WORKSPACES", "").lower() in ("1", "true", "yes")
+RUN_CPU_SECONDS = int(os.getenv("RUN_CPU_SECONDS", "600"))
+RUN_MEMORY_MB = int(os.getenv("RUN_MEMORY_MB", "4096"))
+RUN_WALL_CLOCK_SECONDS = float(os.getenv("RUN_WALL_CLOCK_SECONDS", "3600"))
+
+
+def limit_resources(cpu: bool = True) -> Optional[Callable[[], None]]:
+    """Return a ``preexec_fn`` applying the CPU/memory limits (POSIX only).
+
+    ``cpu=False`` leaves RLIMIT_CPU to the process itself (the warm kernel
+    sets it per execution).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    def apply():
+        if cpu and RUN_CPU_SECONDS > 0:
+            resource.setrlimit(resource.RLIMIT_CPU, (RUN_CPU_SECONDS, RUN_CPU_SECONDS))
+        if RUN_MEMORY_MB > 0:
+            limit = RUN_MEMORY_MB * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    return apply
+
+
+class Workspace:
+    """Directory, temp files and Python kernel owned by a single agent run."""
+
+    def __init__(self, run_id: Optional[str] = None, root: str = WORKSPACE_ROOT):
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.path = os.path.join(root, self.run_id)
+        self.started_at = time.monotonic()
+        self.kernel: Optional[PythonKernel] = None
+        os.makedirs(self.path, exist_ok=True)
+
+    def file(self, name: str) -> str:
+        """Absolute path for ``name`` inside the workspace (directories stripped)."""
+        return os.path.join(self.path, os.path.basename(name) or "file")
+
+    def start_kernel(self) -> Optional[PythonKernel]:
+        """Start this run's warm kernel (None when KERNEL_MODE is "oneshot")."""
+        if KERNEL_MODE != "warm":
+            return None
+        kernel = PythonKernel(self.path, preexec_fn=limit_resources(cpu=False), cpu_seconds=RUN_CPU_SECONDS)
+        try:
+            kernel.start()
+        except Exception as e:
+            print(f"⚠️  Could not start warm kernel, run_code will use one-shot mode: {e}")
+            return None
+        self.kernel = kernel
+        return kernel
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def expired(self) -> bool:
+        return RUN_WALL_CLOCK_SECONDS > 0 and self.elapsed() > RUN_WALL_CLOCK_SECONDS
+
+    def cleanup(self):
+        """Stop the kernel and delete the directory (unless KEEP_WORKSPACES is set)."""
+        if self.kernel is not None:
+            self.kernel.shutdown()
+            self.kernel = None
+        if not KEEP_WORKSPACES:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+
+_current_workspace: ContextVar[Optional[Workspace]] = ContextVar("workspace", default=None)
+
+
+def create_workspace(run_id: Optional[str] = None) -> Workspace:
+    """Create a workspace and make it current for this run."""
+    workspace = Workspace(run_id)
+    _current_workspace.set(workspace)
+    return workspace
+
+
+def current_workspace() -> Optional[Workspace]:
+    """Return the workspace of the run calling this tool, if any."""
+    return _current_workspace.get()
+
+
+def workspace_dir() -> str:
+    """Directory tools should write into: the run workspace, or LLMFiles outside a run."""
+    workspace = current_workspace()
+    if workspace is not None:
+        return workspace.path
+    os.makedirs("LLMFiles", exist_ok=True)
+    return "LLMFiles"